@@ -0,0 +1,273 @@
+"""Time each stage of the scraper on synthetic yearbooks.
+
+Stages:
+    classify: pdf_has_text on a text and a scanned yearbook.
+    text_search: extract the text layer and search it for several titles.
+    table_list: locate and ocr the list of tables of a scanned yearbook.
+    window_ocr: find_pages on a scanned yearbook (table list + window ocr).
+    full_fallback: search_whole_document over the first FALLBACK_PAGES pages.
+    directory_merge: write the merged pdfs and csv report of a directory.
+
+Stages that need tesseract or poppler are skipped (with the reason recorded)
+where they are not installed. Each stage runs --repeat times on fresh
+Documents, with the ocr cache and text index off unless --cache is given.
+
+Results are written as json (median seconds, pages, pages per second and
+whether the expected pages were found) with the commit and machine, so runs
+can be compared:
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --compare before.json --tolerance 0.2
+--compare exits with status 1 if any stage got slower by more than the
+tolerance or stopped finding its tables.
+"""
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime
+import io
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_directory, make_yearbook
+from scraper import directory_scraper
+from scraper import file_scraper
+from scraper.tools import budget as budgets
+from scraper.tools import tablelist_utils as tbl
+from scraper.tools import text_pdfs as text
+from scraper.tools.document import Document
+
+RESULTS_DIR = Path(__file__).parent / "results"
+QUERY_COUNT = 5
+FALLBACK_PAGES = 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300, help="pages per yearbook")
+    parser.add_argument("--scanned-pages", type=int, default=120,
+                        help="pages per scanned yearbook")
+    parser.add_argument("--files", type=int, default=10, help="yearbooks in the directory")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", help="comma separated stages to run (default all)")
+    parser.add_argument("--cache", action="store_true",
+                        help="keep OCR_CACHE_DIR and TEXT_INDEX_PATH from the environment")
+    parser.add_argument("--output", type=Path, help="json file to write")
+    parser.add_argument("--compare", type=Path, help="earlier json results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown as a share of the earlier time")
+    args = parser.parse_args(argv)
+
+    if not args.cache:
+        os.environ.pop("OCR_CACHE_DIR", None)
+        os.environ.pop("TEXT_INDEX_PATH", None)
+    selected = set(args.stages.split(",")) if args.stages else set(STAGES)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        fixtures = _make_fixtures(work_dir, args, selected)
+        stages = {}
+        for name, stage in STAGES.items():
+            if name not in selected:
+                continue
+            missing = [tool for tool in stage["needs"] if shutil.which(tool) is None]
+            if missing:
+                stages[name] = {"skipped": f"{', '.join(missing)} not installed"}
+            else:
+                stages[name] = _time_stage(stage["run"], fixtures, args.repeat)
+            print(f"{name}: {_describe(stages[name])}")
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "pages": args.pages, "scanned_pages": args.scanned_pages,
+            "files": args.files, "repeat": args.repeat, "cache": args.cache,
+        },
+        "stages": stages,
+    }
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare is not None:
+        regressions = compare(json.loads(args.compare.read_text()), results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+def compare(baseline, current, tolerance=0.2):
+    """Stages that got slower than baseline by more than tolerance, or lost matches.
+
+    Returns:
+        list of descriptions, empty when nothing regressed.
+    """
+    regressions = []
+    for name, stage in current["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None or "skipped" in before or "skipped" in stage:
+            continue
+        if stage["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {before['seconds']:.3f}s -> {stage['seconds']:.3f}s"
+            )
+        if before.get("correct") and not stage.get("correct"):
+            regressions.append(f"{name}: expected pages no longer found")
+    return regressions
+
+
+def _make_fixtures(work_dir, args, selected):
+    fixtures = {}
+    fixtures["text_pdf"] = work_dir / "text.pdf"
+    fixtures["text_info"] = make_yearbook(fixtures["text_pdf"], args.pages)
+    fixtures["scanned_pdf"] = work_dir / "scanned.pdf"
+    fixtures["scanned_info"] = make_yearbook(fixtures["scanned_pdf"], args.scanned_pages,
+                                             scanned=True)
+    if "directory_merge" in selected:
+        fixtures["input_dir"] = work_dir / "input"
+        fixtures["output_dir"] = work_dir / "output"
+        fixtures["output_dir"].mkdir()
+        fixtures["directory"] = make_directory(fixtures["input_dir"], args.files)
+    return fixtures
+
+
+def _time_stage(run, fixtures, repeat):
+    """Median wall time of run(fixtures) over repeat runs.
+
+    run returns (pages processed, whether the expected pages were found).
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        # the scraper reports progress (and debug output) on stdout
+        with redirect_stdout(io.StringIO()):
+            pages, correct = run(fixtures)
+        times.append(time.perf_counter() - started)
+    seconds = statistics.median(times)
+    return {
+        "seconds": seconds,
+        "runs": times,
+        "pages": pages,
+        "pages_per_second": pages / seconds if seconds else None,
+        "correct": correct,
+    }
+
+
+def _queries(info):
+    """Titles spread over the yearbook, with the pdf page each starts on.
+    """
+    tables = info["tables"]
+    step = max(1, len(tables) // QUERY_COUNT)
+    return {table["title"]: table["pdf_page"] for table in tables[::step][:QUERY_COUNT]}
+
+
+def _classify(fixtures):
+    has_text = text.pdf_has_text(Document(fixtures["text_pdf"]))
+    scanned_has_text = text.pdf_has_text(Document(fixtures["scanned_pdf"]))
+    # pdf_has_text reads at most its first 30 pages
+    pages = min(30, fixtures["text_info"]["num_pages"])
+    pages += min(30, fixtures["scanned_info"]["num_pages"])
+    return pages, has_text and not scanned_has_text
+
+
+def _text_search(fixtures):
+    doc = Document(fixtures["text_pdf"])
+    correct = True
+    for query, pdf_page in _queries(fixtures["text_info"]).items():
+        correct &= pdf_page in text.get_page_nums_from_query_text(doc, query)
+    return doc.num_pages, correct
+
+
+def _table_list(fixtures):
+    record = tbl.locate_table_list(Document(fixtures["scanned_pdf"]))
+    info = fixtures["scanned_info"]
+    return record["start_page"] + len(record["table_list"]), \
+        record["start_page"] == info["list_start"]
+
+
+def _window_ocr(fixtures):
+    doc = Document(fixtures["scanned_pdf"])
+    queries = _queries(fixtures["scanned_info"])
+    found = file_scraper.find_pages(doc, list(queries), verbose=False, index=None,
+                                    fallback=False, budget=budgets.Budget())
+    correct = all(pdf_page in (found[query] or []) for query, pdf_page in queries.items())
+    # pages read: the table list pages plus each window searched
+    return len(doc.table_list["table_list"]) + len(queries) * file_scraper.WINDOW, correct
+
+
+def _full_fallback(fixtures):
+    doc = Document(fixtures["scanned_pdf"])
+    tables = [table for table in fixtures["scanned_info"]["tables"]
+              if table["pdf_page"] < FALLBACK_PAGES]
+    query = tables[-1]["title"]
+    found = file_scraper.search_whole_document(
+        doc, [query], verbose=False, fallback=True, max_matches=None,
+        budget=budgets.Budget(max_pages=FALLBACK_PAGES),
+    )
+    return FALLBACK_PAGES, tables[-1]["pdf_page"] in (found[query] or [])
+
+
+def _directory_merge(fixtures):
+    input_dir = fixtures["input_dir"]
+    docs = {}
+    found = {}
+    queries = ["Population", "Exports"]
+    for name, info in fixtures["directory"].items():
+        pdf_path = input_dir / name
+        docs[pdf_path] = Document(pdf_path)
+        found[pdf_path] = {
+            query: [table["pdf_page"] + offset for table in info["tables"]
+                    if table["title"].startswith(query) for offset in range(table["span"])]
+            for query in queries
+        }
+    directory_scraper.write_outputs(fixtures["output_dir"], input_dir.name, docs, queries,
+                                    found)
+    written = sum(len(pages) for results in found.values() for pages in results.values())
+    return written, all(
+        (fixtures["output_dir"] / f"{query}-scraped-{input_dir.name}.pdf").exists()
+        for query in queries
+    )
+
+
+STAGES = {
+    "classify": {"run": _classify, "needs": []},
+    "text_search": {"run": _text_search, "needs": []},
+    "table_list": {"run": _table_list, "needs": ["pdftoppm", "tesseract"]},
+    "window_ocr": {"run": _window_ocr, "needs": ["pdftoppm", "tesseract"]},
+    "full_fallback": {"run": _full_fallback, "needs": ["pdftoppm", "tesseract"]},
+    "directory_merge": {"run": _directory_merge, "needs": []},
+}
+
+
+def _describe(stage):
+    if "skipped" in stage:
+        return f"skipped ({stage['skipped']})"
+    return (f"{stage['seconds']:.3f}s, {stage['pages']} pages"
+            f"{'' if stage['correct'] else ', EXPECTED PAGES NOT FOUND'}")
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
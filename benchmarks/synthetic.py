@@ -0,0 +1,230 @@
+"""Synthetic Korean statistical yearbooks for benchmarking.
+
+Builds yearbooks laid out like the real ones the scraper is written for:
+a cover and foreword, a two-column list of tables (Korean titles on the
+left, English titles with printed page numbers on the right, chapters
+numbered I through XX), then a body of numeric tables with the printed page
+number at the foot of each page. The body starts printed page 1 right after
+the list, as search_table_list assumes.
+
+Yearbooks come either with a text layer (drawn with fpdf) or scanned
+(each page drawn with Pillow and embedded as a grayscale image).
+
+Hangul needs a CJK font: point BENCH_CJK_FONT at one (e.g. a Noto Sans CJK
+.otf). Without it the Korean column is drawn as romanized placeholder text,
+which does not change what the scraper reads (the English column).
+
+Example usage:
+    info = make_yearbook("2001_synthetic.pdf", num_pages=300, scanned=True)
+    print(info["tables"][0])
+"""
+from io import BytesIO
+import os
+import random
+
+from fpdf import FPDF
+from PIL import Image, ImageDraw, ImageFont
+
+# A4 in mm, as fpdf uses by default
+PAGE_WIDTH = 210
+PAGE_HEIGHT = 297
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII",
+         "XIII", "XIV", "XV", "XVI", "XVII", "XVIII", "XIX", "XX"]
+SUBJECTS = [
+    ("인구", "Population"), ("국내총생산", "Gross Domestic Product"),
+    ("소비자물가", "Consumer Prices"), ("고용", "Employment"), ("임금", "Wages"),
+    ("수출", "Exports"), ("수입", "Imports"), ("농업생산", "Agricultural Production"),
+    ("전력", "Electric Power"), ("교육", "Education"), ("보건", "Public Health"),
+    ("주택", "Housing"), ("운송", "Transportation"), ("통신", "Communications"),
+    ("재정", "Public Finance"), ("금융", "Money and Banking"), ("기후", "Climate"),
+    ("토지", "Land Use"), ("관광", "Tourism"), ("범죄", "Crime"),
+]
+REGIONS = ["by Province", "by Industry", "by Age Group", "by Sex", "by Month",
+           "by Type", "by Region", "by Size"]
+# lines of the table list per page, and body rows per table page
+LIST_LINES = 36
+TABLE_ROWS = 30
+
+
+def make_yearbook(pdf_path, num_pages=300, scanned=False, dpi=100, seed=0):
+    """Write a synthetic yearbook and return what a correct search should find.
+
+    Args:
+        pdf_path: where to write the pdf.
+        num_pages: total number of pages.
+        scanned: embed page images instead of a text layer.
+        dpi: resolution of scanned pages.
+        seed: seed for titles and numbers, so runs are reproducible.
+
+    Returns:
+        dict with "num_pages", "list_start" (pdf page of the list of tables),
+        "body_start" (pdf page of printed page 1) and "tables": a list of
+        {"title", "printed_page", "pdf_page"} dicts.
+    """
+    rng = random.Random(seed)
+    layout = _layout(num_pages, rng)
+    pages = _page_lines(layout, rng)
+    if scanned:
+        _write_scanned(pdf_path, pages, dpi)
+    else:
+        _write_text(pdf_path, pages)
+    return {
+        "num_pages": len(pages),
+        "list_start": layout["list_start"],
+        "body_start": layout["body_start"],
+        "tables": layout["tables"],
+    }
+
+
+def make_directory(input_dir, num_files=10, num_pages=60, scanned=False, first_year=2000):
+    """Write num_files yearbooks named by year into input_dir.
+
+    Returns:
+        dict of pdf file name -> make_yearbook() info.
+    """
+    os.makedirs(input_dir, exist_ok=True)
+    yearbooks = {}
+    for idx in range(num_files):
+        name = f"{first_year + idx}_synthetic.pdf"
+        yearbooks[name] = make_yearbook(os.path.join(input_dir, name), num_pages, scanned,
+                                        seed=idx)
+    return yearbooks
+
+
+def _layout(num_pages, rng):
+    """Decide the titles and page of every table.
+    """
+    list_start = 2
+    # tables fill most of the body; the rest are notes pages
+    spans = []
+    while sum(spans) < (num_pages - list_start) * 0.8:
+        spans.append(rng.choice([1, 1, 2]))
+    # one list line per table and chapter, plus the heading
+    list_pages = -(-(len(spans) + len(ROMAN) + 1) // LIST_LINES)
+    body_start = list_start + list_pages
+    body_pages = num_pages - body_start
+    while sum(spans) > body_pages:
+        spans.pop()
+    tables = []
+    printed_page = 1
+    for idx, span in enumerate(spans):
+        # chapters I through XX, as get_english_table_list expects
+        chapter = idx * len(ROMAN) // len(spans) + 1
+        korean, english = rng.choice(SUBJECTS)
+        region = rng.choice(REGIONS)
+        tables.append({
+            "chapter": chapter,
+            "number": f"{chapter}.{idx + 1}",
+            "korean": f"{korean} {region}",
+            "title": f"{english} {region}",
+            "printed_page": printed_page,
+            "pdf_page": body_start + printed_page - 1,
+            "span": span,
+        })
+        printed_page += span
+    return {"list_start": list_start, "list_pages": list_pages, "body_start": body_start,
+            "body_pages": body_pages, "tables": tables}
+
+
+def _page_lines(layout, rng):
+    """Lines of every page, as (left column, right column) pairs.
+
+    Single-column lines have an empty right column.
+    """
+    pages = [
+        [("", ""), ("KOREA STATISTICAL YEARBOOK", ""), ("한국통계연감", "")],
+        [("Foreword", ""), ("This yearbook presents the principal statistics of Korea.", "")],
+    ]
+    # list of tables, two columns
+    lines = []
+    chapter = 0
+    for table in layout["tables"]:
+        if table["chapter"] != chapter:
+            chapter = table["chapter"]
+            lines.append((f"{ROMAN[chapter - 1]}. 제{chapter}장",
+                          f"{ROMAN[chapter - 1]}. Chapter {chapter}"))
+        lines.append((
+            f"{table['number']} {table['korean']} ..... {table['printed_page']}",
+            f"{table['number']} {table['title']} ..... {table['printed_page']}",
+        ))
+    lines.insert(0, ("통계표 목록", "List of Tables"))
+    for page_idx in range(layout["list_pages"]):
+        pages.append(lines[page_idx * LIST_LINES:(page_idx + 1) * LIST_LINES])
+
+    # body
+    by_page = {}
+    for table in layout["tables"]:
+        for offset in range(table["span"]):
+            by_page[table["printed_page"] + offset] = (table, offset)
+    for printed_page in range(1, layout["body_pages"] + 1):
+        page = []
+        if printed_page in by_page:
+            table, offset = by_page[printed_page]
+            cont = " (Cont'd)" if offset else ""
+            page.append((f"{table['number']} {table['korean']}",
+                         f"Table {table['number']} {table['title']}{cont}"))
+            for row in range(TABLE_ROWS):
+                values = "  ".join(f"{rng.randint(0, 999999):>7,}" for _ in range(5))
+                page.append((f"{2000 + row}  {values}", ""))
+        else:
+            page.append(("Notes and sources", ""))
+        page.append((f"- {printed_page} -", ""))
+        pages.append(page)
+    return pages
+
+
+def _cjk_font():
+    return os.getenv("BENCH_CJK_FONT")
+
+
+def _romanize(text):
+    """Stand-in for Hangul when no CJK font is available.
+    """
+    if all(ord(char) < 128 for char in text):
+        return text
+    return "".join(char if ord(char) < 128 else "k" for char in text)
+
+
+def _write_text(pdf_path, pages):
+    pdf = FPDF()
+    cjk_font = _cjk_font()
+    if cjk_font:
+        pdf.add_font("cjk", fname=cjk_font)
+    for lines in pages:
+        pdf.add_page()
+        for idx, (left, right) in enumerate(lines):
+            y = 15 + idx * 7
+            if cjk_font:
+                pdf.set_font("cjk", size=9)
+            else:
+                pdf.set_font("Times", size=9)
+                left = _romanize(left)
+            pdf.text(12, y, left)
+            if right:
+                pdf.set_font("Times", size=9)
+                pdf.text(PAGE_WIDTH / 2 + 3, y, right)
+    pdf.output(str(pdf_path))
+
+
+def _write_scanned(pdf_path, pages, dpi):
+    width = int(PAGE_WIDTH / 25.4 * dpi)
+    height = int(PAGE_HEIGHT / 25.4 * dpi)
+    size = max(8, dpi // 9)
+    latin = ImageFont.load_default(size=size)
+    cjk_font = _cjk_font()
+    korean = ImageFont.truetype(cjk_font, size) if cjk_font else latin
+    pdf = FPDF()
+    for lines in pages:
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        for idx, (left, right) in enumerate(lines):
+            y = int((15 + idx * 7) / 25.4 * dpi)
+            draw.text((int(12 / 25.4 * dpi), y), left if cjk_font else _romanize(left),
+                      font=korean, fill=0)
+            if right:
+                draw.text((width // 2 + int(3 / 25.4 * dpi), y), right, font=latin, fill=0)
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        pdf.add_page()
+        pdf.image(buffer, x=0, y=0, w=PAGE_WIDTH, h=PAGE_HEIGHT)
+    pdf.output(str(pdf_path))
@@ -1,66 +1,511 @@
 """Scan directories containing yearbook pdfs.
 
 Note: assumes pdfs begin with their year for sorting.
+
+Set SCRAPE_WORKERS to scrape several pdfs at once in worker processes.
+The merged output keeps the year-sorted order regardless of which file
+finishes first.
+
+Pdfs without a list of tables need a full-document ocr, which is by far the
+most expensive search. Those are deferred until every other pdf is done and
+then run smallest first. Every ocr search of a run, in the calling process or
+in a worker, is within the per-run and per-file budgets set in the
+environment (see tools/budget.py); the run budget starts with the run. A
+file whose budget runs out contributes the matches found so far and is
+reported as partial.
 """
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+import csv
+import heapq
 import os
 from pathlib import Path
-import tempfile
+import re
+import sys
 
 from dotenv import load_dotenv
 from pypdf import PdfReader, PdfWriter
 
-from scraper.file_scraper import main as scrape
+from scraper.file_scraper import (fallback_allowed, find_pages, pages_from_matches,
+                                  search_whole_document)
+from scraper.tools import budget as budgets
 from scraper.tools import pdf_page_utils as p
+from scraper.tools import table_extract
+from scraper.tools import text_index
+from scraper.tools.document import Document
+from scraper.tools.merged_pdf import MergedPdfWriter
+
+# characters replaced in file names made from queries
+_UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
 
-def main(query, verbose):
+def main(query, verbose, workers=None, fallback=None):
     load_dotenv()
     INPUT_DIR = Path(os.getenv('INPUT_DIR'))
     OUTPUT_DIR = Path(os.getenv('OUTPUT_DIR'))
-    merged_writer = PdfWriter()
+    workers = _worker_count(workers)
+    run_budget = budgets.from_env("RUN")
+    new_file_name = f"{query_file_name(query)}-scraped-{INPUT_DIR.name}.pdf"
 
     files_not_written = []
 
-    for pdf in sorted(os.listdir(INPUT_DIR)):
-        # guard against non-pdf files
-        if not pdf.lower().endswith(".pdf"):
-            continue
-        pdf_path = INPUT_DIR / pdf
+    _update_index(INPUT_DIR, verbose)
 
-        if verbose:
-            # increase legibility
-            print()
-            print()
+    pdf_paths = _list_pdfs(INPUT_DIR)
+    docs = {pdf_path: Document(pdf_path) for pdf_path in pdf_paths}
+    # each file's section is written out as soon as it is found, in year order
+    with MergedPdfWriter(output_path(OUTPUT_DIR, new_file_name)) as merged_writer:
 
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-            temp_info_path = tmp.name
-        p.create_pdf_with_text(temp_info_path, f"File: {pdf_path.stem}\nQuery: {query}")
-        
-        info_reader = PdfReader(temp_info_path)
-        merged_writer.add_page(info_reader.pages[0])
-        
-        os.remove(temp_info_path)
-
-        # then scrape
-        output_writer = scrape(pdf_path, query, verbose)
-        if output_writer is not None:
-            for page in output_writer.pages:
-                merged_writer.add_page(page)
-            if verbose:
-                print("Scraped pages added.")
+        def add_section(pdf_path, output_writer):
+            pages = [_header_page(pdf_path, query)]
+            if output_writer is not None:
+                pages.extend(output_writer.pages)
+                if verbose:
+                    print("Scraped pages added.")
+            else:
+                if verbose:
+                    files_not_written.append(pdf_path.stem)
+                    print("Moving to next file.")
+            merged_writer.add_section(pages, order=pdf_paths.index(pdf_path))
+            # the file is done: release its bytes
+            docs[pdf_path].close()
+
+        if workers > 1:
+            found, deferred, partial = _find_pages_concurrently(pdf_paths, [query], workers,
+                                                                verbose, run_budget)
+            for pdf_path in pdf_paths:
+                if pdf_path not in deferred:
+                    add_section(pdf_path, _writer_from_results(
+                        docs[pdf_path], found[pdf_path][query], verbose
+                    ))
         else:
-            if verbose:
-                files_not_written.append(pdf_path.stem)
-                print("Moving to next file.")
-        
-        new_file_name = f"{query}-scraped-{INPUT_DIR.name}.pdf"
-        output_path = OUTPUT_DIR / new_file_name
-    with open(output_path, "wb") as f:
-        merged_writer.write(f)
+            found = {}
+            deferred = []
+            partial = set()
+            for pdf_path in pdf_paths:
+                if verbose:
+                    # increase legibility
+                    print()
+                    print()
+                file_budget = budgets.from_env("FILE", parent=run_budget)
+                # pdfs without a list of tables are searched last
+                found[pdf_path] = find_pages(docs[pdf_path], [query], verbose, fallback=False,
+                                             budget=file_budget)
+                if file_budget.stopped:
+                    partial.add(pdf_path)
+                if _fallback_pending(docs[pdf_path]):
+                    deferred.append(pdf_path)
+                else:
+                    add_section(pdf_path, _writer_from_results(
+                        docs[pdf_path], found[pdf_path][query], verbose
+                    ))
+        fallbacks = _search_deferred([docs[pdf_path] for pdf_path in deferred], [query],
+                                     fallback, verbose, run_budget)
+        for pdf_path, (results, note) in fallbacks.items():
+            found[pdf_path] = results
+            add_section(pdf_path, _writer_from_results(docs[pdf_path], results[query], verbose))
+            if note:
+                partial.add(pdf_path)
+
+    if _extract_tables():
+        _write_tables(OUTPUT_DIR, INPUT_DIR.name, docs, [query], found, verbose)
+
+    files_partial = [pdf_path.stem for pdf_path in pdf_paths if pdf_path in partial]
     if verbose:
         print(f"{new_file_name} written to output directory.")
         print("Files not written: " + str(files_not_written))
+        if files_partial:
+            print("Files cut short by the ocr budget: " + str(files_partial))
+
+
+def batch_main(queries, verbose, workers=None, fallback=None):
+    """Scrape INPUT_DIR for several queries in a single pass.
+
+    Each yearbook is opened and searched once for all queries, then one
+    merged pdf per query and a combined csv report are written to OUTPUT_DIR.
+
+    Args:
+        queries: list of search terms.
+        verbose: print progress.
+        workers: number of pdfs to scrape at once. Defaults to SCRAPE_WORKERS, or 1.
+        fallback: whether to ocr whole pdfs that have no list of tables.
+            None follows SCRAPE_FALLBACK, or asks once for all of them.
+    """
+    load_dotenv()
+    INPUT_DIR = Path(os.getenv('INPUT_DIR'))
+    OUTPUT_DIR = Path(os.getenv('OUTPUT_DIR'))
+    workers = _worker_count(workers)
+    run_budget = budgets.from_env("RUN")
+
+    _update_index(INPUT_DIR, verbose)
+
+    pdf_paths = _list_pdfs(INPUT_DIR)
+    # parsed once for the search and for copying out matched pages
+    docs = {pdf_path: Document(pdf_path) for pdf_path in pdf_paths}
+    try:
+        found, notes = search_files(docs, queries, verbose, workers, fallback, run_budget)
+        write_outputs(OUTPUT_DIR, INPUT_DIR.name, docs, queries, found, notes, verbose)
+    finally:
+        _close_all(docs)
+
+
+def search_files(docs, queries, verbose, workers=1, fallback=None, run_budget=None):
+    """Search pdfs for every query, deferring full-document ocr to the end.
+
+    Args:
+        docs: dict of pdf path -> Document.
+        queries: list of search terms.
+        verbose: print progress.
+        workers: number of pdfs to search at once.
+        fallback: whether to ocr whole pdfs that have no list of tables.
+        run_budget: budget.Budget every file's budget draws on. Defaults to
+            the per-run limits in the environment, starting now.
+
+    Returns:
+        (dict of pdf path -> {query: page numbers or None},
+         dict of pdf path -> budget note, see _search_deferred)
+    """
+    if run_budget is None:
+        run_budget = budgets.from_env("RUN")
+    pdf_paths = list(docs)
+    if workers > 1:
+        found, deferred, partial = _find_pages_concurrently(pdf_paths, queries, workers,
+                                                            verbose, run_budget)
+    else:
+        found = {}
+        partial = set()
+        for pdf_path in pdf_paths:
+            if verbose:
+                # increase legibility
+                print()
+                print()
+            file_budget = budgets.from_env("FILE", parent=run_budget)
+            # pdfs without a list of tables are searched last
+            found[pdf_path] = find_pages(docs[pdf_path], queries, verbose, fallback=False,
+                                         budget=file_budget)
+            if file_budget.stopped:
+                partial.add(pdf_path)
+        deferred = [pdf_path for pdf_path in pdf_paths if _fallback_pending(docs[pdf_path])]
+    notes = {pdf_path: "partial" for pdf_path in partial}
+    fallbacks = _search_deferred([docs[pdf_path] for pdf_path in deferred], queries,
+                                 fallback, verbose, run_budget)
+    for pdf_path, (results, note) in fallbacks.items():
+        found[pdf_path] = results
+        notes[pdf_path] = note
+    return found, notes
+
+
+def write_outputs(output_dir, dir_name, docs, queries, found, notes=None, verbose=False,
+                  extract=None, fresh=None, section_dir=None):
+    """Write one merged pdf per query and the csv report of a batch run.
+
+    Args:
+        output_dir: directory to write to.
+        dir_name: name of the input directory, used in the file names.
+        docs: dict of pdf path -> Document (or path), in output order.
+        queries: list of search terms.
+        found: dict of pdf path -> {query: page numbers or None}.
+        notes: dict of pdf path -> budget note (see _search_deferred).
+        verbose: print progress.
+        extract: also write the matched tables as rows and columns (see
+            _write_tables). None follows EXTRACT_TABLES.
+        fresh: pdf paths searched since the last write to output_dir. The
+            tables of other pdfs are reused from their csv when there is one.
+            None re-extracts all of them.
+        section_dir: directory keeping each pdf's section of every merged pdf
+            (as <query>/<file>.pdf, see query_file_name) between writes. The sections of pdfs not
+            in fresh are copied from there instead of being cut from their
+            pdf again.
+    """
+    notes = notes or {}
+    report_rows = []
+    with ExitStack() as stack:
+        merged_writers = {
+            query: stack.enter_context(
+                MergedPdfWriter(output_path(
+                    output_dir, f"{query_file_name(query)}-scraped-{dir_name}.pdf"
+                ))
+            )
+            for query in queries
+        }
+        _write_sections(merged_writers, docs, queries, found, notes, report_rows, fresh,
+                        section_dir)
+    if verbose:
+        for merged_writer in merged_writers.values():
+            print(f"{merged_writer.output_path.name} written to output directory.")
+
+    report_path = output_dir / f"batch-report-{dir_name}.csv"
+    with open(report_path, "w", newline="") as f:
+        report = csv.DictWriter(f, fieldnames=["file", "query", "status", "pages"])
+        report.writeheader()
+        report.writerows(report_rows)
+    if verbose:
+        print(f"{report_path.name} written to output directory.")
+
+    if extract is None:
+        extract = _extract_tables()
+    if extract:
+        _write_tables(output_dir, dir_name, docs, queries, found, verbose, fresh)
+
+
+def _write_tables(output_dir, dir_name, docs, queries, found, verbose, fresh=None):
+    """Write the tables on the matched pages, per yearbook and stacked over all of them.
+
+    Per query, each yearbook's tables go to <query>-tables-<dir>/<file>.csv
+    and all of them, in year order, to <query>-table-<dir>.csv. Yearbooks
+    not in fresh (when given) keep the tables of their existing csv.
+    """
+    for query in queries:
+        tables_dir = output_path(output_dir, f"{query_file_name(query)}-tables-{dir_name}")
+        tables_dir.mkdir(exist_ok=True)
+        stacked = []
+        for pdf_path, doc in docs.items():
+            page_nums = found[pdf_path][query]
+            csv_path = tables_dir / f"{pdf_path.stem}.csv"
+            if fresh is not None and pdf_path not in fresh and csv_path.exists():
+                stacked.extend(table_extract.read_tables(csv_path, pdf_path.stem))
+                continue
+            tables = table_extract.extract_tables(doc, page_nums) if page_nums else []
+            if tables:
+                table_extract.write_tables(tables, csv_path)
+                stacked.extend(tables)
+            else:
+                csv_path.unlink(missing_ok=True)
+                csv_path.with_suffix(".parquet").unlink(missing_ok=True)
+        stacked_path = output_path(output_dir,
+                                   f"{query_file_name(query)}-table-{dir_name}.csv")
+        table_extract.write_tables(stacked, stacked_path, with_source=True)
+        if verbose:
+            print(f"{stacked_path.name} written to output directory.")
+
+
+def _write_sections(merged_writers, docs, queries, found, notes, report_rows, fresh=None,
+                    section_dir=None):
+    """Add each file's section to the merged pdf of every query, and its report rows.
+
+    A file given by path is opened (once for all queries) only when one of
+    its sections is not kept in section_dir.
+    """
+    for pdf_path, doc in docs.items():
+        results = found[pdf_path]
+        opened = None
+        for query in queries:
+            page_nums = results[query]
+            section_path = None
+            if section_dir is not None:
+                section_path = section_dir / query_file_name(query) / f"{pdf_path.stem}.pdf"
+            if (section_path is not None and section_path.exists()
+                    and fresh is not None and pdf_path not in fresh):
+                pages = list(PdfReader(section_path).pages)
+            else:
+                if not isinstance(doc, Document):
+                    doc = opened = Document(pdf_path)
+                pages = [_header_page(pdf_path, query)]
+                output_writer = _writer_from_results(doc, page_nums, verbose=False)
+                if output_writer is not None:
+                    pages.extend(output_writer.pages)
+                if section_path is not None:
+                    _save_section(pages, section_path)
+            merged_writers[query].add_section(pages)
+            report_rows.append({
+                "file": pdf_path.stem,
+                "query": query,
+                "status": _status(page_nums, notes.get(pdf_path)),
+                # 1-based, as shown in pdf viewers
+                "pages": " ".join(str(page_num + 1) for page_num in page_nums or []),
+            })
+        if opened is not None:
+            opened.close()
+
+
+def _save_section(pages, section_path):
+    section_path.parent.mkdir(parents=True, exist_ok=True)
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(page)
+    with open(section_path, "wb") as f:
+        writer.write(f)
+
+
+def query_file_name(query):
+    """query made safe for use in output file names.
+
+    Path separators and characters windows does not allow become "_", and
+    leading or trailing dots and spaces are dropped, so a query never names
+    a file outside the output directory.
+    """
+    name = _UNSAFE_NAME_RE.sub("_", query).strip(". ")
+    return name or "query"
+
+
+def output_path(output_dir, name):
+    """output_dir / name, checked to stay inside output_dir.
+
+    Raises:
+        ValueError: name leads out of output_dir.
+    """
+    output_dir = Path(output_dir).resolve()
+    path = (output_dir / name).resolve()
+    if path.parent != output_dir:
+        raise ValueError(f"Output name {name!r} is not inside {output_dir}")
+    return path
+
+
+def read_queries(query_file):
+    """Read one query per line, skipping blank lines and # comments.
+    """
+    with open(query_file) as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def _find_pages_concurrently(pdf_paths, queries, workers, verbose, run_budget):
+    """Search pdfs in worker processes, deferring those without a list of tables.
+
+    A pdf is only handed to a worker once one is free, so each worker starts
+    from what is left of the run budget; the pages it used are charged to
+    the run budget when it finishes.
+
+    Returns:
+        (dict of pdf path -> find_pages() results, filled in as workers
+        finish; list of pdf paths that need a full-document ocr; set of pdf
+        paths whose file budget ran out)
+    """
+    found = {}
+    deferred = []
+    partial = set()
+    queue = list(pdf_paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        while queue or futures:
+            while queue and len(futures) < workers:
+                pdf_path = queue.pop(0)
+                future = pool.submit(_find_pages_or_defer, pdf_path, queries, run_budget)
+                futures[future] = pdf_path
+            future = next(as_completed(futures))
+            pdf_path = futures.pop(future)
+            found[pdf_path], pending, pages_used, stopped = future.result()
+            run_budget.charge(pages_used)
+            if pending:
+                deferred.append(pdf_path)
+            if stopped:
+                partial.add(pdf_path)
+            if verbose:
+                print(f"Finished {pdf_path.name}.")
+    return found, sorted(deferred), partial
+
+
+def _find_pages_or_defer(pdf_path, queries, run_budget):
+    """Worker: search a pdf without falling back to a full-document ocr.
+
+    Returns:
+        (find_pages() results, whether the pdf needs the fallback, pages
+        ocr'd, whether the file budget ran out)
+    """
+    # run_budget is the worker's copy; the caller charges the pages to the real one
+    file_budget = budgets.from_env("FILE", parent=run_budget)
+    with Document(pdf_path) as doc:
+        results = find_pages(doc, queries, False, fallback=False, budget=file_budget)
+        return results, _fallback_pending(doc), file_budget.pages_used, file_budget.stopped
+
+
+def _extract_tables():
+    return os.getenv("EXTRACT_TABLES", "").lower() in ("1", "y", "yes", "true")
+
+
+def _close_all(docs):
+    for doc in docs.values():
+        if isinstance(doc, Document):
+            doc.close()
+
+
+def _fallback_pending(doc):
+    # set by tablelist_utils.locate_table_list when the document has no list of tables
+    return doc.table_list is not None and not doc.table_list["found"]
+
+
+def _search_deferred(docs, queries, fallback, verbose, run_budget):
+    """Ocr whole documents that have no list of tables, smallest first, within budgets.
+
+    Returns:
+        dict of pdf path -> (find_pages() style results, note) where note is
+        None, "partial" (the file budget ran out) or "over budget" (the run
+        budget ran out before the file was started).
+    """
+    searched = {}
+    if not docs:
+        return searched
+    if fallback is None:
+        if verbose:
+            print(f"{len(docs)} pdfs have no list of tables.")
+        fallback = fallback_allowed()
+    if not fallback:
+        return {doc.path: ({query: None for query in queries}, None) for doc in docs}
+
+    # cheapest files first, so that a run budget is spent on as many files as possible
+    queue = [(doc.num_pages, idx, doc) for idx, doc in enumerate(docs)]
+    heapq.heapify(queue)
+    while queue:
+        _, _, doc = heapq.heappop(queue)
+        if run_budget.exhausted():
+            searched[doc.path] = ({query: None for query in queries}, "over budget")
+            continue
+        file_budget = budgets.from_env("FILE", parent=run_budget)
+        if verbose:
+            print()
+            print(f"PROCESSING: {doc.name} (full document ocr)")
+        results = search_whole_document(doc, queries, verbose, True, budget=file_budget)
+        searched[doc.path] = (results, "partial" if file_budget.stopped else None)
+    return searched
+
+
+def _writer_from_results(pdf_path, page_nums, verbose):
+    if page_nums is None:
+        return None
+    return pages_from_matches(pdf_path, page_nums, verbose)
+
+
+def _list_pdfs(input_dir):
+    # guard against non-pdf files
+    return [input_dir / pdf for pdf in sorted(os.listdir(input_dir))
+            if pdf.lower().endswith(".pdf")]
+
+
+def _worker_count(workers):
+    if workers is None:
+        workers = int(os.getenv("SCRAPE_WORKERS", 1))
+    return workers
+
+
+def _status(page_nums, note=None):
+    if note == "over budget":
+        return note
+    if page_nums is None:
+        return "not searched"
+    status = f"{len(page_nums)} matches" if page_nums else "no matches"
+    if note == "partial":
+        status = f"partial: {status}"
+    return status
+
+
+def _header_page(pdf_path, query):
+    """Page naming the file and query, placed ahead of its scraped pages.
+    """
+    return p.create_page_with_text(f"File: {pdf_path.stem}\nQuery: {query}")
+
+
+def _update_index(input_dir, verbose):
+    """Add new or changed pdfs to the configured text index, if any.
+    """
+    index = text_index.get_default_index()
+    if index is not None:
+        text_index.build_index(_list_pdfs(input_dir), index, verbose)
+
 
 if __name__ == "__main__":
-    print("Enter your query: ", end="")
-    query = input()
-    main(query, verbose=True)
\ No newline at end of file
+    if len(sys.argv) > 1:
+        # batch mode: python -m scraper.directory_scraper queries.txt
+        batch_main(read_queries(sys.argv[1]), verbose=True)
+    else:
+        print("Enter your query: ", end="")
+        query = input()
+        main(query, verbose=True)
\ No newline at end of file
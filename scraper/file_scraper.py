@@ -7,18 +7,31 @@ directory_scraper, as each file in the directory goes through this program.
 
 import os
 from pathlib import Path
+import sys
 
 from dotenv import load_dotenv
-from pypdf import PdfReader
 
+from scraper.tools import budget as budgets
 from scraper.tools import text_pdfs as text
 from scraper.tools import pdf_page_utils as p
+from scraper.tools import metrics
 from scraper.tools import ocr
+from scraper.tools import page_offsets
 from scraper.tools import tablelist_utils as tbl
+from scraper.tools import text_index
+from scraper.tools.document import open_document
 from scraper.tools.tablelist_utils import TableListNotFoundError
 
+# pages searched either side of the page predicted from the table list
+WINDOW = 5
+# ... once the page offset of the yearbook has been learned
+CALIBRATED_WINDOW = 1
+# scanned pdfs: stop ocr'ing once this many pages match (None reads every page)
+MAX_MATCHES = 2
 
-def main(pdf_path, query, verbose=True):
+
+def main(pdf_path, query, verbose=True, index=None, fallback=None,
+         max_matches=MAX_MATCHES, budget=None):
     """Main method for file_scraper returning pages from search.
 
     Search pages by either running this program as a module
@@ -26,59 +39,174 @@ def main(pdf_path, query, verbose=True):
     in directory_scraper.py.
 
     Args:
-        pdf_path: path to pdf for scraping.
+        pdf_path: path to pdf (or Document) for scraping.
         query: search term to look for.
+        index: TextIndex to consult for text pdfs. Defaults to the index
+            configured by TEXT_INDEX_PATH, if any.
+        fallback: whether to ocr the whole document when it has no list of
+            tables. None follows SCRAPE_FALLBACK, or asks the user.
+        max_matches: for scanned pdfs, stop reading pages once this many
+            match. None reads the whole search window.
+        budget: budget.Budget limiting the pages ocr'd. Defaults to the
+            per-file and per-run limits in the environment.
     
     Returns:
         Pages from search as PdfWriter instance.
         If # of matches > 2, return only after the 2nd match.
     """
+    doc = open_document(pdf_path)
+    page_nums = find_pages(doc, [query], verbose, index, fallback, max_matches,
+                           budget)[query]
+    if page_nums is None:
+        return
+    return pages_from_matches(doc, page_nums, verbose)
+
+
+def find_pages(pdf_path, queries, verbose=True, index=None, fallback=None,
+               max_matches=MAX_MATCHES, budget=None):
+    """Search a pdf for several queries, doing the per-file work once.
+
+    Text is extracted (or the table list and pages are ocr'd) once and every
+    query is evaluated against the same text. Scanned pages are read outward
+    from the page predicted by the table list, stopping at max_matches.
+
+    Args:
+        pdf_path: path to pdf (or Document) for scraping.
+        queries: search terms to look for.
+        index: TextIndex to consult for text pdfs.
+        fallback: whether to ocr the whole document when it has no list of
+            tables. None follows SCRAPE_FALLBACK, or asks the user.
+        max_matches: for scanned pdfs, stop reading pages once this many
+            match. None reads the whole search window.
+        budget: budget.Budget limiting the pages ocr'd. Defaults to the
+            per-file and per-run limits in the environment. When it runs out
+            the matches found so far are returned and budget.stopped is set.
+
+    Returns:
+        dict of query -> list of matching page numbers, or None for queries
+        that could not be searched (no page in the table list, or the full
+        document ocr was declined).
+    """
+    if budget is None:
+        # searched on its own, the file is the whole run
+        budget = budgets.from_env("FILE", parent=budgets.from_env("RUN"))
+    doc = open_document(pdf_path)
+    with metrics.scope(file=doc.name), metrics.timer("file"):
+        return _find_pages(doc, queries, verbose, index, fallback, max_matches, budget)
+
+
+def _find_pages(doc, queries, verbose, index, fallback, max_matches, budget):
     if verbose:
-        print(f"PROCESSING: {pdf_path.name}")
+        print(f"PROCESSING: {doc.name}")
         print("Attempting to extract text...")
-    page_nums = []
+    if index is None:
+        index = text_index.get_default_index()
+    has_text = index.has_text(doc) if index is not None else None
+    if has_text is None:
+        with metrics.timer("classify"):
+            has_text = text.pdf_has_text(doc)
     # branch logic according to text vs scanned pdf
-    if text.pdf_has_text(pdf_path):
+    if has_text:
         if verbose:
             print("Text pdf registered.")
             print("Searching pdf for query...")
-        page_nums = text.get_page_nums_from_query_text(pdf_path, query)
-
-    else:
-        # is ocr
-        if verbose:
-            print("Scanned pdf registered.")
-            print("Checking for list of tables.")
+        results = {}
+        for query in queries:
+            page_nums = index.search(doc, query) if index is not None else None
+            if page_nums is None:
+                # extracted page texts are kept by the Document between queries
+                with metrics.timer("text_search", query=query):
+                    page_nums = text.get_page_nums_from_query_text(doc, query)
+            results[query] = page_nums
+        return results
+
+    # is ocr
+    if verbose:
+        print("Scanned pdf registered.")
+        print("Checking for list of tables.")
+    # shared between queries so that no page is ocr'd twice
+    page_texts = {}
+    results = {}
+    for query in queries:
         try:
-            relevant_page_num = tbl.search_table_list(pdf_path, query)
+            relevant_page_num = tbl.search_table_list(doc, query, budget)
         except TableListNotFoundError:
-            print("Pdf does not contain visible list of tables.")
-            print("Scan pdf using ocr anyways? (this may take a while for large files)")
-            print("Y/n: ", end="")
-            user_input = input()
-            if user_input != "Y":
-                return
-            # do ocr on whole document
-            reader = PdfReader(pdf_path)
-            start = 0
-            end = len(reader.pages)
-            page_nums = ocr.get_page_nums_from_query_ocr(pdf_path, query, start, end)
-        
-        if verbose:
+            return search_whole_document(doc, queries, verbose, fallback, max_matches,
+                                         budget)
+        if verbose and not results:
             print("Table list found.")
 
-        if relevant_page_num is None and verbose:
-            print("No page number found in table list")
-            return
-        elif relevant_page_num is not None and verbose:
+        if relevant_page_num is None:
+            if verbose:
+                print(f"No page number found in table list for {query}")
+            results[query] = None
+            continue
+        if verbose:
             print(f"Page number found from table list: {relevant_page_num}")
             print(f"Searching pages near {relevant_page_num}...")
-            start, end = p.get_page_nums_near(pdf_path, relevant_page_num, 5)
-            page_nums = ocr.get_page_nums_from_query_ocr(pdf_path, query, start, end)
-        else:
-            return
-    
-                
+        window = WINDOW
+        if page_offsets.is_calibrated(doc, relevant_page_num):
+            window = CALIBRATED_WINDOW
+        start, end = p.get_page_nums_near(doc, relevant_page_num, window)
+        with metrics.timer("window_ocr", query=query):
+            results[query] = ocr.get_page_nums_outward(
+                doc, query, relevant_page_num, start, end, max_matches,
+                page_texts=page_texts, budget=budget
+            )
+    # learn the printed page numbering from the pages just read
+    page_offsets.observe(doc, page_texts)
+    return results
+
+
+def search_whole_document(pdf_path, queries, verbose=True, fallback=None,
+                          max_matches=MAX_MATCHES, budget=None):
+    """Ocr the whole document if allowed and search it for every query.
+
+    Args are as for find_pages. A budget that runs out part way leaves the
+    remaining pages (and queries) unread.
+    """
+    if verbose:
+        print("Pdf does not contain visible list of tables.")
+    if fallback is None:
+        fallback = fallback_allowed()
+    if not fallback:
+        return {query: None for query in queries}
+    # do ocr on whole document
+    doc = open_document(pdf_path)
+    start = 0
+    end = doc.num_pages
+    page_texts = {}
+    with metrics.scope(file=doc.name), metrics.timer("fallback_ocr"):
+        results = {
+            query: ocr.get_page_nums_until(
+                doc, query, start, end, max_matches, page_texts=page_texts, budget=budget
+            )
+            for query in queries
+        }
+    page_offsets.observe(doc, page_texts)
+    return results
+
+
+def fallback_allowed():
+    """Whether to ocr a whole document, from SCRAPE_FALLBACK or by asking.
+
+    Without SCRAPE_FALLBACK and without a terminal to ask on, the answer is
+    no, so unattended runs never block on input().
+    """
+    policy = os.getenv("SCRAPE_FALLBACK")
+    if policy:
+        return policy.lower() in ("1", "y", "yes", "true")
+    if not sys.stdin.isatty():
+        print("Skipping full ocr (set SCRAPE_FALLBACK=yes to allow it unattended).")
+        return False
+    print("Scan pdf using ocr anyways? (this may take a while for large files)")
+    print("Y/n: ", end="")
+    return input() == "Y"
+
+
+def pages_from_matches(pdf_path, page_nums, verbose=True):
+    """Report matches and return the matching pages as a PdfWriter, or None.
+    """
     match len(page_nums):
         case 0:
             if verbose:
@@ -108,7 +236,7 @@ if __name__ == "__main__":
     if output_pdf is not None:
         output_path = OUTPUT_DIR / f"scraped-{FILE_PATH.stem}.pdf"
 
-        with open(output_path, "wb") as f:
+        with open(output_path, "wb") as f, metrics.timer("write"):
             output_pdf.write(f)
 
         print(f"output file written to {output_path}.")
\ No newline at end of file
@@ -0,0 +1,325 @@
+"""Local http service that runs scrape jobs on a pool of warm workers.
+
+Starting python for every search re-imports pypdf, pdf2image and the ocr
+engine, re-reads .env and starts with cold caches. The service starts once;
+its worker processes stay alive between jobs and keep every Document they
+opened (extracted text, located table list, content hash) and their ocr
+engines (see tools/ocr_backend.py), so repeated queries against the same
+yearbooks only pay for the search itself.
+
+Run with:
+    python -m scraper.service
+It listens on SERVICE_HOST:SERVICE_PORT (default 127.0.0.1:8765) and runs
+SERVICE_WORKERS jobs at once (default 2). Job outputs go to a directory per
+job under OUTPUT_DIR/jobs. Only the last SERVICE_MAX_JOBS finished jobs
+(default 100) are kept; older ones are forgotten and their outputs deleted.
+Queries are made safe before they name output files (see
+directory_scraper.query_file_name).
+
+Endpoints:
+    POST /jobs               {"path": file or directory, "queries": [...],
+                              "fallback": optional bool} -> job
+    GET  /jobs               all jobs
+    GET  /jobs/<id>          one job, with its results once done
+    GET  /jobs/<id>/files/<name>  download an output (merged pdf or csv report)
+
+Relative paths are taken from INPUT_DIR. The service never prompts: whole
+document ocr of pdfs without a list of tables follows the job's "fallback",
+or else SCRAPE_FALLBACK, within the budgets in the environment.
+
+Example usage:
+    curl -X POST localhost:8765/jobs -d '{"path": "2001.pdf", "queries": ["Exports"]}'
+    curl localhost:8765/jobs/<id>
+"""
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+from urllib.parse import unquote
+import uuid
+
+from dotenv import load_dotenv
+
+from scraper import directory_scraper
+from scraper.tools.document import Document
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_JOBS = 100
+# Documents a worker keeps between jobs
+MAX_SESSIONS = 32
+
+# worker process state: pdf path -> ((size, mtime), Document), least recently used first
+_sessions = {}
+
+
+class Job:
+    """A requested search and, once run, its outcome.
+    """
+
+    def __init__(self, path, queries, fallback=None):
+        self.id = uuid.uuid4().hex
+        self.path = Path(path)
+        self.queries = queries
+        self.fallback = fallback
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        # report rows and output file names, set when done
+        self.report = None
+        self.outputs = []
+        self.error = None
+
+    @property
+    def status(self):
+        if self.finished is not None:
+            return "failed" if self.error is not None else "done"
+        if self.future is not None and (self.future.running() or self.future.done()):
+            return "running"
+        return "queued"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "path": str(self.path),
+            "queries": self.queries,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+            "report": self.report,
+            "outputs": self.outputs,
+            "error": self.error,
+        }
+
+
+class ScrapeService:
+    """Queue of scrape jobs run by a pool of long-lived worker processes.
+
+    Args:
+        output_dir: directory under which each job gets its output directory.
+        input_dir: directory that relative job paths are resolved against.
+        workers: number of jobs run at once.
+        max_jobs: finished jobs kept. Beyond it the oldest are forgotten and
+            their output directories deleted.
+    """
+
+    def __init__(self, output_dir, input_dir=None, workers=DEFAULT_WORKERS,
+                 max_jobs=DEFAULT_MAX_JOBS):
+        self.output_dir = Path(output_dir)
+        self.input_dir = Path(input_dir) if input_dir is not None else None
+        self.max_jobs = max_jobs
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, path, queries, fallback=None):
+        """Queue a search of a pdf or directory of pdfs for queries.
+
+        Raises:
+            ValueError: no such file or directory, or no queries.
+        """
+        path = Path(path)
+        if not path.is_absolute() and self.input_dir is not None:
+            path = self.input_dir / path
+        if not path.exists():
+            raise ValueError(f"No such file or directory: {path}")
+        if not queries or not all(isinstance(query, str) and query for query in queries):
+            raise ValueError("queries must be a non-empty list of search terms")
+        job = Job(path, list(queries), fallback)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(run_job, job.path, job.queries, job.fallback,
+                                       self.output_dir / job.id)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def output_path(self, job, name):
+        """Path of one of the job's outputs, or None if it has no such output.
+        """
+        if name not in job.outputs:
+            return None
+        return self.output_dir / job.id / name
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _finish(self, job, future):
+        if future.cancelled():
+            job.error = "cancelled"
+        elif future.exception() is not None:
+            error = future.exception()
+            job.error = f"{type(error).__name__}: {error}"
+        else:
+            job.report, job.outputs = future.result()
+        # set last: a finished job has its outcome
+        job.finished = time.time()
+        self._forget_old_jobs()
+
+    def _forget_old_jobs(self):
+        with self._lock:
+            finished = sorted((job for job in self._jobs.values() if job.finished is not None),
+                              key=lambda job: job.finished)
+            old = finished[:max(0, len(finished) - self.max_jobs)]
+            for job in old:
+                del self._jobs[job.id]
+        for job in old:
+            shutil.rmtree(self.output_dir / job.id, ignore_errors=True)
+
+
+def run_job(path, queries, fallback, output_dir):
+    """Search a pdf or directory and write its outputs (runs in a worker process).
+
+    Returns:
+        (csv report rows, names of the files written to output_dir)
+    """
+    path = Path(path)
+    if path.is_dir():
+        directory_scraper._update_index(path, verbose=False)
+        pdf_paths = directory_scraper._list_pdfs(path)
+    else:
+        pdf_paths = [path]
+    docs = {pdf_path: _session(pdf_path) for pdf_path in pdf_paths}
+    try:
+        found, notes = directory_scraper.search_files(docs, queries, verbose=False,
+                                                      fallback=fallback)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        dir_name = path.name if path.is_dir() else path.stem
+        directory_scraper.write_outputs(output_dir, dir_name, docs, queries, found, notes)
+    finally:
+        # sessions keep what they learned; the files' bytes are read again when needed
+        directory_scraper._close_all(docs)
+    report = [
+        {
+            "file": pdf_path.stem,
+            "query": query,
+            "status": directory_scraper._status(found[pdf_path][query], notes.get(pdf_path)),
+            "pages": [page_num + 1 for page_num in found[pdf_path][query] or []],
+        }
+        for pdf_path in pdf_paths for query in queries
+    ]
+    return report, sorted(name for name in os.listdir(output_dir)
+                          if (output_dir / name).is_file())
+
+
+def _session(pdf_path):
+    """The worker's Document for pdf_path, reopened if the file changed.
+
+    Only the MAX_SESSIONS most recently used Documents are kept.
+    """
+    stat = pdf_path.stat()
+    key = (stat.st_size, stat.st_mtime_ns)
+    session = _sessions.pop(pdf_path, None)
+    if session is None or session[0] != key:
+        session = (key, Document(pdf_path))
+    _sessions[pdf_path] = session
+    while len(_sessions) > MAX_SESSIONS:
+        _, (_, stale) = _sessions.pop(next(iter(_sessions)))
+        stale.close()
+    return session[1]
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        service = self.server.service
+        parts = [unquote(part) for part in self.path.strip("/").split("/")]
+        if parts == ["jobs"]:
+            return self._send_json(200, [job.to_dict() for job in service.jobs()])
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._send_json(404, {"error": "not found"})
+        job = service.get(parts[1])
+        if job is None:
+            return self._send_json(404, {"error": "no such job"})
+        if len(parts) == 2:
+            return self._send_json(200, job.to_dict())
+        if len(parts) == 4 and parts[2] == "files":
+            output_path = service.output_path(job, parts[3])
+            if output_path is None:
+                return self._send_json(404, {"error": "no such output"})
+            return self._send_file(output_path)
+        return self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.strip("/") != "jobs":
+            return self._send_json(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            job = self.server.service.submit(request.get("path", ""),
+                                             request.get("queries"),
+                                             request.get("fallback"))
+        except (ValueError, AttributeError, TypeError) as error:
+            return self._send_json(400, {"error": str(error)})
+        self._send_json(202, job.to_dict())
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_file(self, output_path):
+        content_type = "application/pdf" if output_path.suffix == ".pdf" else "text/csv"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(output_path.stat().st_size))
+        self.send_header("Content-Disposition", f'attachment; filename="{output_path.name}"')
+        self.end_headers()
+        with open(output_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                self.wfile.write(chunk)
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    """Http server for a ScrapeService. Port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def serve(verbose=True):
+    """Run the service until interrupted, configured from the environment.
+    """
+    load_dotenv()
+    input_dir = os.getenv("INPUT_DIR")
+    output_dir = Path(os.getenv("OUTPUT_DIR")) / "jobs"
+    workers = int(os.getenv("SERVICE_WORKERS", DEFAULT_WORKERS))
+    max_jobs = int(os.getenv("SERVICE_MAX_JOBS", DEFAULT_MAX_JOBS))
+    host = os.getenv("SERVICE_HOST", DEFAULT_HOST)
+    port = int(os.getenv("SERVICE_PORT", DEFAULT_PORT))
+    service = ScrapeService(output_dir, input_dir, workers, max_jobs)
+    server = make_server(service, host, port, verbose)
+    if verbose:
+        print(f"Serving scrape jobs on http://{host}:{server.server_port} (Ctrl-C to stop).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    serve()
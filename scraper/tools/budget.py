@@ -0,0 +1,95 @@
+"""Page and wall-time budgets for ocr work.
+
+A full-document ocr of a long yearbook can take hours, so searches take an
+optional Budget: they stop reading pages once it is used up and return the
+matches found so far, and the budget remembers that it cut a search short.
+
+A run (e.g. one directory scrape) has one budget, and each file searched
+during it gets a budget of its own that also draws on the run's.
+
+Limits come from the environment and are off unless set:
+    OCR_FILE_MAX_PAGES / OCR_FILE_MAX_SECONDS: per file.
+    OCR_RUN_MAX_PAGES / OCR_RUN_MAX_SECONDS: per run.
+
+Example usage:
+    run_budget = budget.from_env("RUN")
+    file_budget = budget.from_env("FILE", parent=run_budget)
+    page_nums = ocr.get_page_nums_until(doc, query, 0, end, budget=file_budget)
+    if file_budget.stopped:
+        print("partial results")
+"""
+import os
+import time
+
+
+class Budget:
+    """Limits on the pages ocr'd and the wall time spent, optionally within a parent budget.
+
+    Args:
+        max_pages: pages that may be ocr'd. None for no limit.
+        max_seconds: wall time from creation. None for no limit.
+        parent: budget that every page charged here is also charged to.
+    """
+
+    def __init__(self, max_pages=None, max_seconds=None, parent=None):
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self.parent = parent
+        self.pages_used = 0
+        self.started = time.monotonic()
+        # set when a search was cut short by this budget
+        self.stopped = False
+
+    def charge(self, pages):
+        self.pages_used += pages
+        if self.parent is not None:
+            self.parent.charge(pages)
+
+    def remaining_pages(self):
+        """Pages left before this budget (or its parent) runs out, or None without a limit.
+        """
+        remaining = None
+        if self.max_pages is not None:
+            remaining = max(0, self.max_pages - self.pages_used)
+        if self.parent is not None:
+            parent_remaining = self.parent.remaining_pages()
+            if remaining is None or (parent_remaining is not None
+                                     and parent_remaining < remaining):
+                remaining = parent_remaining
+        return remaining
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def exhausted(self):
+        if self.remaining_pages() == 0:
+            return True
+        if self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+            return True
+        return self.parent is not None and self.parent.exhausted()
+
+    def stop(self):
+        """Record that a search was cut short (here and in the parent).
+        """
+        self.stopped = True
+        if self.parent is not None:
+            self.parent.stop()
+
+
+def from_env(scope, parent=None):
+    """Budget from OCR_<scope>_MAX_PAGES and OCR_<scope>_MAX_SECONDS.
+
+    Args:
+        scope: "FILE" or "RUN".
+        parent: budget the new one draws on.
+
+    Returns:
+        Budget. Without limits set, its only limits are the parent's.
+    """
+    max_pages = os.getenv(f"OCR_{scope}_MAX_PAGES")
+    max_seconds = os.getenv(f"OCR_{scope}_MAX_SECONDS")
+    return Budget(
+        int(max_pages) if max_pages else None,
+        float(max_seconds) if max_seconds else None,
+        parent,
+    )
@@ -0,0 +1,209 @@
+"""Fast, approximate page text straight from content streams.
+
+pypdf's extract_text interprets every operator of a page and places each
+glyph, which is slow on long text yearbooks. To find the few pages that may
+contain a query, it is enough to pick the string operands out of the
+decompressed content stream with a regular expression and decode them with
+the font selected at that point. Spacing and line breaks are lost, so the
+text is compared with all whitespace removed.
+
+Decoding is only attempted where it is certain: fonts with a ToUnicode
+CMap, and simple fonts in WinAnsi, MacRoman or standard encoding (printable
+ASCII only for the latter). A page using any other font, or drawing text in
+form xobjects or around inline images, has no raw text (None) and must be
+read in full.
+
+Example usage:
+    decoders = {}
+    raw = content_strings.page_raw_text(page, decoders)
+    if raw is None or content_strings.squash(query) in raw:
+        confirm = query.lower() in page.extract_text().lower()
+"""
+import re
+
+# string operands (literal or hex), font selections and graphics state save/restore
+_TOKEN_RE = re.compile(
+    rb"\((?P<literal>(?:\\.|[^\\()]|\((?:\\.|[^\\()])*\))*)\)"
+    rb"|<(?P<hex>[0-9A-Fa-f\s]*)>"
+    rb"|/(?P<font>[^\s/\[\]()<>{}%]+)\s+[-+\d.]+\s+Tf\b"
+    rb"|(?<![\w/])(?P<state>[qQ])(?!\w)",
+    re.S,
+)
+_ESCAPE_RE = re.compile(rb"\\([0-7]{1,3}|\r\n|[\s\S])")
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+_INLINE_IMAGE_RE = re.compile(rb"(?<!\w)BI\s")
+_BFCHAR_RE = re.compile(rb"beginbfchar(.*?)endbfchar", re.S)
+_BFRANGE_RE = re.compile(rb"beginbfrange(.*?)endbfrange", re.S)
+_BFCHAR_ENTRY_RE = re.compile(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>")
+_BFRANGE_ENTRY_RE = re.compile(
+    rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(?:<([0-9A-Fa-f]*)>|\[([^\]]*)\])"
+)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# simple font encodings decoded with a python codec
+SIMPLE_ENCODINGS = {"/WinAnsiEncoding": "cp1252", "/MacRomanEncoding": "mac_roman"}
+# largest ToUnicode map expanded into a dict
+MAX_CMAP_ENTRIES = 70000
+
+
+def squash(text):
+    """Lowercase text with all whitespace removed, as raw texts are compared.
+    """
+    return _WHITESPACE_RE.sub("", text).lower()
+
+
+def page_raw_text(page, decoders):
+    """Squashed text of the strings a page shows, or None if it cannot be decoded.
+
+    Args:
+        page: pypdf PageObject.
+        decoders: dict shared between pages of a document, caching a decoder
+            per font.
+    """
+    resources = page.get("/Resources")
+    resources = resources.get_object() if resources is not None else {}
+    for xobject in resources.get("/XObject", {}).values():
+        if xobject.get_object().get("/Subtype") == "/Form":
+            return None
+    contents = page.get_contents()
+    if contents is None:
+        return ""
+    data = contents.get_data()
+    if _INLINE_IMAGE_RE.search(data):
+        return None
+    fonts = resources.get("/Font", {})
+    if hasattr(fonts, "get_object"):
+        fonts = fonts.get_object()
+
+    parts = []
+    decode = None
+    saved = []
+    for match in _TOKEN_RE.finditer(data):
+        kind = match.lastgroup
+        if kind == "state":
+            if match.group("state") == b"q":
+                saved.append(decode)
+            elif saved:
+                decode = saved.pop()
+        elif kind == "font":
+            name = "/" + match.group("font").decode("latin-1")
+            font = fonts.get(name)
+            decode = _decoder(font, decoders) if font is not None else None
+        else:
+            if kind == "literal":
+                string = _unescape(match.group("literal"))
+            else:
+                digits = re.sub(rb"\s", b"", match.group("hex"))
+                if len(digits) % 2:
+                    digits += b"0"
+                string = bytes.fromhex(digits.decode())
+            if not string:
+                continue
+            text = decode(string) if decode is not None else None
+            if text is None:
+                return None
+            parts.append(text)
+    return squash("".join(parts))
+
+
+def _decoder(font_ref, decoders):
+    """Decoding function for a font, or None if its encoding is not handled.
+    """
+    key = getattr(font_ref, "idnum", None)
+    if key is None:
+        # a font defined in place on the page
+        return _build_decoder(font_ref.get_object())
+    if key not in decoders:
+        decoders[key] = _build_decoder(font_ref.get_object())
+    return decoders[key]
+
+
+def _build_decoder(font):
+    subtype = font.get("/Subtype")
+    if subtype == "/Type3":
+        return None
+    if "/ToUnicode" in font:
+        return _cmap_decoder(font["/ToUnicode"].get_object().get_data())
+    if subtype == "/Type0":
+        return None
+    encoding = font.get("/Encoding")
+    if encoding is not None and not isinstance(encoding, str):
+        # an encoding dictionary with /Differences
+        return None
+    if encoding in SIMPLE_ENCODINGS:
+        codec = SIMPLE_ENCODINGS[encoding]
+
+        def decode(string):
+            try:
+                return string.decode(codec)
+            except UnicodeDecodeError:
+                return None
+        return decode
+    if encoding in (None, "/StandardEncoding"):
+        # standard encoding agrees with ascii except for the quotes
+        def decode(string):
+            if all(32 <= byte < 127 and byte not in (0x27, 0x60) for byte in string):
+                return string.decode("ascii")
+            return None
+        return decode
+    return None
+
+
+def _cmap_decoder(cmap):
+    """Decoder from a ToUnicode CMap's bfchar and bfrange entries.
+    """
+    mapping = {}
+    code_lengths = set()
+    for block in _BFCHAR_RE.findall(cmap):
+        for source, target in _BFCHAR_ENTRY_RE.findall(block):
+            code_lengths.add(len(source))
+            mapping[int(source, 16)] = _utf16(target)
+    for block in _BFRANGE_RE.findall(cmap):
+        for low, high, target, targets in _BFRANGE_ENTRY_RE.findall(block):
+            code_lengths.add(len(low))
+            low, high = int(low, 16), int(high, 16)
+            if high < low or len(mapping) + high - low > MAX_CMAP_ENTRIES:
+                return None
+            if targets:
+                for offset, item in enumerate(re.findall(rb"<([0-9A-Fa-f]*)>", targets)):
+                    mapping[low + offset] = _utf16(item)
+                continue
+            base = int(target, 16) if target else 0
+            width = len(target)
+            for offset in range(high - low + 1):
+                mapping[low + offset] = _utf16(b"%0*x" % (width, base + offset))
+    if len(code_lengths) != 1:
+        return None
+    code_length = code_lengths.pop() // 2
+    if code_length not in (1, 2):
+        return None
+
+    def decode(string):
+        if len(string) % code_length:
+            return None
+        chars = []
+        for idx in range(0, len(string), code_length):
+            text = mapping.get(int.from_bytes(string[idx:idx + code_length], "big"))
+            if text is None:
+                return None
+            chars.append(text)
+        return "".join(chars)
+    return decode
+
+
+def _utf16(hex_digits):
+    if len(hex_digits) % 4:
+        hex_digits = hex_digits.rjust(len(hex_digits) + 4 - len(hex_digits) % 4, b"0")
+    return bytes.fromhex(hex_digits.decode()).decode("utf-16-be", "surrogatepass")
+
+
+def _unescape(literal):
+    def replace(match):
+        escape = match.group(1)
+        if escape[:1].isdigit():
+            return bytes((int(escape, 8) & 0xFF,))
+        if escape in (b"\r\n", b"\n", b"\r"):
+            # line continuation
+            return b""
+        return _ESCAPES.get(escape, escape)
+    return _ESCAPE_RE.sub(replace, literal)
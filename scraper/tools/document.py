@@ -0,0 +1,161 @@
+"""Document session shared by the scraper tools.
+
+A Document parses its pdf once and caches what the tools keep asking for:
+the pypdf reader, page count, extracted page text, the content hash and the
+located table list. Every function in scraper.tools that takes a pdf_path
+also accepts a Document, so a single file is only parsed once per search.
+
+The file itself is read once, in one go, and closed again: pypdf parses
+and the content hash is computed from those bytes. Poppler (pdf2image) can
+only render from a path, so it reads the file through the operating
+system's page cache. For yearbooks on network storage, set PDF_SPOOL_DIR to
+a local directory: the bytes are then written there once (named by content
+hash, so copies are reused between runs) and the renderer and ocr worker
+processes read the local copy instead of the share. A Document sent to a
+worker process carries its spool path and hash with it.
+
+close() (or leaving a with block) releases the bytes and the parsed
+reader once a file is done. Results cached on the Document stay, and the
+file is read again only if the reader is needed after all.
+
+Example usage:
+    with Document(pdf_path) as doc:
+        if text_pdfs.pdf_has_text(doc):
+            page_nums = text_pdfs.get_page_nums_from_query_text(doc, query)
+        writer = pdf_page_utils.get_pages_from_nums(doc, page_nums)
+"""
+from io import BytesIO
+import os
+from pathlib import Path
+
+from pypdf import PdfReader
+
+from scraper.tools import ocr_cache
+
+
+class Document:
+    """A pdf opened once, with lazily computed and cached properties.
+    """
+
+    def __init__(self, pdf_path):
+        self.path = Path(pdf_path)
+        self._buffer = None
+        self._spool_path = None
+        self._reader = None
+        self._digest = None
+        self._page_texts = {}
+        # set by tablelist_utils.locate_table_list (see toc_store.make_record)
+        self.table_list = None
+        # {pdf page: printed page}, loaded by page_offsets.get_folios
+        self.folios = None
+        # squashed content-stream text per page, see text_pdfs.candidate_pages
+        self.raw_texts = None
+        # {pdf page: image_to_data dict} of pages ocr'd with boxes, see ocr.read_pages
+        self.word_boxes = {}
+        # {pdf page: screening text} of pages screened by ocr searches, see
+        # ocr._confirmed_matches
+        self.screen_texts = {}
+
+    def __repr__(self):
+        return f"Document({str(self.path)!r})"
+
+    def __fspath__(self):
+        return str(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the file's bytes and the parsed reader (caches are kept).
+        """
+        self._buffer = None
+        self._reader = None
+
+    def __getstate__(self):
+        # worker processes read the (spooled) file themselves
+        return {"path": self.path, "spool_path": self._spool_path, "digest": self._digest}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+        self._spool_path = state["spool_path"]
+        self._digest = state["digest"]
+
+    @property
+    def name(self):
+        return self.path.name
+
+    @property
+    def stem(self):
+        return self.path.stem
+
+    @property
+    def buffer(self):
+        """Contents of the file (of its spool copy, if it has one)."""
+        if self._buffer is None:
+            self._buffer = Path(self._spool_path or self.path).read_bytes()
+        return self._buffer
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = PdfReader(BytesIO(self.buffer))
+        return self._reader
+
+    @property
+    def render_path(self):
+        """Path the renderer and ocr workers read: the local spool copy if
+        PDF_SPOOL_DIR is set, else the file itself.
+        """
+        if self._spool_path is None:
+            spool_dir = os.getenv("PDF_SPOOL_DIR")
+            if not spool_dir:
+                return self.path
+            self._spool_path = _spool(self.buffer, Path(spool_dir), self.digest)
+        return self._spool_path
+
+    @property
+    def num_pages(self):
+        return len(self.reader.pages)
+
+    @property
+    def metadata(self):
+        return self.reader.metadata
+
+    @property
+    def digest(self):
+        """sha256 of the file contents, used to key on-disk caches."""
+        if self._digest is None:
+            self._digest = ocr_cache.file_digest(self.path, self.buffer)
+        return self._digest
+
+    def page_text(self, page_num):
+        """Text of a page as returned by pypdf's extract_text (computed once).
+        """
+        if page_num not in self._page_texts:
+            self._page_texts[page_num] = self.reader.pages[page_num].extract_text()
+        return self._page_texts[page_num]
+
+
+def _spool(buffer, spool_dir, digest):
+    """Write buffer to spool_dir once, as <digest>.pdf, and return that path.
+    """
+    spool_path = spool_dir / f"{digest}.pdf"
+    if not spool_path.exists() or spool_path.stat().st_size != len(buffer):
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        partial = spool_path.with_name(f"{spool_path.name}.{os.getpid()}.part")
+        with open(partial, "wb") as f:
+            f.write(buffer)
+        # renamed into place so other processes never see a partial copy
+        os.replace(partial, spool_path)
+    return spool_path
+
+
+def open_document(pdf):
+    """Return pdf itself if it is already a Document, else a new Document for the path.
+    """
+    if isinstance(pdf, Document):
+        return pdf
+    return Document(pdf)
@@ -0,0 +1,264 @@
+"""Approximate matching of queries in ocr text.
+
+Tesseract misreads characters ("Dornestic", "Pr0duct"), and table titles
+break across lines or are hyphenated, so an exact substring check misses
+tables that are plainly there. Text and query are normalized (case, line
+breaks, hyphenation, spacing) and then matched allowing a number of edits
+proportional to the length of the query.
+
+Only edits that ocr plausibly makes are allowed: swapping characters it
+confuses ("0" and "o", "1" and "l"), reading "m" as "rn" (or "d" as "cl"),
+and adding, dropping or changing spaces and punctuation. A letter or digit
+can not simply be replaced, added or dropped, so one title never matches
+another that differs by a word ("Exports" and "Imports"), and numbers must
+agree.
+
+Exact occurrences are substring matches, as in the search of text pdfs
+(text_pdfs.get_page_nums_from_query_text), so "Export" finds "Exports" on
+both kinds of yearbook. Approximate matches neither start nor end inside a
+word, so edits never turn "Male population" into part of "Female
+population".
+
+Each text's normalized form and a positional index of its character
+trigrams are built once and kept, so searching the same pages for several
+queries does not build them again. The edit distance search only runs on
+the windows of a text where enough of the query's trigrams occur, in
+roughly the right order, to possibly hold a match.
+
+The allowed share of edits is FUZZY_THRESHOLD from the environment (default
+0.15, i.e. one edit per 7 characters). 0 turns approximate matching off.
+"""
+from collections import Counter
+from functools import lru_cache
+import os
+import re
+
+DEFAULT_THRESHOLD = 0.15
+NGRAM = 3
+
+# a word broken over a line end: "Pro-\nduct"
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-[ \t]*\n\s*(\w)")
+
+# groups of characters tesseract confuses with each other
+CONFUSIONS = ("o0", "l1i|!", "s5$", "b8", "g9", "z2", "ec", "uv")
+# letter pairs tesseract reads in place of a single letter
+DIGRAPHS = {"rn": "m", "cl": "d", "vv": "w"}
+
+_FOLD = {char: group[0] for group in CONFUSIONS for char in group}
+_REVERSED_DIGRAPHS = {pair[::-1]: char for pair, char in DIGRAPHS.items()}
+# cost of an edit ocr does not make
+_NOT_OCR = float("inf")
+
+
+def normalize(text):
+    """Lowercase text, rejoin hyphenated line breaks and collapse whitespace.
+
+    Returns:
+        (normalized text, list mapping each normalized character to its
+        index in text)
+    """
+    chars = []
+    positions = []
+    idx = 0
+    while idx < len(text):
+        match = _HYPHEN_BREAK_RE.match(text, idx)
+        if match:
+            chars.append(match.group(1).lower())
+            positions.append(idx)
+            # continue at the first letter of the next line
+            idx = match.start(2)
+            continue
+        char = text[idx]
+        if char.isspace():
+            if chars and chars[-1] != " ":
+                chars.append(" ")
+                positions.append(idx)
+        else:
+            chars.append(char.lower())
+            positions.append(idx)
+        idx += 1
+    if chars and chars[-1] == " ":
+        chars.pop()
+        positions.pop()
+    return "".join(chars), positions
+
+
+def max_errors(length, threshold=None):
+    """Edits allowed when matching a normalized query of this length.
+    """
+    if threshold is None:
+        threshold = float(os.getenv("FUZZY_THRESHOLD", DEFAULT_THRESHOLD))
+    return int(threshold * length)
+
+
+def contains(text, query, threshold=None):
+    """Whether query appears in text, allowing for ocr noise.
+    """
+    return find(text, query, threshold) is not None
+
+
+def find(text, query, threshold=None):
+    """Locate query in text, allowing for ocr noise.
+
+    An exact (case-insensitive) occurrence is preferred, even inside a
+    longer word. Otherwise the approximate occurrence with the fewest edits,
+    and the first of those, is returned; those must be whole words.
+
+    Args:
+        text: text to search, e.g. an ocr'd page.
+        query: search term.
+        threshold: share of the query length that may be edited. Defaults
+            to FUZZY_THRESHOLD.
+
+    Returns:
+        (start, end) indices of the match in text, or None.
+    """
+    idx = text.lower().find(query.lower())
+    if idx != -1:
+        return idx, idx + len(query)
+    norm_query, _ = normalize(query)
+    if not norm_query:
+        return None
+    norm_text, positions, grams = _text_index(text)
+    idx = norm_text.find(norm_query)
+    if idx != -1:
+        return positions[idx], positions[idx + len(norm_query) - 1] + 1
+    errors = max_errors(len(norm_query), threshold)
+    if errors == 0:
+        return None
+    best = None
+    for start, stop in _candidate_windows(norm_text, grams, norm_query, errors):
+        found = _best_end(norm_text, norm_query, errors, start, stop)
+        if found is not None and (best is None or found[0] < best[0]):
+            best = found
+    if best is None:
+        return None
+    end = best[1]
+    # the same search run backwards from the end finds where the match starts
+    window = norm_text[max(0, end - len(norm_query) - errors):end][::-1]
+    found = _best_end(window, norm_query[::-1], errors, reverse=True)
+    length = found[1] if found is not None else len(norm_query)
+    start = max(0, end - length)
+    return positions[start], positions[end - 1] + 1
+
+
+@lru_cache(maxsize=1024)
+def _text_index(text):
+    """Normalized text, its positions (see normalize) and {trigram: [indices]}.
+    """
+    norm_text, positions = normalize(text)
+    grams = {}
+    for idx in range(len(norm_text) - NGRAM + 1):
+        grams.setdefault(norm_text[idx:idx+NGRAM], []).append(idx)
+    return norm_text, positions, grams
+
+
+def _candidate_windows(norm_text, grams, norm_query, errors):
+    """(start, stop) spans of norm_text that may hold a match within errors edits.
+
+    Each edit (a digraph counting as one) destroys at most NGRAM + 1 of the
+    query's trigrams and shifts the rest by at most one character, so around
+    a match at least len(query) - NGRAM + 1 - (NGRAM + 1) * errors of them
+    occur, at offsets implying starts no more than 2 * errors apart. When
+    fewer trigrams are needed than that, the whole text is a candidate.
+    """
+    needed = len(norm_query) - NGRAM + 1 - (NGRAM + 1) * errors
+    if needed <= 0:
+        return [(0, len(norm_text))]
+    # (implied start of the match, offset of the trigram in the query)
+    hits = sorted(
+        (idx - offset, offset)
+        for offset in range(len(norm_query) - NGRAM + 1)
+        for idx in grams.get(norm_query[offset:offset+NGRAM], ())
+    )
+    windows = []
+    offsets = Counter()
+    low = 0
+    for start, offset in hits:
+        offsets[offset] += 1
+        while hits[low][0] < start - 2 * errors:
+            dropped = hits[low][1]
+            offsets[dropped] -= 1
+            if not offsets[dropped]:
+                del offsets[dropped]
+            low += 1
+        if len(offsets) < needed:
+            continue
+        first = max(0, hits[low][0] - errors - NGRAM)
+        last = min(len(norm_text), start + len(norm_query) + 2 * errors + NGRAM)
+        if windows and first <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], last))
+        else:
+            windows.append((first, last))
+    return windows
+
+
+def _boundary(text, idx):
+    """Whether a match may start or end at idx, i.e. not between two letters.
+    """
+    return idx <= 0 or idx >= len(text) or not (text[idx - 1].isalpha()
+                                                and text[idx].isalpha())
+
+
+def _best_end(norm_text, norm_query, errors, start=0, stop=None, reverse=False):
+    """Closest approximate occurrence within norm_text[start:stop].
+
+    Sellers' algorithm: edit distance of the query against every substring of
+    the text, computed one text column at a time, with only the edits ocr
+    makes allowed (see the module docstring). reverse is set when both
+    strings are reversed, so digraphs are read backwards.
+
+    Returns:
+        (edits, end index in norm_text) of the first closest occurrence, or
+        None beyond errors edits.
+    """
+    if stop is None:
+        stop = len(norm_text)
+    digraphs = _REVERSED_DIGRAPHS if reverse else DIGRAPHS
+    limit = errors + 1
+    query_skips = [_skip_cost(char) for char in norm_query]
+    query_folds = [_FOLD.get(char, char) for char in norm_query]
+    # rows whose query letter pairs with the one before as a digraph
+    query_pairs = {
+        row: digraphs[norm_query[row - 2:row]]
+        for row in range(2, len(norm_query) + 1) if norm_query[row - 2:row] in digraphs
+    }
+    column = [0 if _boundary(norm_text, start) else limit]
+    for skip in query_skips:
+        column.append(min(limit, column[-1] + skip))
+    previous = None
+    best = limit
+    best_end = None
+    for end in range(start + 1, stop + 1):
+        char = norm_text[end - 1]
+        before, previous = previous, column
+        skip = _skip_cost(char)
+        fold = _FOLD.get(char, char)
+        pair_char = digraphs.get(norm_text[end - 2:end]) if before is not None else None
+        # a match starts, and below ends, only at word boundaries
+        column = [0 if _boundary(norm_text, end) else limit]
+        for row, query_char in enumerate(norm_query, start=1):
+            if query_char == char:
+                cost = previous[row - 1]
+            else:
+                cost = min(previous[row] + skip, column[row - 1] + query_skips[row - 1])
+                if query_folds[row - 1] == fold or skip == 1 or query_skips[row - 1] == 1:
+                    cost = min(cost, previous[row - 1] + 1)
+                if pair_char == query_char:
+                    # two text letters read for one query letter
+                    cost = min(cost, before[row - 1] + 1)
+                if query_pairs.get(row) == char:
+                    cost = min(cost, previous[row - 2] + 1)
+            column.append(cost if cost < limit else limit)
+        if column[-1] < best and _boundary(norm_text, end):
+            best = column[-1]
+            best_end = end
+    if best_end is None:
+        return None
+    return best, best_end
+
+
+def _skip_cost(char):
+    """Cost of a character with no counterpart: only spaces and punctuation.
+    """
+    return _NOT_OCR if char.isalnum() else 1
@@ -0,0 +1,125 @@
+"""Cheap layout analysis of rendered pages.
+
+The list of tables of a Korean yearbook is set in two columns, Korean on
+the left and English on the right. Rather than ocr a fixed half of the page,
+the English column is found from the page's ink: a downscaled black and
+white copy of the page is averaged per column (the blank gutter between the
+two columns shows as a run of empty columns near the middle) and then per
+row within the right-hand column (each text line shows as a band of ink).
+Both profiles come from PIL's box filter, so a page is analysed in a few
+milliseconds without any ocr.
+
+Example usage:
+    column = layout.english_column(image)
+    if column is not None and column.lines:
+        text = ocr.image_text(image, lang="eng", crop=column.box)
+"""
+from collections import namedtuple
+
+from PIL import Image
+
+from scraper.tools import raster
+
+# width pages are scaled to for analysis
+ANALYSIS_WIDTH = 400
+# gray levels darker than this count as ink (after averaging, so thin
+# strokes still register)
+INK_LEVEL = 200
+# share of the page width in which the gutter is looked for
+GUTTER_BAND = (0.3, 0.7)
+# narrowest gutter, as a share of the page width
+MIN_GUTTER = 0.015
+# a column (or row) is blank below this share of ink
+BLANK = 0.004
+# margin kept around the ocr'd region, in analysis pixels
+PADDING = 3
+
+# box: (left, top, right, bottom) as fractions of the page, as ocr crops take.
+# lines: (top, bottom) fractions of each text line in the column.
+Column = namedtuple("Column", ["box", "lines"])
+
+
+def english_column(image):
+    """Locate the right-hand column of a two-column page and its text lines.
+
+    Args:
+        image: rendered page (PIL image or raster.LazyPageImage).
+
+    Returns:
+        Column, or None if the image has no pixels to analyse or the page
+        has no gutter (i.e. is not set in two columns). A column without
+        text has an empty lines list.
+    """
+    if isinstance(image, raster.LazyPageImage):
+        image = image.render()
+    if not isinstance(image, Image.Image):
+        return None
+    ink = _ink_mask(image)
+    width, height = ink.size
+    columns = _profile(ink, vertical=True)
+    gutter = _widest_blank_run(columns, int(GUTTER_BAND[0] * width),
+                               int(GUTTER_BAND[1] * width))
+    if gutter is None or gutter[1] - gutter[0] < MIN_GUTTER * width:
+        return None
+    left = gutter[1]
+    inked = [x for x in range(left, width) if columns[x] > BLANK]
+    if not inked:
+        return Column((left / width, 0, 1, 1), [])
+    right = inked[-1] + 1
+    lines = _bands(_profile(ink.crop((left, 0, right, height)), vertical=False))
+    if not lines:
+        return Column((left / width, 0, right / width, 1), [])
+    box = (
+        max(0, left - PADDING) / width,
+        max(0, lines[0][0] - PADDING) / height,
+        min(width, right + PADDING) / width,
+        min(height, lines[-1][1] + PADDING) / height,
+    )
+    return Column(box, [(top / height, bottom / height) for top, bottom in lines])
+
+
+def _ink_mask(image):
+    """Downscaled single-channel image, 255 where there is ink and 0 elsewhere.
+    """
+    width, height = image.size
+    scale = ANALYSIS_WIDTH / width
+    gray = image.convert("L").resize((ANALYSIS_WIDTH, max(1, int(height * scale))),
+                                     Image.BOX)
+    return gray.point(lambda level: 255 if level < INK_LEVEL else 0)
+
+
+def _profile(ink, vertical):
+    """Share of ink in each column (vertical) or row of the mask.
+    """
+    width, height = ink.size
+    size = (width, 1) if vertical else (1, height)
+    return [value / 255 for value in ink.resize(size, Image.BOX).tobytes()]
+
+
+def _widest_blank_run(profile, start, end):
+    """(first, last + 1) of the longest run of blank entries in profile[start:end].
+    """
+    best = None
+    run_start = None
+    for idx in range(start, end + 1):
+        blank = idx < end and profile[idx] <= BLANK
+        if blank and run_start is None:
+            run_start = idx
+        elif not blank and run_start is not None:
+            if best is None or idx - run_start > best[1] - best[0]:
+                best = (run_start, idx)
+            run_start = None
+    return best
+
+
+def _bands(profile):
+    """(first, last + 1) of each run of inked entries.
+    """
+    bands = []
+    for idx, value in enumerate(profile):
+        if value > BLANK:
+            if bands and bands[-1][1] == idx:
+                bands[-1][1] = idx + 1
+            else:
+                bands.append([idx, idx + 1])
+    return [tuple(band) for band in bands]
@@ -0,0 +1,163 @@
+"""Merged output pdf written one section at a time.
+
+A PdfWriter keeps every page added to it in memory until write(), so a
+merged output of scanned pages from every yearbook in a directory grows
+with the number of files. MergedPdfWriter instead serializes each finished
+section (a header page and the pages scraped from one file) straight to the
+output file and drops it, keeping only byte offsets. The page tree, catalog
+and cross-reference table are written when the writer is closed, so
+sections may be added out of order and placed by an order key.
+
+Example usage:
+    with MergedPdfWriter(output_path) as merged:
+        for pdf_path in pdf_paths:
+            merged.add_section([header_page(pdf_path.stem), *scraped_pages])
+"""
+from pathlib import Path
+
+from pypdf import PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+from scraper.tools import metrics
+
+# object numbers of the page tree and catalog written by close()
+PAGES_ID = 1
+ROOT_ID = 2
+
+
+class MergedPdfWriter:
+    """Write pages to a pdf file in sections, holding one section in memory at a time.
+
+    Each section is assembled in a fresh pypdf PdfWriter (which copies the
+    pages' fonts and images along with them). The objects reachable from its
+    pages are then renumbered past those already written, with the pages
+    pointed at the page tree that close() writes, and copied to the file.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = Path(output_path)
+        self._file = open(self.output_path, "wb")
+        self._file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self._pages_id = PAGES_ID
+        self._root_id = ROOT_ID
+        self._next_id = ROOT_ID + 1
+        self._offsets = {}
+        # (order, sequence, page object numbers) per section
+        self._sections = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def num_pages(self):
+        return sum(len(kids) for _, _, kids in self._sections)
+
+    def add_section(self, pages, order=None):
+        """Copy pages (pypdf PageObjects from any reader or writer) to the file.
+
+        Args:
+            pages: pages of the section.
+            order: position of the section in the output. Sections without
+                one follow in the order they were added.
+        """
+        with metrics.timer("write", pages=len(pages), output=self.output_path.name):
+            self._add_section(pages, order)
+
+    def _add_section(self, pages, order):
+        writer = PdfWriter()
+        for page in pages:
+            writer.add_page(page)
+        # the section's page tree is replaced by the merged one
+        numbers = {writer.root_object.raw_get("/Pages").idnum: self._pages_id}
+        section = _reachable(writer, [page.indirect_reference for page in writer.pages],
+                             numbers)
+        for idnum, _ in section:
+            numbers[idnum] = self._next_id
+            self._next_id += 1
+        for idnum, obj in section:
+            self._write_object(numbers[idnum], _renumber(obj, numbers, writer))
+        kids = [numbers[page.indirect_reference.idnum] for page in writer.pages]
+        sequence = len(self._sections)
+        self._sections.append((sequence if order is None else order, sequence, kids))
+        self._file.flush()
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table, and close the file.
+        """
+        if self._file.closed:
+            return
+        kids = [kid for _, _, section in sorted(self._sections) for kid in section]
+        refs = " ".join(f"{kid} 0 R" for kid in kids)
+        self._write_raw(self._pages_id,
+                        f"<< /Type /Pages /Kids [ {refs} ] /Count {len(kids)} >>")
+        self._write_raw(self._root_id, f"<< /Type /Catalog /Pages {self._pages_id} 0 R >>")
+        size = max(self._next_id, max(self._offsets) + 1)
+        xref_location = self._file.tell()
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for idnum in range(1, size):
+            if idnum in self._offsets:
+                lines.append(f"{self._offsets[idnum]:010d} 00000 n \n")
+            else:
+                lines.append("0000000000 65535 f \n")
+        lines.append(f"trailer\n<< /Size {size} /Root {self._root_id} 0 R >>\n")
+        lines.append(f"startxref\n{xref_location}\n%%EOF\n")
+        self._file.write("".join(lines).encode())
+        self._file.close()
+
+    def _write_object(self, idnum, obj):
+        self._offsets[idnum] = self._file.tell()
+        self._file.write(f"{idnum} 0 obj\n".encode())
+        obj.write_to_stream(self._file)
+        self._file.write(b"\nendobj\n")
+
+    def _write_raw(self, idnum, body):
+        self._offsets[idnum] = self._file.tell()
+        self._file.write(f"{idnum} 0 obj\n{body}\nendobj\n".encode())
+
+
+def _reachable(writer, refs, skip):
+    """(object number, object) of each indirect object of writer reachable from refs.
+
+    Objects numbered in skip are neither listed nor followed.
+    """
+    found = {}
+    refs = list(refs)
+    while refs:
+        ref = refs.pop()
+        if ref.idnum in found or ref.idnum in skip:
+            continue
+        obj = writer.get_object(ref.idnum)
+        found[ref.idnum] = obj
+        refs.extend(_references(obj))
+    return sorted(found.items(), key=lambda item: item[0])
+
+
+def _references(obj):
+    """Indirect references held by obj, directly or in nested arrays and dictionaries.
+    """
+    if isinstance(obj, IndirectObject):
+        return [obj]
+    if isinstance(obj, DictionaryObject):
+        values = [obj.raw_get(key) for key in obj]
+    elif isinstance(obj, ArrayObject):
+        values = list(obj)
+    else:
+        return []
+    return [ref for value in values for ref in _references(value)]
+
+
+def _renumber(obj, numbers, writer):
+    """obj with its indirect references renumbered (in place for arrays and dictionaries).
+    """
+    if isinstance(obj, IndirectObject):
+        return IndirectObject(numbers[obj.idnum], 0, writer)
+    if isinstance(obj, DictionaryObject):
+        for key in list(obj):
+            obj[key] = _renumber(obj.raw_get(key), numbers, writer)
+    elif isinstance(obj, ArrayObject):
+        for idx, value in enumerate(obj):
+            obj[idx] = _renumber(value, numbers, writer)
+    return obj
@@ -0,0 +1,166 @@
+"""Structured timings and counters for the stages of a scrape.
+
+Set METRICS_PATH to a file and every timed stage (classification, text
+extraction, table-list location, rasterization, ocr of each page, output
+writes, and each file as a whole) is appended to it as one json object per
+line, along with counters (pages rendered, pages ocr'd, cache hits) per file.
+Worker processes append to the same file. Without METRICS_PATH every call
+returns at once and nothing is recorded.
+
+Records look like:
+    {"type": "timer", "stage": "ocr_page", "seconds": 0.84, "file": "2001.pdf",
+     "lang": "eng", "pid": 4121, "time": 1760700000.1}
+    {"type": "counters", "file": "2001.pdf", "counts": {"pages_ocrd": 11,
+     "ocr_cache_hits": 3}, "pid": 4121, "time": 1760700012.9}
+
+Example usage:
+    with metrics.scope(file=doc.name), metrics.timer("file"):
+        with metrics.timer("classify"):
+            has_text = text.pdf_has_text(doc)
+        metrics.count("pages_ocrd", len(page_nums))
+"""
+import atexit
+from collections import Counter
+from contextvars import ContextVar
+import json
+import os
+import time
+
+# innermost open scope of this thread / task
+_current_scope = ContextVar("metrics_scope", default=None)
+# counts made outside of any scope, written at exit
+_unscoped = Counter()
+# (path, pid) -> open sink file
+_sinks = {}
+
+
+def enabled():
+    return bool(os.getenv("METRICS_PATH"))
+
+
+class _Scope:
+    """Fields added to every record within, and the counts made within.
+
+    Counts of a nested scope are added to its parent's when it closes, so
+    only outermost scopes (e.g. one per file, or per ocr worker chunk) are
+    written out.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.counts = Counter()
+        self.parent = None
+        self._token = None
+
+    def __enter__(self):
+        self.parent = _current_scope.get()
+        if self.parent is not None:
+            self.fields = {**self.parent.fields, **self.fields}
+        self._token = _current_scope.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_scope.reset(self._token)
+        if self.parent is not None:
+            self.parent.counts.update(self.counts)
+        elif self.counts:
+            _write({"type": "counters", **self.fields, "counts": dict(self.counts)})
+
+
+class _Timer:
+
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        record = {
+            "type": "timer",
+            "stage": self.stage,
+            "seconds": time.perf_counter() - self._started,
+            **_scope_fields(),
+            **self.fields,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _write(record)
+
+
+class _Disabled:
+    """Context manager that does nothing, returned while metrics are off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_DISABLED = _Disabled()
+
+
+def scope(**fields):
+    """Context manager adding fields (e.g. file=...) to every record made within.
+    """
+    if not enabled():
+        return _DISABLED
+    return _Scope(fields)
+
+
+def timer(stage, **fields):
+    """Context manager recording the wall time of a stage.
+
+    Args:
+        stage: name of the stage, e.g. "rasterize".
+        fields: extra fields for the record, e.g. pages=8.
+    """
+    if not enabled():
+        return _DISABLED
+    return _Timer(stage, fields)
+
+
+def count(name, amount=1):
+    """Add amount to a counter of the current scope.
+    """
+    if not amount or not enabled():
+        return
+    current = _current_scope.get()
+    if current is None:
+        _unscoped[name] += amount
+    else:
+        current.counts[name] += amount
+
+
+def flush():
+    """Write the counts made outside of any scope.
+    """
+    if _unscoped and enabled():
+        _write({"type": "counters", "counts": dict(_unscoped)})
+    _unscoped.clear()
+
+
+def _scope_fields():
+    current = _current_scope.get()
+    return {} if current is None else current.fields
+
+
+def _write(record):
+    path = os.getenv("METRICS_PATH")
+    if not path:
+        return
+    record["pid"] = os.getpid()
+    record["time"] = time.time()
+    key = (path, os.getpid())
+    if key not in _sinks:
+        # line buffered: each record reaches the file in a single append
+        _sinks[key] = open(path, "a", buffering=1)
+    _sinks[key].write(json.dumps(record, default=str) + "\n")
+
+
+atexit.register(flush)
@@ -1,13 +1,43 @@
 """Tools for handling scanned pdfs using ocr.
 
 Searches document for query by first converting pdf to images
-and then using ocr.
+and then using ocr. Ocr output is stored in the on-disk cache
+(see ocr_cache.py) when one is configured, so pages that were already
+read are neither rendered nor ocr'd again.
+
+Searches can run in two stages (set OCR_TWO_STAGE=1): every page is first
+screened at low resolution in grayscale, and only the pages whose screening
+text might contain the query are read again at full resolution to confirm.
+Each stage's dpi and tesseract config are read from OCR_SCREEN_DPI /
+OCR_SCREEN_CONFIG and OCR_CONFIRM_DPI / OCR_CONFIRM_CONFIG.
 """
-from pdf2image import convert_from_path
-import pytesseract
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import math
+import os
+import re
+
+from scraper.tools import fuzzy
+from scraper.tools import metrics
+from scraper.tools import ocr_backend
+from scraper.tools import ocr_cache
+from scraper.tools import raster
+from scraper.tools.document import open_document
+from scraper.tools.raster import DEFAULT_DPI
+
+# default (dpi, tesseract config) of each search stage
+SCREEN_STAGE = (100, "--psm 6")
+CONFIRM_STAGE = (DEFAULT_DPI, "")
+# share of the query's character trigrams a screening text must contain
+SCREEN_MIN_OVERLAP = 0.5
+# pages a worker reads per job of a concurrent search
+PAGES_PER_JOB = 2
+
+# (path, size, mtime) -> Document read by a worker, shared by its jobs
+_worker_documents = {}
 
 
-def get_page_nums_from_query_ocr(pdf_path, query, start, end):
+def get_page_nums_from_query_ocr(pdf_path, query, start, end, cache=None,
+                                 page_texts=None, workers=None, two_stage=None):
     """Get pages on which query appears.
 
     Searches a portion of a scanned pdf based on start and ending
@@ -15,22 +45,616 @@ def get_page_nums_from_query_ocr(pdf_path, query, start, end):
     the broader pdf. This is to optimize OCR.
 
     Args:
-        pdf_path: Path to pdf.
+        pdf_path: Path to pdf (or Document).
         query: search term to look for.
         start: page to begin search
         end: page to end search
+        cache: OcrCache to use. Defaults to the cache configured in the environment.
+        page_texts: optional dict of page number -> text for pages already read.
+            Missing pages are added to it, so it can be shared between queries.
+        workers: number of processes to ocr pages in. Defaults to OCR_WORKERS
+            from the environment, or 1.
+        two_stage: screen pages at low resolution before reading them in
+            full. Defaults to OCR_TWO_STAGE from the environment.
 
     Returns:
         page_nums: page numbers on which the term appears.
-    
+
     Example usage:
         page_nums = get_page_nums_from_query_ocr(input_pdf, "translations")
         pages = pdf_page_utils.get_pages_from_nums(input_pdf, page_nums)
     """
-    images = convert_from_path(pdf_path, first_page=start+1, last_page=end)
+    if page_texts is None:
+        page_texts = {}
+    return _confirmed_matches(pdf_path, query, range(start, end), page_texts, cache,
+                              workers, two_stage)
+
+
+def get_page_nums_outward(pdf_path, query, center, start, end, max_matches=None,
+                          cache=None, page_texts=None, workers=None, two_stage=None,
+                          budget=None):
+    """Get pages on which query appears, reading outward from a predicted page.
+
+    Pages start through end - 1 are visited in order of distance from
+    center, so when the prediction is good the matches are found in the
+    first few pages, and the search stops once max_matches are found.
+
+    Args:
+        pdf_path: Path to pdf (or Document).
+        query: search term to look for.
+        center: page predicted to hold the table.
+        start: page to begin search
+        end: page to end search
+        max_matches: stop after this many matching pages. None reads every page.
+        cache, page_texts, workers, two_stage: as for get_page_nums_from_query_ocr.
+        budget: optional budget.Budget. Reading stops when it runs out (and
+            budget.stopped is set), returning the matches found so far.
+
+    Returns:
+        page_nums: page numbers on which the term appears, in document order.
+    """
+    order = sorted(range(start, end), key=lambda page_num: (abs(page_num - center), page_num))
+    return _search_in_order(pdf_path, query, order, range(start, end), max_matches,
+                            cache, page_texts, workers, two_stage, budget,
+                            follow_matches=False)
+
+
+def get_page_nums_until(pdf_path, query, start, end, max_matches=None, cache=None,
+                        page_texts=None, workers=None, two_stage=None, budget=None):
+    """Get pages on which query appears, stopping once max_matches are found.
+
+    Pages are read in document order, in runs as long as the renderer's memory
+    budget allows (see raster.pages_per_chunk), except that the neighbours of
+    a matching page are read next, since tables usually continue on the
+    following (or started on the previous) page.
+
+    Args and returns are as for get_page_nums_outward, without center.
+    """
+    return _search_in_order(pdf_path, query, range(start, end), range(start, end),
+                            max_matches, cache, page_texts, workers, two_stage, budget,
+                            follow_matches=True)
+
+
+def _search_in_order(pdf_path, query, order, bounds, max_matches, cache, page_texts,
+                     workers, two_stage, budget, follow_matches):
+    """Read pages in the given order until max_matches are found or the budget runs out.
+    """
+    if page_texts is None:
+        page_texts = {}
+    if workers is None:
+        workers = int(os.getenv("OCR_WORKERS", 1))
+    doc = open_document(pdf_path)
+    if workers > 1:
+        return _search_concurrently(doc, query, order, bounds, max_matches, cache,
+                                    page_texts, workers, two_stage, budget,
+                                    follow_matches)
+    # the outward window steps one page at a time, nearest first; in document
+    # order the pages are read in runs that fit the renderer's memory budget
+    step = 1
+    if follow_matches:
+        step = raster.pages_per_chunk(doc, get_stage("CONFIRM")[0])
+    pending = list(order)
+    # unread neighbours of the last matches, read on their own next
+    following = []
+    visited = set()
     page_nums = []
-    for idx, image in enumerate(images):
-        text = pytesseract.image_to_string(image).lower()
-        if query.lower() in text:
-            page_nums.append(start + idx)
-    return page_nums
\ No newline at end of file
+    while pending or following:
+        batch_size = len(following) or step
+        if budget is not None:
+            if budget.exhausted():
+                budget.stop()
+                break
+            remaining = budget.remaining_pages()
+            if remaining is not None:
+                batch_size = min(batch_size, remaining)
+        queue = following or pending
+        batch = []
+        unread = 0
+        while queue and len(batch) < batch_size:
+            page_num = queue.pop(0)
+            if page_num not in visited:
+                visited.add(page_num)
+                batch.append(page_num)
+                # pages screened for an earlier query are not charged again
+                unread += page_num not in page_texts and page_num not in doc.screen_texts
+        matches = _confirmed_matches(doc, query, batch, page_texts, cache, workers,
+                                     two_stage)
+        if budget is not None:
+            budget.charge(unread)
+        for page_num in matches:
+            page_nums.append(page_num)
+            if follow_matches:
+                for neighbour in (page_num - 1, page_num + 1):
+                    if (neighbour in bounds and neighbour not in visited
+                            and neighbour not in following):
+                        following.append(neighbour)
+        if max_matches is not None and len(page_nums) >= max_matches:
+            break
+    return sorted(page_nums)
+
+
+def _search_concurrently(pdf_path, query, order, bounds, max_matches, cache, page_texts,
+                         workers, two_stage, budget, follow_matches):
+    """_search_in_order with a pool of workers, each reading a few pages per job.
+
+    One pool serves the whole search and two jobs per worker are kept in
+    flight, so the workers never wait on each other. Matches, their
+    neighbours, max_matches and the budget are handled as each job finishes;
+    once the search is over, jobs that have not started are cancelled.
+    """
+    doc = open_document(pdf_path)
+    two_stage = _two_stage(two_stage)
+    pending = list(order)
+    visited = set()
+    page_nums = []
+    # job -> (pages, pages charged)
+    jobs = {}
+    in_flight = 0
+
+    def found(page_num):
+        page_nums.append(page_num)
+        if follow_matches:
+            for neighbour in (page_num - 1, page_num + 1):
+                if neighbour in bounds and neighbour not in visited:
+                    pending.insert(0, neighbour)
+
+    def done():
+        return max_matches is not None and len(page_nums) >= max_matches
+
+    def collect(job):
+        nonlocal in_flight
+        _, charged = jobs.pop(job)
+        in_flight -= charged
+        texts, screen_texts, boxes, matches = job.result()
+        page_texts.update(texts)
+        doc.screen_texts.update(screen_texts)
+        doc.word_boxes.update(boxes)
+        if budget is not None:
+            budget.charge(charged)
+        return matches
+
+    # spool the file (if PDF_SPOOL_DIR is set) once, before the workers need it
+    doc.render_path
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        while not done():
+            while pending and len(jobs) < 2 * workers and not done():
+                job_size = PAGES_PER_JOB
+                if budget is not None:
+                    if budget.exhausted():
+                        budget.stop()
+                        break
+                    remaining = budget.remaining_pages()
+                    if remaining is not None:
+                        job_size = min(job_size, remaining - in_flight)
+                        if job_size <= 0:
+                            break
+                job_pages = []
+                charged = 0
+                while pending and len(job_pages) < PAGES_PER_JOB and charged < job_size:
+                    page_num = pending.pop(0)
+                    if page_num in visited:
+                        continue
+                    visited.add(page_num)
+                    if page_num in page_texts:
+                        if fuzzy.contains(page_texts[page_num], query):
+                            found(page_num)
+                    elif two_stage and page_num in doc.screen_texts:
+                        # screened for an earlier query: read only if it might match
+                        if might_contain(doc.screen_texts[page_num], query):
+                            job_pages.append(page_num)
+                    else:
+                        job_pages.append(page_num)
+                        charged += 1
+                if job_pages:
+                    screen_texts = {
+                        page_num: doc.screen_texts[page_num]
+                        for page_num in job_pages if page_num in doc.screen_texts
+                    }
+                    job = pool.submit(_search_job, doc, query, job_pages, cache, two_stage,
+                                      screen_texts)
+                    jobs[job] = (job_pages, charged)
+                    in_flight += charged
+            if not jobs:
+                break
+            finished, _ = wait(jobs, return_when=FIRST_COMPLETED)
+            for job in finished:
+                for page_num in collect(job):
+                    if not done():
+                        found(page_num)
+        for job in list(jobs):
+            job.cancel()
+        # keep what the jobs already running read; their matches come too late
+        for job in list(jobs):
+            if job.cancelled():
+                jobs.pop(job)
+            else:
+                collect(job)
+    return sorted(page_nums)
+
+
+def _search_job(pdf_path, query, page_nums, cache, two_stage, screen_texts):
+    """Worker side of _search_concurrently: read page_nums as _confirmed_matches does.
+
+    screen_texts holds the screening texts the caller already has for page_nums.
+
+    Returns:
+        ({page: text} of the pages read in full, {page: screening text},
+        {page: word boxes} of the pages read when boxes are kept, matching pages).
+    """
+    doc = _worker_document(pdf_path)
+    doc.screen_texts.update(screen_texts)
+    with metrics.scope(file=doc.name):
+        page_texts = {}
+        matches = _confirmed_matches(doc, query, page_nums, page_texts, cache, 1,
+                                     two_stage)
+        screen_texts = {
+            page_num: doc.screen_texts[page_num]
+            for page_num in page_nums if page_num in doc.screen_texts
+        }
+        boxes = {
+            page_num: doc.word_boxes[page_num]
+            for page_num in page_texts if page_num in doc.word_boxes
+        }
+        return page_texts, screen_texts, boxes, matches
+
+
+def _worker_document(doc):
+    """The Document a worker already read for doc's file, or doc itself.
+
+    Each job receives a fresh copy of the Document, so reusing the first one
+    keeps a worker from parsing the pdf again for every job of a search.
+    """
+    stat = os.stat(doc.path)
+    key = (str(doc.path), stat.st_size, stat.st_mtime_ns)
+    if key not in _worker_documents:
+        _worker_documents.clear()
+        _worker_documents[key] = doc
+    return _worker_documents[key]
+
+
+def _confirmed_matches(pdf_path, query, page_nums, page_texts, cache, workers, two_stage):
+    """Pages among page_nums whose full resolution text contains query (see fuzzy.py).
+
+    In two-stage mode, pages not read in full yet are screened first and only
+    those that might contain the query are read. Screening texts are kept on
+    the Document, so a page screened out for one query is checked against the
+    next one without being screened again.
+    """
+    two_stage = _two_stage(two_stage)
+    page_nums = list(page_nums)
+    if two_stage:
+        doc = open_document(pdf_path)
+        unscreened = [
+            page_num for page_num in page_nums
+            if page_num not in page_texts and page_num not in doc.screen_texts
+        ]
+        doc.screen_texts.update(get_screen_texts(doc, unscreened, cache, workers))
+        page_nums = [
+            page_num for page_num in page_nums
+            if page_num in page_texts or might_contain(doc.screen_texts[page_num], query)
+        ]
+    read_pages(pdf_path, page_nums, page_texts, cache, workers)
+    return [
+        page_num for page_num in page_nums
+        if fuzzy.contains(page_texts.get(page_num, ""), query)
+    ]
+
+
+def _two_stage(two_stage):
+    if two_stage is None:
+        two_stage = os.getenv("OCR_TWO_STAGE", "") not in ("", "0")
+    return two_stage
+
+
+def read_pages(pdf_path, page_nums, page_texts, cache=None, workers=None, boxes=None):
+    """Ocr the given pages that are not in page_texts yet and add them to it.
+
+    Pages are read at the confirmation stage's dpi and config. When the
+    tables of matched pages will be extracted (boxes, by default
+    EXTRACT_TABLES), their word boxes are kept too, in the cache and on the
+    Document, so table_extract does not read them again.
+    """
+    if boxes is None:
+        boxes = os.getenv("EXTRACT_TABLES", "").lower() in ("1", "y", "yes", "true")
+    missing = [page_num for page_num in page_nums if page_num not in page_texts]
+    if missing:
+        doc = open_document(pdf_path)
+        dpi, config = get_stage("CONFIRM")
+        entries = get_entries_for_pages(doc, missing, dpi=dpi, cache=cache,
+                                        workers=workers, config=config, boxes=boxes)
+        page_texts.update((page_num, entry["text"]) for page_num, entry in entries.items())
+        if boxes:
+            doc.word_boxes.update(
+                (page_num, entry["data"]) for page_num, entry in entries.items()
+            )
+
+
+def get_screen_texts(pdf_path, page_nums, cache=None, workers=None):
+    """Returns {page: text} for pages ocr'd at the screening stage (low dpi, grayscale).
+    """
+    dpi, config = get_stage("SCREEN")
+    entries = get_entries_for_pages(pdf_path, page_nums, dpi=dpi, cache=cache,
+                                    workers=workers, config=config, grayscale=True)
+    return {page_num: entry["text"] for page_num, entry in entries.items()}
+
+
+def get_stage(stage):
+    """Returns (dpi, tesseract config) of the "SCREEN" or "CONFIRM" stage.
+    """
+    default_dpi, default_config = SCREEN_STAGE if stage == "SCREEN" else CONFIRM_STAGE
+    dpi = int(os.getenv(f"OCR_{stage}_DPI", default_dpi))
+    config = os.getenv(f"OCR_{stage}_CONFIG", default_config)
+    return dpi, config or None
+
+
+def might_contain(text, query):
+    """Lenient check of a low resolution ocr text for a query.
+
+    Case, spacing and punctuation are ignored, and most of the query's
+    character trigrams appearing is enough, so that misread characters
+    do not discard a page. Queries too short to judge always pass.
+    """
+    query = _squash(query)
+    text = _squash(text)
+    if len(query) < 3 or query in text:
+        return True
+    trigrams = {query[idx:idx+3] for idx in range(len(query) - 2)}
+    found = sum(1 for trigram in trigrams if trigram in text)
+    return found >= SCREEN_MIN_OVERLAP * len(trigrams)
+
+
+def _squash(text):
+    return re.sub(r"\W|_", "", text.lower())
+
+
+def get_page_texts(pdf_path, start, end, lang=None, crop=None, dpi=DEFAULT_DPI,
+                   cache=None, workers=None):
+    """Returns the ocr text of pages start through end - 1.
+    """
+    entries = get_page_entries(pdf_path, start, end, lang, crop, dpi, cache,
+                               workers=workers)
+    return [entry["text"] for entry in entries]
+
+
+def get_page_entries(pdf_path, start, end, lang=None, crop=None, dpi=DEFAULT_DPI,
+                     cache=None, boxes=False, workers=None, config=None, grayscale=False):
+    """Ocr a range of pages, consulting the cache first.
+
+    See get_entries_for_pages.
+
+    Args:
+        pdf_path: path to pdf.
+        start: first page (0-based) to read.
+        end: page to stop before.
+        lang: tesseract language string, e.g. "kor+eng". None uses tesseract's default.
+        crop: fractional (left, top, right, bottom) region of the page to read.
+        dpi: rendering resolution.
+        cache: OcrCache to use. Defaults to the cache configured in the environment.
+        boxes: also collect word/line boxes from image_to_data.
+        workers: number of processes to use. Defaults to OCR_WORKERS, or 1.
+        config: extra tesseract options, e.g. "--psm 6".
+        grayscale: render pages in grayscale.
+
+    Returns:
+        list of dicts with "text" and "data" keys, one per page in order.
+    """
+    entries = get_entries_for_pages(pdf_path, range(start, end), lang, crop, dpi,
+                                    cache, boxes, workers, config, grayscale)
+    return [entries[page_num] for page_num in range(start, end) if page_num in entries]
+
+
+def get_entries_for_pages(pdf_path, page_nums, lang=None, crop=None, dpi=DEFAULT_DPI,
+                          cache=None, boxes=False, workers=None, config=None,
+                          grayscale=False):
+    """Ocr a set of pages, consulting the cache first.
+
+    Only pages missing from the cache are rendered, in contiguous runs, and
+    pages are streamed through the renderer so memory does not grow with the
+    number of pages. With more than one worker the runs are split into chunks
+    that are rendered and ocr'd in a process pool.
+
+    Args are as for get_page_entries, with page_nums (0-based) in place of
+    start and end.
+
+    Returns:
+        dict of page number -> {"text": ..., "data": ...}.
+    """
+    page_nums = sorted(set(page_nums))
+    doc = open_document(pdf_path)
+    if cache is None:
+        cache = ocr_cache.get_default_cache()
+    if workers is None:
+        workers = int(os.getenv("OCR_WORKERS", 1))
+
+    entries = {}
+    missing = []
+    # tesseract options and grayscale rendering change the output too
+    cache_lang = _cache_lang(lang, config, grayscale)
+    if cache is None:
+        missing = page_nums
+    else:
+        digest = doc.digest
+        for page_num in page_nums:
+            entry = cache.get(digest, page_num, dpi, cache_lang, crop)
+            if entry is None or (boxes and entry["data"] is None):
+                missing.append(page_num)
+            else:
+                entries[page_num] = entry
+        metrics.count("ocr_cache_hits", len(entries))
+
+    runs = _runs(missing)
+    if workers > 1 and len(missing) > 1:
+        runs = _split_runs(runs, workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            # spool the file (if PDF_SPOOL_DIR is set) once, before the workers
+            # need it; they map it themselves from the path the Document carries
+            doc.render_path
+            results = pool.map(
+                _ocr_run, *zip(*[(doc, first, last, lang, crop, dpi, boxes, config,
+                                  grayscale) for first, last in runs])
+            )
+            run_entries = list(zip(runs, results))
+    else:
+        run_entries = (
+            ((first, last),
+             _ocr_run(doc, first, last, lang, crop, dpi, boxes, config, grayscale))
+            for first, last in runs
+        )
+    for (first, last), run in run_entries:
+        for page_num, entry in zip(range(first, last + 1), run):
+            if cache is not None:
+                cache.put(digest, page_num, dpi, cache_lang, crop, entry["text"],
+                          entry["data"])
+            entries[page_num] = entry
+    return entries
+
+
+def _ocr_run(pdf_path, first, last, lang, crop, dpi, boxes, config=None, grayscale=False):
+    """Render and ocr pages first through last (0-based, inclusive).
+    """
+    # a no-op in the calling process, where the file's scope is already open
+    with metrics.scope(file=os.path.basename(os.fspath(pdf_path))):
+        return [
+            ocr_image(image, lang, crop, boxes, config)
+            for _, image in raster.iter_page_images(pdf_path, first, last + 1, dpi,
+                                                    grayscale=grayscale)
+        ]
+
+
+def _cache_lang(lang, config, grayscale):
+    """Language key of cache entries, qualified by any non-default ocr options.
+    """
+    if not config and not grayscale:
+        return lang
+    return f"{lang or 'eng'}|{'gray' if grayscale else 'rgb'}|{config or ''}"
+
+
+def _init_worker():
+    # one tesseract thread per process; the pool provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def ocr_image(image, lang=None, crop=None, boxes=False, config=None):
+    """Run tesseract on an image, optionally on a fractional crop of it.
+
+    config holds extra tesseract options, e.g. "--psm 6". The engine is the
+    one chosen by OCR_BACKEND (see ocr_backend.py).
+
+    With boxes, the page is recognized once, by image_to_data, and the text
+    is put together from its words.
+
+    Returns:
+        dict with "text" and "data" (image_to_data output, or None).
+    """
+    image = _crop(image, crop)
+    backend = ocr_backend.get_backend()
+    with metrics.timer("ocr_page", lang=lang or "eng", crop=crop is not None,
+                       backend=backend.name):
+        if boxes:
+            data = backend.image_to_data(image, lang, config)
+            text = data_text(data)
+        else:
+            text = backend.image_to_string(image, lang, config)
+            data = None
+    metrics.count("pages_ocrd")
+    return {"text": text, "data": data}
+
+
+def data_text(data):
+    """Text of an image_to_data dict: words joined by spaces, lines by line
+    breaks and blocks and paragraphs by blank lines, as image_to_string lays it out.
+    """
+    lines = []
+    last_line = last_par = None
+    for text, block, par, line in zip(data["text"], data["block_num"], data["par_num"],
+                                      data["line_num"]):
+        if not text.strip():
+            continue
+        if (block, par) != last_par:
+            if lines:
+                lines.append("")
+            lines.append(text.strip())
+        elif (block, par, line) != last_line:
+            lines.append(text.strip())
+        else:
+            lines[-1] += " " + text.strip()
+        last_par = (block, par)
+        last_line = (block, par, line)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def detect_script(image, crop=None):
+    """Name of the script tesseract's orientation and script detection sees.
+
+    Much cheaper than recognizing the text, and needs no language model.
+
+    Returns:
+        script name, e.g. "Latin" or "Hangul", or None if it could not tell
+        (too little text, or the osd model is not installed).
+    """
+    image = _crop(image, crop)
+    backend = ocr_backend.get_backend()
+    with metrics.timer("detect_script", backend=backend.name):
+        return backend.detect_script(image)
+
+
+def _crop(image, crop):
+    """The rendered image, cut to a fractional (left, top, right, bottom) box if given.
+    """
+    if isinstance(image, raster.LazyPageImage):
+        image = image.render()
+    if crop is not None:
+        width, height = image.size
+        left, top, right, bottom = crop
+        image = image.crop((int(left * width), int(top * height),
+                            int(right * width), int(bottom * height)))
+    return image
+
+
+def image_text(image, lang=None, crop=None, cache=None):
+    """Ocr an already rendered page image, using the cache when the image is tagged.
+
+    Images from raster.PageImages (and lazy pages, which are then not
+    rendered at all on a hit) carry their source pdf and page while a cache
+    is configured, which is enough to look the page up.
+    """
+    source = getattr(image, "info", {}).get("source")
+    if cache is None:
+        cache = ocr_cache.get_default_cache()
+    if source is None or cache is None:
+        return ocr_image(image, lang, crop)["text"]
+    digest, page_num, dpi = source
+    entry = cache.get(digest, page_num, dpi, lang, crop)
+    if entry is None:
+        entry = ocr_image(image, lang, crop)
+        cache.put(digest, page_num, dpi, lang, crop, entry["text"])
+    else:
+        metrics.count("ocr_cache_hits")
+    return entry["text"]
+
+
+def _runs(page_nums):
+    """Group sorted page numbers into (first, last) runs of consecutive pages.
+    """
+    runs = []
+    for page_num in page_nums:
+        if runs and runs[-1][1] == page_num - 1:
+            runs[-1][1] = page_num
+        else:
+            runs.append([page_num, page_num])
+    return [tuple(run) for run in runs]
+
+
+def _split_runs(runs, workers):
+    """Split runs into chunks small enough to keep every worker busy.
+
+    Chunks of several pages amortize the cost of starting the renderer,
+    while staying small enough to balance the load across workers.
+    """
+    total = sum(last - first + 1 for first, last in runs)
+    size = max(1, min(8, math.ceil(total / (workers * 4))))
+    chunks = []
+    for first, last in runs:
+        for chunk_first in range(first, last + 1, size):
+            chunks.append((chunk_first, min(chunk_first + size - 1, last)))
+    return chunks
@@ -0,0 +1,167 @@
+"""Ocr engines behind ocr.ocr_image.
+
+pytesseract runs the tesseract executable once per call, writing the image
+to a temporary file and loading the language models every time. For small
+crops such as the columns of a table list, that start-up costs more than
+the recognition itself. When tesserocr (python bindings to the tesseract
+library) is installed, engines are instead kept loaded, one per language
+set and page segmentation mode (e.g. "eng" and "kor+eng"), and reused for
+every page and file a process reads.
+
+OCR_BACKEND chooses the engine:
+    auto (default): tesserocr when it can be imported, else subprocess.
+    tesserocr: persistent engines; fails if tesserocr is not installed.
+    subprocess: pytesseract, one tesseract process per call.
+
+Example usage:
+    backend = ocr_backend.get_backend()
+    text = backend.image_to_string(image, lang="kor+eng", config="--psm 6")
+    script = backend.detect_script(image)  # e.g. "Latin", "Hangul" or None
+"""
+import os
+import re
+import threading
+
+import pytesseract
+from pytesseract import Output
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# tesseract's default languages and page segmentation mode
+DEFAULT_LANG = "eng"
+DEFAULT_PSM = 3
+
+_PSM_RE = re.compile(r"--psm\s+(\d+)")
+_VARIABLE_RE = re.compile(r"-c\s+(\w+)=(\S+)")
+
+
+class SubprocessBackend:
+    """Ocr with pytesseract, starting tesseract for every call.
+    """
+    name = "subprocess"
+
+    def image_to_string(self, image, lang=None, config=None):
+        options = {"config": config} if config else {}
+        return pytesseract.image_to_string(image, lang=lang, **options)
+
+    def image_to_data(self, image, lang=None, config=None):
+        options = {"config": config} if config else {}
+        return pytesseract.image_to_data(image, lang=lang, output_type=Output.DICT,
+                                         **options)
+
+    def detect_script(self, image):
+        try:
+            osd = pytesseract.image_to_osd(image, config="--psm 0", output_type=Output.DICT)
+        except pytesseract.TesseractError:
+            # too little text, or no osd model installed
+            return None
+        return osd.get("script")
+
+
+class TesserocrBackend:
+    """Ocr with tesseract engines that stay loaded between calls.
+
+    Engines are not shared between threads, and a forked worker process
+    starts engines of its own rather than using its parent's.
+    """
+    name = "tesserocr"
+
+    def __init__(self):
+        if tesserocr is None:
+            raise RuntimeError("OCR_BACKEND=tesserocr but tesserocr is not installed.")
+        self._local = threading.local()
+
+    def image_to_string(self, image, lang=None, config=None):
+        api = self._engine(lang, config)
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+    def image_to_data(self, image, lang=None, config=None):
+        """Word boxes in the layout of pytesseract's image_to_data(output_type=DICT).
+        """
+        api = self._engine(lang, config)
+        api.SetImage(image)
+        api.Recognize()
+        data = {key: [] for key in ("level", "page_num", "block_num", "par_num",
+                                    "line_num", "word_num", "left", "top", "width",
+                                    "height", "conf", "text")}
+        block = par = line = word = 0
+        level = tesserocr.RIL.WORD
+        for result in tesserocr.iterate_level(api.GetIterator(), level):
+            if result.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                block, par, line, word = block + 1, 0, 0, 0
+            if result.IsAtBeginningOf(tesserocr.RIL.PARA):
+                par, line, word = par + 1, 0, 0
+            if result.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+            box = result.BoundingBox(level)
+            if box is None:
+                continue
+            left, top, right, bottom = box
+            for key, value in (("level", 5), ("page_num", 1), ("block_num", block),
+                               ("par_num", par), ("line_num", line), ("word_num", word),
+                               ("left", left), ("top", top), ("width", right - left),
+                               ("height", bottom - top), ("conf", result.Confidence(level)),
+                               ("text", result.GetUTF8Text(level))):
+                data[key].append(value)
+        return data
+
+    def detect_script(self, image):
+        api = self._engine("osd", "--psm 0")
+        api.SetImage(image)
+        osd = api.DetectOrientationScript()
+        return osd["script_name"] if osd else None
+
+    def close(self):
+        for api in getattr(self._local, "engines", {}).values():
+            api.End()
+        self._local.engines = {}
+
+    def _engine(self, lang, config):
+        """The engine of this thread for lang and config, started on first use.
+        """
+        if getattr(self._local, "pid", None) != os.getpid():
+            # engines of a parent process are not usable after a fork
+            self._local.engines = {}
+            self._local.pid = os.getpid()
+        psm, variables = _parse_config(config)
+        key = (lang or DEFAULT_LANG, psm, variables)
+        api = self._local.engines.get(key)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=key[0], psm=psm)
+            for name, value in variables:
+                api.SetVariable(name, value)
+            self._local.engines[key] = api
+        return api
+
+
+def _parse_config(config):
+    """(page segmentation mode, ((variable, value), ...)) from a tesseract config string.
+    """
+    config = config or ""
+    match = _PSM_RE.search(config)
+    psm = int(match.group(1)) if match else DEFAULT_PSM
+    return psm, tuple(_VARIABLE_RE.findall(config))
+
+
+_backends = {}
+
+
+def get_backend():
+    """Return the backend chosen by OCR_BACKEND (default auto), one per process.
+    """
+    choice = os.getenv("OCR_BACKEND", "auto").lower()
+    if choice == "auto":
+        choice = "subprocess" if tesserocr is None else "tesserocr"
+    if choice not in _backends:
+        if choice == "tesserocr":
+            _backends[choice] = TesserocrBackend()
+        elif choice == "subprocess":
+            _backends[choice] = SubprocessBackend()
+        else:
+            raise ValueError(f"Unknown OCR_BACKEND: {choice}")
+    return _backends[choice]
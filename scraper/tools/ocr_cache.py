@@ -0,0 +1,228 @@
+"""Persistent on-disk cache of per-page ocr output.
+
+Tesseract output for a rendered page is stored in a sqlite database keyed by
+the pdf's content hash, page index, dpi, language and crop region, so searching
+the same yearbook a second time skips rasterization and ocr entirely.
+
+The cache is opt-in: set OCR_CACHE_DIR (and optionally OCR_CACHE_MAX_MB) in the
+environment or .env file to enable it.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_FILE_NAME = "ocr_cache.sqlite"
+# cache hits whose last_used times are written together
+TOUCH_BATCH = 64
+
+# (resolved path, size, mtime) -> sha256 hex digest
+_digests = {}
+# db path -> OcrCache
+_caches = {}
+
+
+def file_digest(pdf_path, data=None):
+    """Return the sha256 hex digest of a file's contents.
+
+    Digests are memoized on path, size and modification time so that a file
+    is only hashed once per process unless it changes.
+
+    Args:
+        pdf_path: path to the file to hash.
+        data: the file's contents if already in memory (e.g. a Document's
+            mapping), hashed instead of reading the file again.
+
+    Returns:
+        hex digest string.
+    """
+    path = Path(pdf_path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        if data is not None:
+            _digests[key] = hashlib.sha256(data).hexdigest()
+        else:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(block)
+            _digests[key] = sha.hexdigest()
+    return _digests[key]
+
+
+def crop_key(crop):
+    """Serialize a fractional crop box (left, top, right, bottom) for use in keys.
+
+    A string names a region found from the page itself (e.g. a column) and is
+    used as is.
+    """
+    if crop is None:
+        return "full"
+    if isinstance(crop, str):
+        return crop
+    return ",".join(f"{value:g}" for value in crop)
+
+
+class OcrCache:
+    """Size-bounded LRU cache of tesseract output backed by sqlite.
+
+    Each entry holds the text from image_to_string and, when it was requested,
+    the word/line boxes from image_to_data (as a dict of lists). Once the stored
+    entries exceed max_bytes, the least recently used entries are evicted.
+
+    Hits are recorded in memory and their last_used times written in batches
+    (and before any eviction). The size of the stored entries is kept as a
+    running total, summed over the table only when it says the cache is full,
+    since other processes may have evicted entries meanwhile.
+
+    Example usage:
+        cache = OcrCache("/tmp/ocr_cache.sqlite")
+        entry = cache.get(digest, 12, 200, "eng", None)
+        if entry is None:
+            cache.put(digest, 12, 200, "eng", None, text)
+    """
+
+    def __init__(self, db_path, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        # key -> time of a cache hit not written yet
+        self._touched = {}
+        # bytes stored, as far as this process knows; None until counted
+        self._total = None
+
+    def __getstate__(self):
+        # worker processes open their own connection
+        return {"db_path": self.db_path, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["db_path"], state["max_bytes"])
+
+    @property
+    def conn(self):
+        # sqlite connections must not be shared across forked processes
+        if self._conn is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._pid = os.getpid()
+            # hits and totals of the process this one was forked from
+            self._touched = {}
+            self._total = None
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " digest TEXT, page INTEGER, dpi INTEGER, lang TEXT, crop TEXT,"
+                " text TEXT, data TEXT, size INTEGER, last_used REAL,"
+                " PRIMARY KEY (digest, page, dpi, lang, crop))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, digest, page_num, dpi, lang, crop):
+        """Look up a cached page.
+
+        Returns:
+            dict with "text" and "data" (None if boxes were never stored),
+            or None on a cache miss.
+        """
+        key = (digest, page_num, dpi, lang or "eng", crop_key(crop))
+        row = self.conn.execute(
+            "SELECT text, data FROM pages WHERE digest=? AND page=? AND dpi=?"
+            " AND lang=? AND crop=?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_BATCH:
+            self.flush()
+        text, data = row
+        return {"text": text, "data": json.loads(data) if data else None}
+
+    def put(self, digest, page_num, dpi, lang, crop, text, data=None):
+        """Store ocr output for a page, replacing any existing entry.
+        """
+        data_json = json.dumps(data) if data is not None else None
+        size = len(text.encode("utf-8")) + len(data_json or "")
+        key = (digest, page_num, dpi, lang or "eng", crop_key(crop))
+        conn = self.conn
+        if self._total is None:
+            self._total = self.total_bytes()
+        replaced = conn.execute(
+            "SELECT size FROM pages WHERE digest=? AND page=? AND dpi=? AND lang=?"
+            " AND crop=?",
+            key,
+        ).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (*key, text, data_json, size, time.time()),
+        )
+        conn.commit()
+        self._touched.pop(key, None)
+        self._total += size - (replaced[0] if replaced else 0)
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def total_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def flush(self):
+        """Write the last_used times of the cache hits recorded so far.
+        """
+        if not self._touched:
+            return
+        self.conn.executemany(
+            "UPDATE pages SET last_used=? WHERE digest=? AND page=? AND dpi=?"
+            " AND lang=? AND crop=?",
+            [(used, *key) for key, used in self._touched.items()],
+        )
+        self.conn.commit()
+        self._touched = {}
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes.
+        """
+        self.flush()
+        self._total = self.total_bytes()
+        excess = self._total - self.max_bytes
+        if excess <= 0:
+            return
+        freed = 0
+        stale = []
+        for rowid, size in self.conn.execute(
+            "SELECT rowid, size FROM pages ORDER BY last_used"
+        ):
+            stale.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM pages WHERE rowid=?", stale)
+        self.conn.commit()
+        self._total -= freed
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+
+def get_default_cache():
+    """Return the cache configured by OCR_CACHE_DIR, or None if caching is off.
+    """
+    cache_dir = os.getenv("OCR_CACHE_DIR")
+    if not cache_dir:
+        return None
+    db_path = Path(cache_dir) / CACHE_FILE_NAME
+    if db_path not in _caches:
+        max_mb = os.getenv("OCR_CACHE_MAX_MB")
+        max_bytes = int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES
+        _caches[db_path] = OcrCache(db_path, max_bytes)
+    return _caches[db_path]
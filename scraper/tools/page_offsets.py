@@ -0,0 +1,171 @@
+"""Learn how printed page numbers map to pdf pages for each yearbook.
+
+search_table_list predicts a pdf page from a printed page number with a
+fixed offset (start of the body), which inserts, plates and unnumbered
+pages throw off, so a window of pages around the prediction is ocr'd.
+Pages that are ocr'd anyway usually show their printed page number (folio)
+in the header or footer. Recording those observations gives the true offset,
+piecewise where the numbering shifts, and lets the search window shrink.
+
+Observations are kept on the Document and, when a cache is configured, in
+the toc store so they accumulate across runs.
+
+A lone number can also be a year heading or a table cell, so observations
+that cannot be folios of this pdf (beyond its page count, or further on
+than the pdf page they were read on) are ignored, and an offset is only used
+once MIN_OBSERVATIONS agree on it. Predictions stay within the pdf.
+"""
+import re
+
+from scraper.tools import toc_store
+from scraper.tools.document import open_document
+
+# a header/footer line holding only a page number, e.g. "23", "- 23 -", "(23)"
+FOLIO_RE = re.compile(r"^[\s\-–—(\[|]*(\d{1,4})[\s\-–—)\]|]*$")
+# number of lines at the top and bottom of a page searched for a folio
+FOLIO_LINES = 2
+# observations needed in a segment before its offset is trusted
+MIN_OBSERVATIONS = 2
+
+
+def find_folio(text):
+    """Returns the printed page number of an ocr'd page, or None.
+
+    Only lines consisting of a lone number near the top or bottom of the page
+    are considered, since table cells are full of numbers too.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for line in lines[:FOLIO_LINES] + lines[-FOLIO_LINES:]:
+        match = FOLIO_RE.match(line)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def get_folios(pdf_path):
+    """Returns the recorded {pdf page: printed page} observations of a pdf.
+    """
+    doc = open_document(pdf_path)
+    if doc.folios is None:
+        store = toc_store.get_default_store()
+        doc.folios = store.get_folios(doc.digest) if store is not None else {}
+    return doc.folios
+
+
+def observe(pdf_path, page_texts):
+    """Record the folios found on already ocr'd pages.
+
+    Args:
+        pdf_path: path to pdf (or Document).
+        page_texts: dict of pdf page number -> ocr text.
+    """
+    doc = open_document(pdf_path)
+    folios = get_folios(doc)
+    found = {}
+    for page_num, text in page_texts.items():
+        folio = find_folio(text)
+        if (folio is not None and folios.get(page_num) != folio
+                and _plausible(page_num, folio, doc.num_pages)):
+            found[page_num] = folio
+    if not found:
+        return
+    folios.update(found)
+    store = toc_store.get_default_store()
+    if store is not None:
+        store.put_folios(doc.digest, found)
+
+
+def fit_segments(folios):
+    """Fit piecewise offsets (pdf page - printed page) to folio observations.
+
+    Observations are grouped into runs with the same offset. A single
+    observation whose neighbours on both sides agree with each other is
+    treated as a misread and dropped.
+
+    Returns:
+        list of {"start": first pdf page, "offset": int, "count": int}
+        ordered by start page.
+    """
+    runs = []
+    for page_num in sorted(folios):
+        offset = page_num - folios[page_num]
+        if runs and runs[-1]["offset"] == offset:
+            runs[-1]["count"] += 1
+        else:
+            runs.append({"start": page_num, "offset": offset, "count": 1})
+    kept = [
+        run for idx, run in enumerate(runs)
+        if not (run["count"] == 1 and 0 < idx < len(runs) - 1
+                and runs[idx - 1]["offset"] == runs[idx + 1]["offset"])
+    ]
+    segments = []
+    for run in kept:
+        if segments and segments[-1]["offset"] == run["offset"]:
+            segments[-1]["count"] += run["count"]
+        else:
+            segments.append(dict(run))
+    return segments
+
+
+def predict(pdf_path, printed_page, default_offset):
+    """Map a printed page number to a pdf page.
+
+    Args:
+        pdf_path: path to pdf (or Document).
+        printed_page: page number as printed in the yearbook.
+        default_offset: offset to use without observations.
+
+    Returns:
+        (pdf page, calibrated) where calibrated tells whether the offset is
+        backed by at least MIN_OBSERVATIONS folios. Until it is,
+        default_offset is used. The page is clamped to the pdf's pages.
+    """
+    doc = open_document(pdf_path)
+    segment = _segment_for(_segments(doc), printed_page)
+    calibrated = segment is not None and segment["count"] >= MIN_OBSERVATIONS
+    offset = segment["offset"] if calibrated else default_offset
+    page_num = min(max(printed_page + offset, 0), doc.num_pages - 1)
+    return page_num, calibrated
+
+
+def is_calibrated(pdf_path, page_num):
+    """Whether the offset around a predicted pdf page is backed by observations.
+    """
+    segments = _segments(open_document(pdf_path))
+    covering = [segment for segment in segments if segment["start"] <= page_num]
+    segment = covering[-1] if covering else (segments[0] if segments else None)
+    return segment is not None and segment["count"] >= MIN_OBSERVATIONS
+
+
+def _plausible(page_num, folio, num_pages):
+    """Whether a folio read on a pdf page can be a page number of this pdf.
+
+    The first printed page is at best the first pdf page (offset -1), and
+    there are no more printed pages than pdf pages.
+    """
+    return 1 <= folio <= min(page_num + 1, num_pages)
+
+
+def _segments(doc):
+    """fit_segments of the plausible recorded folios (stores may hold older ones).
+    """
+    folios = {
+        page_num: folio for page_num, folio in get_folios(doc).items()
+        if _plausible(page_num, folio, doc.num_pages)
+    }
+    return fit_segments(folios)
+
+
+def _segment_for(segments, printed_page):
+    """The segment whose pdf page range contains the printed page once offset.
+    """
+    for idx, segment in enumerate(segments):
+        page_num = printed_page + segment["offset"]
+        next_start = segments[idx + 1]["start"] if idx + 1 < len(segments) else None
+        if (idx == 0 or page_num >= segment["start"]) and (
+                next_start is None or page_num < next_start):
+            return segment
+    if not segments:
+        return None
+    # falls in a gap between segments: use the closest one
+    return min(segments, key=lambda s: abs(printed_page + s["offset"] - s["start"]))
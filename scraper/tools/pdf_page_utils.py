@@ -3,16 +3,19 @@
 Connects page numbers to the actual page objects
 they're connected to for writing new, shortened pdfs.
 """
+from io import BytesIO
 from typing import List
 from pypdf import PdfReader, PdfWriter
 from fpdf import FPDF
 
+from scraper.tools.document import open_document
+
 def get_pages_from_nums(pdf_path, page_nums: List[int]) -> PdfWriter:
     """
     Extracts specified pages from a PDF and returns a PdfWriter instance containing those pages.
 
     Args:
-        pdf_path: Path to the PDF file to extract pages from.
+        pdf_path: Path to the PDF file (or Document) to extract pages from.
         page_nums: List of page numbers (0-based indices) to extract.
 
     Returns:
@@ -23,7 +26,7 @@ def get_pages_from_nums(pdf_path, page_nums: List[int]) -> PdfWriter:
         with open("output.pdf", "wb") as f:
             writer.write(f)
     """
-    reader = PdfReader(pdf_path)
+    reader = open_document(pdf_path).reader
     writer = PdfWriter()
     for page_num in page_nums:
         writer.add_page(reader.pages[page_num])
@@ -33,8 +36,7 @@ def get_pages_from_nums(pdf_path, page_nums: List[int]) -> PdfWriter:
 def get_page_nums_near(pdf_path, page_num, window) -> List[int]:
     """Uses an interval of +/- window to return list of page_nums around page_num.
     """
-    reader = PdfReader(pdf_path)
-    num_pages = len(reader.pages)
+    num_pages = open_document(pdf_path).num_pages
     start_page = max(page_num - window, 0)
     end_page = min(page_num + window + 1, num_pages)
     return start_page, end_page
@@ -48,8 +50,26 @@ def create_pdf_with_text(output_path, text):
         output_path: Path to save the generated PDF.
         text: The text to write on the PDF page.
     """
+    with open(output_path, "wb") as f:
+        f.write(_pdf_bytes_with_text(text))
+
+
+def create_page_with_text(text):
+    """
+    Creates a page with the given text in memory, without a temporary file.
+
+    Args:
+        text: The text to write on the page.
+
+    Returns:
+        pypdf PageObject.
+    """
+    return PdfReader(BytesIO(_pdf_bytes_with_text(text))).pages[0]
+
+
+def _pdf_bytes_with_text(text):
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Times", size=12)
     pdf.multi_cell(0, 10, text)
-    pdf.output(output_path)
\ No newline at end of file
+    return bytes(pdf.output())
\ No newline at end of file
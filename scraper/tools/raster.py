@@ -0,0 +1,175 @@
+"""Memory-bounded rendering of pdf pages to images.
+
+pdf2image renders a whole page range into a list of PIL images, which at
+the default dpi is gigabytes for a long yearbook. These helpers render one
+small chunk of pages at a time, sized to fit a memory budget, so peak memory
+stays flat regardless of document length.
+
+The budget defaults to RASTER_MAX_MB from the environment (or 256 MB).
+"""
+from collections.abc import Sequence
+import os
+
+from pdf2image import convert_from_path
+
+from scraper.tools import metrics
+from scraper.tools import ocr_cache
+from scraper.tools.document import open_document
+
+# pdf2image's default rendering resolution
+DEFAULT_DPI = 200
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# PIL stores rgb pages with 3 bytes per pixel
+BYTES_PER_PIXEL = 3
+
+
+def iter_page_images(pdf_path, start, end, dpi=DEFAULT_DPI, max_bytes=None,
+                     grayscale=False):
+    """Yield (page_num, image) for pages start through end - 1, a chunk at a time.
+
+    Only the current chunk is held in memory; images are handed over one by
+    one so the caller can drop each page once it is done with it.
+
+    Args:
+        pdf_path: path to pdf (or Document).
+        start: first page (0-based) to render.
+        end: page to stop before.
+        dpi: rendering resolution.
+        max_bytes: memory budget for rendered images. Defaults to RASTER_MAX_MB.
+        grayscale: render single-channel images.
+
+    Example usage:
+        for page_num, image in iter_page_images(pdf_path, 0, 700):
+            text = pytesseract.image_to_string(image)
+    """
+    doc = open_document(pdf_path)
+    chunk_size = pages_per_chunk(doc, dpi, max_bytes)
+    if grayscale:
+        # a third of the memory of an rgb page
+        chunk_size *= BYTES_PER_PIXEL
+    for chunk_start in range(start, end, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, end)
+        with metrics.timer("rasterize", pages=chunk_end - chunk_start, dpi=dpi):
+            images = convert_from_path(doc.render_path, dpi=dpi, first_page=chunk_start+1,
+                                       last_page=chunk_end, grayscale=grayscale)
+        metrics.count("pages_rendered", len(images))
+        # hand images over in order without keeping references to them
+        images.reverse()
+        page_num = chunk_start
+        while images:
+            yield page_num, images.pop()
+            page_num += 1
+
+
+def pages_per_chunk(pdf_path, dpi=DEFAULT_DPI, max_bytes=None):
+    """Number of pages of this pdf that fit in the memory budget at dpi.
+
+    The size of a rendered page is estimated from the largest page box among
+    the first few pages.
+    """
+    if max_bytes is None:
+        max_mb = os.getenv("RASTER_MAX_MB")
+        max_bytes = int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES
+    reader = open_document(pdf_path).reader
+    page_bytes = 1
+    for page in reader.pages[:5]:
+        # page boxes are in points (1/72 inch)
+        width = float(page.mediabox.width) / 72 * dpi
+        height = float(page.mediabox.height) / 72 * dpi
+        page_bytes = max(page_bytes, int(width * height * BYTES_PER_PIXEL))
+    return max(1, max_bytes // page_bytes)
+
+
+class PageImages(Sequence):
+    """Lazily rendered pages start through end - 1 of a pdf, indexed from 0.
+
+    Pages are rendered on access in chunks that fit the memory budget, and
+    only the most recent chunk is kept. Sequential access therefore renders
+    each page once while memory stays bounded.
+
+    Example usage:
+        images = PageImages(pdf_path, 0, 25)
+        first_page = images[0]
+    """
+
+    def __init__(self, pdf_path, start, end, dpi=DEFAULT_DPI, max_bytes=None,
+                 chunk_size=None):
+        self.doc = open_document(pdf_path)
+        self.start = start
+        self.end = min(end, self.doc.num_pages)
+        self.dpi = dpi
+        self.chunk_size = chunk_size or pages_per_chunk(self.doc, dpi, max_bytes)
+        self._chunk_start = None
+        self._chunk = []
+
+    def __len__(self):
+        return max(0, self.end - self.start)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("page index out of range")
+        if (self._chunk_start is None
+                or not self._chunk_start <= idx < self._chunk_start + len(self._chunk)):
+            self._render_chunk(idx)
+        return self._chunk[idx - self._chunk_start]
+
+    def source(self, idx):
+        """Cache key parts (digest, page, dpi) of page idx, or None without a cache.
+        """
+        if ocr_cache.get_default_cache() is None:
+            return None
+        return self.doc.digest, self.start + idx, self.dpi
+
+    def _render_chunk(self, idx):
+        self._chunk = []  # release the previous chunk before rendering
+        first = self.start + idx
+        last = min(first + self.chunk_size, self.end)
+        with metrics.timer("rasterize", pages=last - first, dpi=self.dpi):
+            self._chunk = convert_from_path(self.doc.render_path, dpi=self.dpi,
+                                            first_page=first+1, last_page=last)
+        metrics.count("pages_rendered", len(self._chunk))
+        self._chunk_start = idx
+        for offset, image in enumerate(self._chunk):
+            source = self.source(idx + offset)
+            if source is not None:
+                # let ocr of these pages be served from / stored in the cache
+                image.info["source"] = source
+
+
+class LazyPageImage:
+    """A page of a PageImages sequence that is rendered only when its pixels are used.
+
+    Its info carries the cache key of the page, so ocr.image_text can answer
+    from the ocr cache without rendering at all.
+    """
+
+    def __init__(self, pages, idx):
+        self._pages = pages
+        self._idx = idx
+
+    @property
+    def info(self):
+        source = self._pages.source(self._idx)
+        return {} if source is None else {"source": source}
+
+    @property
+    def size(self):
+        return self.render().size
+
+    def crop(self, box):
+        return self.render().crop(box)
+
+    def render(self):
+        return self._pages[self._idx]
+
+
+def lazy_page_images(pdf_path, start, end, dpi=DEFAULT_DPI):
+    """List of pages start through end - 1, each rendered only when first needed.
+
+    Pages are rendered one at a time, so walking the list renders nothing past
+    the last page that was actually read.
+    """
+    pages = PageImages(pdf_path, start, end, dpi, chunk_size=1)
+    return [LazyPageImage(pages, idx) for idx in range(len(pages))]
@@ -0,0 +1,348 @@
+"""Turn matched table pages into rows and typed columns.
+
+Nothing is read again for this: text pages are taken from the text the
+search already extracted (Document.page_text), and scanned pages from the
+ocr word boxes (image_to_data) that the search keeps when EXTRACT_TABLES is
+set (on the Document, and in the ocr cache for later runs).
+
+In text, each line is a row: its leading words are the row label and every
+number (or missing value mark) after them a cell of its own. Ocr words are
+grouped into rows by vertical position and into cells by horizontal gaps.
+Columns are where the cells of the data rows (rows of several cells, some of
+them numbers) line up. Rows before the first data row (the table title and
+headings) become the table's title.
+
+Numeric columns are parsed in one pass into array("d") columns: thousands
+separators are dropped, "(12)" and the Korean "△12" are negative, and "-",
+"…" and "x" (not applicable / confidential) are missing values (nan).
+
+Tables are written to csv, and to parquet as well when pyarrow is installed.
+
+Example usage:
+    tables = table_extract.extract_tables(doc, page_nums)
+    table_extract.write_tables(tables, output_dir / "2001-exports.csv")
+"""
+from array import array
+from collections import namedtuple
+import csv
+import math
+import re
+import statistics
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from scraper.tools import ocr
+from scraper.tools.document import open_document
+
+# left/right/top/bottom in cells and lines for the text layer, pixels for ocr
+Word = namedtuple("Word", ["text", "left", "right", "top", "bottom"])
+# a negative number in parentheses needs both of them
+_NUMBER_RE = re.compile(r"\(\d[\d,]*(?:\.\d+)?\)|[-+△▲]?\d[\d,]*(?:\.\d+)?|\.\d+")
+_MISSING = {"", "-", "–", "—", "…", "...", "x", "X", "n.a.", "na"}
+# ocr words closer than this share of the text height belong to one cell
+OCR_CELL_GAP = 0.8
+
+
+class Table:
+    """A table read from one page.
+
+    Attributes:
+        source: name (stem) of the file the table was read from.
+        page: pdf page number (0-based).
+        title: text of the rows above the table body.
+        rows: body rows, each a list of one string per column.
+        columns: one entry per column, an array("d") for numeric columns
+            (nan where empty) and a list of strings otherwise.
+    """
+
+    def __init__(self, source, page, title, rows):
+        self.source = source
+        self.page = page
+        self.title = title
+        self.rows = rows
+        self.columns = parse_columns(rows)
+
+    @property
+    def num_columns(self):
+        return len(self.columns)
+
+    def records(self):
+        """Body rows with numeric cells as floats (None where missing).
+        """
+        for row_idx in range(len(self.rows)):
+            yield [
+                _cell_value(column, row_idx) for column in self.columns
+            ]
+
+
+def extract_tables(pdf_path, page_nums):
+    """Read the table on each of the given pages.
+
+    Pages with a text layer are read from it. The others use the word boxes
+    kept by the search, and pages without them are ocr'd with boxes in one
+    batch (using the ocr cache).
+
+    Args:
+        pdf_path: path to pdf (or Document).
+        page_nums: pages (0-based) to read, e.g. the matches of a search.
+
+    Returns:
+        list of Table, one per page that holds a table, in page order.
+    """
+    doc = open_document(pdf_path)
+    words = {}
+    scanned = []
+    for page_num in sorted(page_nums):
+        text = doc.page_text(page_num)
+        if text.strip():
+            words[page_num] = text_words(text)
+        elif doc.word_boxes.get(page_num) is not None:
+            words[page_num] = ocr_words(doc.word_boxes[page_num])
+        else:
+            scanned.append(page_num)
+    if scanned:
+        # the search's reading, so its cache entries are found
+        dpi, config = ocr.get_stage("CONFIRM")
+        entries = ocr.get_entries_for_pages(doc, scanned, dpi=dpi, config=config,
+                                            boxes=True)
+        for page_num, entry in entries.items():
+            doc.word_boxes[page_num] = entry["data"]
+            words[page_num] = ocr_words(entry["data"])
+
+    tables = []
+    for page_num in sorted(words):
+        title, rows = table_rows(words[page_num])
+        if rows:
+            tables.append(Table(doc.stem, page_num, title, rows))
+    return tables
+
+
+def text_words(text):
+    """Cells of extracted text as words, one cell and one line per unit of width and height.
+
+    A line's leading words form its label cell and every number (or missing
+    value mark) after them is a cell. Lines with words after their numbers
+    (titles such as "Table 6.1 Exports") are a single cell.
+    """
+    words = []
+    for line_num, line in enumerate(text.splitlines()):
+        tokens = line.split()
+        values = [_NUMBER_RE.fullmatch(token) is not None or token in _MISSING
+                  for token in tokens]
+        first = values.index(True) if True in values else len(tokens)
+        if all(values[first:]):
+            cells = [" ".join(tokens[:first])] if first else []
+            cells += tokens[first:]
+        else:
+            cells = [" ".join(tokens)]
+        words.extend(Word(cell, idx, idx + 1, line_num, line_num + 1)
+                     for idx, cell in enumerate(cells))
+    return words
+
+
+def ocr_words(data):
+    """Words of an image_to_data dict, without empty and rejected boxes.
+    """
+    if not data:
+        return []
+    return [
+        Word(text.strip(), left, left + width, top, top + height)
+        for text, left, top, width, height, conf in zip(
+            data["text"], data["left"], data["top"], data["width"], data["height"],
+            data["conf"])
+        if text.strip() and float(conf) >= 0
+    ]
+
+
+def table_rows(words):
+    """Arrange words into a title and body rows of cells.
+
+    Returns:
+        (title, rows): rows are lists of one string per column, and empty
+        if the page has no data rows.
+    """
+    if not words:
+        return "", []
+    height = statistics.median(word.bottom - word.top for word in words)
+    # the text layer has its cells already; ocr words are merged into cells
+    gap = OCR_CELL_GAP * height if height > 1 else 0
+    rows = [_cells(row, gap) for row in _rows(words, height)]
+    data_rows = [idx for idx, row in enumerate(rows) if _is_data_row(row)]
+    if not data_rows:
+        return "", []
+    first = data_rows[0]
+    spans = _column_spans([cell for idx in data_rows for cell in rows[idx]])
+    title = " ".join(cell.text for row in rows[:first] for cell in row)
+    body = []
+    for row in rows[first:]:
+        values = [""] * len(spans)
+        for cell in row:
+            idx = _column_of(cell, spans)
+            values[idx] = f"{values[idx]} {cell.text}".strip()
+        body.append(values)
+    return title, body
+
+
+def parse_columns(rows):
+    """Columns of rows, numeric ones parsed in bulk into array("d").
+    """
+    num_columns = max((len(row) for row in rows), default=0)
+    columns = []
+    for idx in range(num_columns):
+        cells = [row[idx].strip() if idx < len(row) else "" for row in rows]
+        present = [cell for cell in cells if cell not in _MISSING]
+        if present and all(_NUMBER_RE.fullmatch(cell) for cell in present):
+            columns.append(array("d", (_parse_number(cell) for cell in cells)))
+        else:
+            columns.append(cells)
+    return columns
+
+
+def write_tables(tables, csv_path, with_source=False):
+    """Write tables one below the other as csv (and parquet, if pyarrow is installed).
+
+    Columns are page, title and column_1 ... column_n, preceded by the file
+    name when with_source is set (for tables stacked from several yearbooks).
+
+    Returns:
+        list of paths written.
+    """
+    num_columns = max((table.num_columns for table in tables), default=0)
+    header = ["page", "title"] + [f"column_{idx + 1}" for idx in range(num_columns)]
+    if with_source:
+        header.insert(0, "file")
+    records = []
+    for table in tables:
+        prefix = [table.source] if with_source else []
+        for values in table.records():
+            values += [None] * (num_columns - len(values))
+            records.append(prefix + [table.page + 1, table.title] + values)
+
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(
+            ["" if value is None else _format(value) for value in record]
+            for record in records
+        )
+    written = [csv_path]
+    if pyarrow is not None:
+        parquet_path = csv_path.with_suffix(".parquet")
+        columns = {
+            name: [record[idx] for record in records] for idx, name in enumerate(header)
+        }
+        pyarrow.parquet.write_table(pyarrow.table(_arrow_columns(columns)), parquet_path)
+        written.append(parquet_path)
+    return written
+
+
+def read_tables(csv_path, source):
+    """Tables of one yearbook back from a csv written by write_tables.
+    """
+    groups = {}
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for page, title, *values in reader:
+            groups.setdefault((int(page) - 1, title), []).append(values)
+    tables = []
+    for (page, title), rows in groups.items():
+        # drop the padding up to the widest table of the file
+        width = max((idx + 1 for row in rows for idx, value in enumerate(row) if value),
+                    default=0)
+        tables.append(Table(source, page, title, [row[:width] for row in rows]))
+    return tables
+
+
+def _rows(words, height):
+    """Group words whose vertical centres are within half a text height.
+    """
+    rows = []
+    for word in sorted(words, key=lambda word: (word.top + word.bottom) / 2):
+        centre = (word.top + word.bottom) / 2
+        if rows and centre - rows[-1][0] <= height / 2:
+            rows[-1][1].append(word)
+        else:
+            rows.append([centre, [word]])
+    return [sorted(row, key=lambda word: word.left) for _, row in rows]
+
+
+def _is_data_row(row):
+    return len(row) > 1 and any(_NUMBER_RE.fullmatch(cell.text) for cell in row)
+
+
+def _cells(row, gap):
+    """Merge words of a row separated by less than gap into cells.
+    """
+    cells = [row[0]]
+    for word in row[1:]:
+        last = cells[-1]
+        if word.left - last.right < gap:
+            cells[-1] = Word(f"{last.text} {word.text}", last.left, max(last.right, word.right),
+                             min(last.top, word.top), max(last.bottom, word.bottom))
+        else:
+            cells.append(word)
+    return cells
+
+
+def _column_spans(cells):
+    """(left, right) of each column: overlapping cell extents merged.
+    """
+    spans = []
+    for cell in sorted(cells, key=lambda cell: cell.left):
+        if spans and cell.left < spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], cell.right)
+        else:
+            spans.append([cell.left, cell.right])
+    return spans
+
+
+def _column_of(cell, spans):
+    """Index of the column span nearest the cell's centre.
+    """
+    centre = (cell.left + cell.right) / 2
+
+    def distance(span):
+        left, right = span
+        return 0 if left <= centre <= right else min(abs(centre - left), abs(centre - right))
+
+    return min(range(len(spans)), key=lambda idx: distance(spans[idx]))
+
+
+def _parse_number(cell):
+    if cell in _MISSING:
+        return math.nan
+    negative = cell[0] in "-△▲" or cell.startswith("(")
+    digits = cell.strip("+-△▲()").replace(",", "")
+    value = float(digits)
+    return -value if negative else value
+
+
+def _cell_value(column, row_idx):
+    value = column[row_idx]
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    return value
+
+
+def _format(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _arrow_columns(columns):
+    arrays = {}
+    for name, values in columns.items():
+        present = [value for value in values if value is not None]
+        if present and all(isinstance(value, (int, float)) for value in present):
+            arrays[name] = pyarrow.array(values, type=pyarrow.float64())
+        else:
+            arrays[name] = pyarrow.array(
+                [None if value is None else str(value) for value in values],
+                type=pyarrow.string())
+    return arrays
@@ -1,17 +1,35 @@
 """Use ocr to get relevant page for extraction from a
 list of tables appearing at the beginning of the pdf.
 """
-import pytesseract
-from pdf2image import convert_from_path
 import re
 
+from scraper.tools import fuzzy
+from scraper.tools import layout
+from scraper.tools import metrics
+from scraper.tools import ocr
+from scraper.tools import ocr_cache
+from scraper.tools import page_offsets
+from scraper.tools import raster
+from scraper.tools import toc_store
+from scraper.tools.document import open_document
+
+# english column of the two-column table list, as a fraction of the page,
+# for pages whose layout could not be analysed
+RIGHT_COLUMN = (0.5, 0, 1, 1)
+# scripts osd reports for korean text
+KOREAN_SCRIPTS = ("Hangul", "Korean")
+# last page that may start the table list
+LAST_START_PAGE = 11
+# ocr cache crop under which a page's english column is remembered
+COLUMN_CROP = "english-column"
+
 
 class TableListNotFoundError(Exception):
     """Raised when a table list is not found in the PDF"""
     pass
 
 
-def search_table_list(pdf_path, query):
+def search_table_list(pdf_path, query, budget=None):
     """Searches table list for query and returns relevant page number.
 
     Locates the table list, searches for the query, and returns the page number corresponding to
@@ -19,9 +37,16 @@ def search_table_list(pdf_path, query):
     when doing actual ocr on the output page to account for possible errors in the table-list location
     process.
 
+    The query is looked up in the list's parsed title -> page entries; the
+    raw text of the list is only scanned when no title matches.
+
     Args:
-        pdf_path: path to the pdf to search.
+        pdf_path: path to the pdf (or Document) to search. The located table list
+            is remembered by the Document and, when a cache is configured, on
+            disk (see toc_store.py), so further queries do not ocr it again.
         query: search term
+        budget: optional budget.Budget charged with the pages read to locate
+            the table list (nothing when it is already known).
 
     Returns:
         logical page: where the table appears.
@@ -40,37 +65,117 @@ def search_table_list(pdf_path, query):
         else:
             final_table = do_ocr_around_relevant_page_num(relevant_page_num)
     """
-    # first, extract images.
-    images = extract_first_n_images(pdf_path, 25)
-    # print("[DEBUG] image extraction done")
-    start_page = get_table_list_start_page(images)
-    # print(f"[DEBUG] start page: {start_page}")
-    table_list = get_english_table_list(images, start_page)
-    for text in table_list:
-        if query.lower() in text.lower():
-            # print(f"[DEBUG] query found in text: {text}")
-            written_page = get_page_nums_near_query(text, query)
-            print(f"[DEBUG] Written page: {written_page}")
-            if written_page is not None:
-                start_page_of_body = start_page + len(table_list)
-                actual_pdf_page = start_page_of_body + (written_page - 1)
-                return actual_pdf_page
-            return None
+    record = locate_table_list(pdf_path, budget)
+    written_page = get_entry_page(record["entries"], query)
+    if written_page is None:
+        # titles the parser could not pair with a page number
+        written_page = search_table_list_text(record["table_list"], query)
+    print(f"[DEBUG] Written page: {written_page}")
+    if written_page is None:
+        return None
+    # learned from printed page numbers when available
+    actual_pdf_page, _ = page_offsets.predict(
+        pdf_path, written_page, default_offset=record["body_start"] - 1
+    )
+    return actual_pdf_page
+
+
+def get_entry_page(entries, query):
+    """Printed page of the first parsed table list entry whose title contains query.
+
+    An exact title wins over an approximate one anywhere in the list.
+
+    Returns:
+        page number, or None when no title matches.
+    """
+    for threshold in (0, None):
+        for entry in entries:
+            if fuzzy.contains(entry["title"], query, threshold=threshold):
+                return entry["page"]
     return None
 
 
+def search_table_list_text(table_list, query):
+    """Printed page near query in the raw text of the table list, or None.
+    """
+    # an exact title on any page of the list wins over an approximate one
+    text = next((text for text in table_list if fuzzy.contains(text, query, threshold=0)),
+                None)
+    if text is None:
+        text = next((text for text in table_list if fuzzy.contains(text, query)), None)
+    if text is None:
+        return None
+    # print(f"[DEBUG] query found in text: {text}")
+    return get_page_nums_near_query(text, query)
+
+
+def locate_table_list(pdf_path, budget=None):
+    """Find and read the list of tables, or load it from the toc store.
+
+    The pages ocr'd to find and read it are charged to budget, if given.
+
+    Returns:
+        record dict from toc_store.make_record(): start_page, table_list (page
+        texts), body_start and the parsed title -> printed page entries.
+
+    Raises:
+        TableListNotFoundError: no list of tables in the first pages.
+    """
+    doc = open_document(pdf_path)
+    if doc.table_list is None:
+        store = toc_store.get_default_store()
+        record = store.get(doc.digest) if store is not None else None
+        if record is not None:
+            metrics.count("table_list_store_hits")
+        else:
+            with metrics.timer("table_list"):
+                # first, extract images.
+                images = extract_first_n_images(doc, 25)
+                # print("[DEBUG] image extraction done")
+                try:
+                    start_page = get_table_list_start_page(images)
+                except TableListNotFoundError:
+                    record = {"found": False}
+                    pages_read = min(len(images), LAST_START_PAGE + 1)
+                else:
+                    # print(f"[DEBUG] start page: {start_page}")
+                    table_list = get_english_table_list(images, start_page)
+                    record = toc_store.make_record(start_page, table_list)
+                    # one text per page of the list, after the pages searched for it
+                    pages_read = start_page + len(table_list)
+            if budget is not None:
+                budget.charge(pages_read)
+            if store is not None:
+                store.put(doc.digest, record)
+        doc.table_list = record
+    if not doc.table_list["found"]:
+        raise TableListNotFoundError
+    return doc.table_list
+
+
+def get_table_of_contents(pdf_path):
+    """Returns the parsed list of tables as [{"title": ..., "page": ...}, ...].
+    """
+    return locate_table_list(pdf_path)["entries"]
+
+
 def extract_first_n_images(pdf_path, n):
-    return convert_from_path(pdf_path, first_page=1, last_page=n)
+    """Returns the first n pages as lazy images.
+
+    Each page is rendered only when its ocr is needed (and not cached), so
+    locating and reading the table list renders nothing past the last page read.
+    """
+    return raster.lazy_page_images(pdf_path, 0, n)
 
 
 def get_table_list_start_page(images):
     """Find table list start page and raise TableListNotFoundError if not found.
     """
     for idx, image in enumerate(images):
-        text = pytesseract.image_to_string(image).lower()
+        text = ocr.image_text(image).lower()
         if "table list" in text or "list of tables" in text:
             return idx
-        if idx > 10:
+        if idx >= LAST_START_PAGE:
             raise TableListNotFoundError
 
 
@@ -84,10 +189,17 @@ def get_english_table_list(images, start_page):
     list of tables should be altered according to the use.
 
     Looks at pages starting from the table list start page (determined beforehand),
-    using ocr to extract text from the right half of the page. When Korean is detected,
-    it assumes that the first page of the body of the document has been reached (since tables
-    are in both Korean and English on a given page) and ends the list there. This is taken
-    to be the entirety of the table list.
+    using ocr to extract text from the English column of the page (located by
+    layout.english_column, and read with the English model only). When Korean is
+    detected in that column by tesseract's script detection, it assumes that the first
+    page of the body of the document has been reached (since tables are in both Korean
+    and English on a given page) and ends the list there, without reading that page.
+    Where the script cannot be told, the list ends one page after the last page
+    mentioning chapter XX. This is taken to be the entirety of the table list.
+
+    The returned list always ends with an entry for the first body page (its
+    text, or "" when it was recognized without reading it), so len(text_list)
+    counts the same pages either way.
 
     Args:
         images: a list of images converted from the first 25 pages of the pdf
@@ -103,10 +215,12 @@ def get_english_table_list(images, start_page):
     """
     text_list = []
     near_end = False
-    for idx, image in enumerate(images):
-        if idx < start_page:
-            continue
-        text = ocr_right_column(image)
+    for idx in range(start_page, len(images)):
+        text, korean = read_english_column(images[idx], check_script=idx > start_page)
+        if korean:
+            # the body has been reached: keep its place in the list, unread
+            text_list.append("")
+            break
         if near_end and "XX" not in text:
             # print(f"[DEBUG] TableList ends at idx={idx}, text={text[:60]!r}")
             # append one more page for safety
@@ -118,13 +232,53 @@ def get_english_table_list(images, start_page):
     return text_list
 
 
-def ocr_right_column(image):
-    """uses ocr to extract text from the right half of the given image.
+def read_english_column(image, check_script=True):
+    """Text of the English column of a table list page, unless it is set in Korean.
+
+    The column is located by layout.english_column, which needs the page's
+    pixels. The outcome is kept in the ocr cache (when the image is tagged
+    with its source, see ocr.image_text) under COLUMN_CROP, so a page read
+    before is not rendered again.
+
+    Args:
+        image: rendered page (PIL image or raster.LazyPageImage).
+        check_script: whether to look for Korean in the column.
+
+    Returns:
+        (text, korean): korean is True when the column is in Korean, in which
+        case the text is "" without having been read.
+    """
+    source = getattr(image, "info", {}).get("source")
+    cache = ocr_cache.get_default_cache() if source is not None else None
+    if cache is not None:
+        digest, page_num, dpi = source
+        entry = cache.get(digest, page_num, dpi, "eng", COLUMN_CROP)
+        # the script is only known if it was looked for
+        if entry is not None and (not check_script or "script" in entry["data"]):
+            metrics.count("ocr_cache_hits")
+            return entry["text"], entry["data"].get("script") in KOREAN_SCRIPTS
+    column = layout.english_column(image)
+    data = {"box": None if column is None else list(column.box)}
+    korean = False
+    if column is None:
+        text = ocr_right_column(image)
+    else:
+        if check_script:
+            data["script"] = ocr.detect_script(image, crop=column.box)
+            korean = data["script"] in KOREAN_SCRIPTS
+        text = ocr_right_column(image, column.box) if column.lines and not korean else ""
+    if cache is not None:
+        cache.put(digest, page_num, dpi, "eng", COLUMN_CROP, text, data)
+    return text, korean
+
+
+def ocr_right_column(image, box=None):
+    """uses ocr to extract text from the English column of the given image.
+
+    box is the column as found by layout.english_column; without it the right
+    half of the page is read.
     """
-    width, height = image.size
-    right_col = image.crop((width // 2, 0, width, height))
-    text = pytesseract.image_to_string(right_col, lang='kor+eng')
-    return text
+    return ocr.image_text(image, lang='eng', crop=box or RIGHT_COLUMN)
 
 
 def get_page_nums_near_query(text, query):
@@ -137,8 +291,8 @@ def get_page_nums_near_query(text, query):
     If fails, get previous one before query.
     """
     # prefer finding a number after the query (may grab same line)
-    idx = text.lower().find(query.lower())
-    after_query = text[idx + len(query):]
+    idx, end = fuzzy.find(text, query) or (0, 0)
+    after_query = text[end:]
     num = re.search(r'(\d+)\s*$', after_query, re.MULTILINE)
     if num:
         return int(num.group(0))
@@ -0,0 +1,289 @@
+"""Directory-wide full-text index for text pdfs.
+
+Extracting text with pypdf is the dominant cost of searching text pdfs, so
+the index build step extracts every page once and stores an inverted index
+(term -> file/page postings with token positions) in a sqlite database.
+Searches then resolve candidate pages from the postings and confirm them
+against the stored page text, giving the same results as
+text_pdfs.get_page_nums_from_query_text without re-parsing the pdf.
+
+Build the index for INPUT_DIR by running this file as a module:
+    python -m scraper.tools.text_index
+and set TEXT_INDEX_PATH so that file_scraper consults it.
+"""
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from scraper.tools import text_pdfs as text
+from scraper.tools.document import open_document
+
+TOKEN_RE = re.compile(r"\w+")
+# sentinel above any character used to build prefix range queries
+_MAX_CHAR = "\U0010ffff"
+
+# db path -> TextIndex
+_indexes = {}
+
+
+def tokenize(page_text):
+    """Normalize page text into lowercase word tokens.
+    """
+    return TOKEN_RE.findall(page_text.lower())
+
+
+class TextIndex:
+    """Inverted index over the text layer of a set of pdfs.
+
+    Files are identified by resolved path and are considered stale (and
+    ignored) once their size or modification time changes.
+
+    Example usage:
+        index = TextIndex("yearbooks.sqlite")
+        build_index(pdf_paths, index)
+        page_nums = index.search(pdf_path, "population")
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._conn = None
+        self._pid = None
+        # query -> per-token candidate term ids, shared across files
+        self._term_ids = {}
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._pid = os.getpid()
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER,"
+                " mtime INTEGER, num_pages INTEGER, has_text INTEGER);"
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " file_id INTEGER, page INTEGER, text TEXT,"
+                " PRIMARY KEY (file_id, page));"
+                "CREATE TABLE IF NOT EXISTS terms ("
+                " id INTEGER PRIMARY KEY, term TEXT UNIQUE, rterm TEXT);"
+                "CREATE INDEX IF NOT EXISTS terms_rterm ON terms (rterm);"
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " term_id INTEGER, file_id INTEGER, data TEXT,"
+                " PRIMARY KEY (term_id, file_id));"
+            )
+        return self._conn
+
+    def _file_row(self, pdf_path):
+        """Return (id, has_text) for an up-to-date indexed file, else None.
+        """
+        path = Path(pdf_path).resolve()
+        stat = path.stat()
+        row = self.conn.execute(
+            "SELECT id, size, mtime, has_text FROM files WHERE path=?", (str(path),)
+        ).fetchone()
+        if row is None or row[1] != stat.st_size or row[2] != stat.st_mtime_ns:
+            return None
+        return row[0], bool(row[3])
+
+    def has_text(self, pdf_path):
+        """Whether an indexed pdf has a text layer, or None if it is not indexed.
+        """
+        row = self._file_row(pdf_path)
+        return None if row is None else row[1]
+
+    def add_file(self, pdf_path):
+        """Extract and index every page of a pdf (or Document), replacing older entries.
+
+        Scanned pdfs are recorded without postings so that has_text() can
+        answer for them too.
+        """
+        doc = open_document(pdf_path)
+        path = doc.path.resolve()
+        stat = path.stat()
+        self.remove_file(path)
+        has_text = text.pdf_has_text(doc)
+        cur = self.conn.execute(
+            "INSERT INTO files (path, size, mtime, num_pages, has_text)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (str(path), stat.st_size, stat.st_mtime_ns, doc.num_pages, int(has_text)),
+        )
+        file_id = cur.lastrowid
+        if has_text:
+            postings = {}
+            for page_num in range(doc.num_pages):
+                page_text = doc.page_text(page_num).lower()
+                self.conn.execute(
+                    "INSERT INTO pages VALUES (?, ?, ?)",
+                    (file_id, page_num, page_text),
+                )
+                for position, token in enumerate(tokenize(page_text)):
+                    pages = postings.setdefault(token, {})
+                    pages.setdefault(page_num, []).append(position)
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO terms (term, rterm) VALUES (?, ?)",
+                ((term, term[::-1]) for term in postings),
+            )
+            for term, pages in postings.items():
+                term_id = self.conn.execute(
+                    "SELECT id FROM terms WHERE term=?", (term,)
+                ).fetchone()[0]
+                self.conn.execute(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    (term_id, file_id, json.dumps(pages)),
+                )
+        self.conn.commit()
+        self._term_ids.clear()
+
+    def remove_file(self, pdf_path):
+        path = str(Path(pdf_path).resolve())
+        row = self.conn.execute("SELECT id FROM files WHERE path=?", (path,)).fetchone()
+        if row is None:
+            return
+        for table in ("pages", "postings"):
+            self.conn.execute(f"DELETE FROM {table} WHERE file_id=?", row)
+        self.conn.execute("DELETE FROM files WHERE id=?", row)
+        self.conn.commit()
+
+    def search(self, pdf_path, query):
+        """Get pages of an indexed text pdf on which query appears.
+
+        Args:
+            pdf_path: path to pdf.
+            query: search term to look for.
+
+        Returns:
+            page_nums: a list of page numbers on which the string occurs, or
+            None if the file is not indexed (or has changed since).
+        """
+        row = self._file_row(pdf_path)
+        if row is None or not row[1]:
+            return None
+        file_id = row[0]
+        query = query.lower()
+        candidates = self._candidate_pages(file_id, query)
+        if candidates is None:
+            rows = self.conn.execute(
+                "SELECT page, text FROM pages WHERE file_id=? ORDER BY page", (file_id,)
+            )
+        else:
+            rows = (
+                self.conn.execute(
+                    "SELECT page, text FROM pages WHERE file_id=? AND page=?",
+                    (file_id, page_num),
+                ).fetchone()
+                for page_num in sorted(candidates)
+            )
+        # confirm against stored text so results match a plain substring search
+        return [page_num for page_num, page_text in rows if query in page_text]
+
+    def _candidate_pages(self, file_id, query):
+        """Pages whose postings contain the query tokens as a phrase.
+
+        The first and last query tokens may be partial words, so they are
+        matched as suffix and prefix respectively (or substring for a single
+        token). Returns None when the query has no word tokens.
+        """
+        per_token = self._query_term_ids(query)
+        if per_token is None:
+            return None
+        # positions of each token: {page: set(positions)}
+        token_positions = []
+        for term_ids in per_token:
+            positions = {}
+            for term_id in term_ids:
+                row = self.conn.execute(
+                    "SELECT data FROM postings WHERE term_id=? AND file_id=?",
+                    (term_id, file_id),
+                ).fetchone()
+                if row is None:
+                    continue
+                for page, page_positions in json.loads(row[0]).items():
+                    positions.setdefault(int(page), set()).update(page_positions)
+            if not positions:
+                return set()
+            token_positions.append(positions)
+
+        candidates = set()
+        for page, starts in token_positions[0].items():
+            for offset, positions in enumerate(token_positions[1:], start=1):
+                page_positions = positions.get(page, set())
+                starts = {pos for pos in starts if pos + offset in page_positions}
+                if not starts:
+                    break
+            if starts:
+                candidates.add(page)
+        return candidates
+
+    def _query_term_ids(self, query):
+        if query in self._term_ids:
+            return self._term_ids[query]
+        tokens = tokenize(query)
+        if not tokens:
+            self._term_ids[query] = None
+            return None
+        per_token = []
+        for idx, token in enumerate(tokens):
+            if len(tokens) == 1:
+                rows = self.conn.execute(
+                    "SELECT id FROM terms WHERE instr(term, ?) > 0", (token,)
+                )
+            elif idx == 0:
+                rows = self.conn.execute(
+                    "SELECT id FROM terms WHERE rterm >= ? AND rterm < ?",
+                    (token[::-1], token[::-1] + _MAX_CHAR),
+                )
+            elif idx == len(tokens) - 1:
+                rows = self.conn.execute(
+                    "SELECT id FROM terms WHERE term >= ? AND term < ?",
+                    (token, token + _MAX_CHAR),
+                )
+            else:
+                rows = self.conn.execute("SELECT id FROM terms WHERE term=?", (token,))
+            per_token.append([row[0] for row in rows])
+        self._term_ids[query] = per_token
+        return per_token
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def build_index(pdf_paths, index, verbose=False):
+    """Index each pdf that is new or has changed since it was last indexed.
+    """
+    for pdf_path in pdf_paths:
+        if index.has_text(pdf_path) is not None:
+            continue
+        if verbose:
+            print(f"Indexing {Path(pdf_path).name}...")
+        index.add_file(pdf_path)
+
+
+def get_default_index():
+    """Return the index configured by TEXT_INDEX_PATH, or None if unset.
+    """
+    index_path = os.getenv("TEXT_INDEX_PATH")
+    if not index_path:
+        return None
+    index_path = Path(index_path)
+    if index_path not in _indexes:
+        _indexes[index_path] = TextIndex(index_path)
+    return _indexes[index_path]
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    INPUT_DIR = Path(os.getenv('INPUT_DIR'))
+    INDEX_PATH = Path(os.getenv('TEXT_INDEX_PATH'))
+
+    pdf_paths = [
+        INPUT_DIR / pdf for pdf in sorted(os.listdir(INPUT_DIR))
+        if pdf.lower().endswith(".pdf")
+    ]
+    build_index(pdf_paths, TextIndex(INDEX_PATH), verbose=True)
+    print(f"Index written to {INDEX_PATH}.")
@@ -3,7 +3,13 @@
 Allows for checking whether a pdf contains text to decide whether
 to search via this text handler (get_page_nums_from_query_text) or via ocr.
 """
-from pypdf import PdfReader
+from pypdf.generic import ContentStream
+
+from scraper.tools import content_strings
+from scraper.tools.document import open_document
+
+# content stream operators that paint text
+TEXT_SHOWING_OPERATORS = (b"Tj", b"TJ", b"'", b'"')
 
 
 def pdf_has_text(pdf_path, max_pages=30):
@@ -12,8 +18,12 @@ def pdf_has_text(pdf_path, max_pages=30):
     Returns true if pdf contains text.
     Signals use for ocr to search document.
 
+    Pages are classified from their resources and content streams rather than
+    by extracting text (see page_has_text), stopping at the first page that
+    shows text, so a scanned pdf is classified without any text extraction.
+
     Args:
-        pdf_path: path to pdf.
+        pdf_path: path to pdf (or Document).
         max_pages: max num of pages to scan to improve efficiency.
 
     Returns:
@@ -23,28 +33,81 @@ def pdf_has_text(pdf_path, max_pages=30):
         if not is_text_file(pdf_path):
             do_some_ocr_functions()
     """
-    reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages[:max_pages]:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text
-    return bool(text)
+    doc = open_document(pdf_path)
+    for page in doc.reader.pages[:max_pages]:
+        if page_has_text(page):
+            return True
+    return False
+
+
+def page_has_text(page):
+    """Check whether a page paints any text, without extracting it.
+
+    A page without fonts cannot show text (scanned pages only draw images),
+    so those are decided from the resource dictionary alone. Otherwise the
+    content stream (and those of any form xobjects it draws) is scanned for
+    a text-showing operator with a non-empty string.
+    """
+    return _shows_text(page.get("/Resources"), page.get_contents(), page.pdf)
+
+
+def _shows_text(resources, contents, reader, depth=0):
+    if contents is None or resources is None or depth > 5:
+        return False
+    resources = resources.get_object()
+    forms = []
+    for xobject in resources.get("/XObject", {}).values():
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") == "/Form":
+            forms.append(xobject)
+    if "/Font" in resources and b"BT" in contents.get_data():
+        if not isinstance(contents, ContentStream):
+            contents = ContentStream(contents, reader)
+        for operands, operator in contents.operations:
+            if operator not in TEXT_SHOWING_OPERATORS or not operands:
+                continue
+            # TJ takes an array of strings and kerning offsets
+            strings = operands[0] if operator == b"TJ" else operands[-1:]
+            if any(isinstance(s, (str, bytes)) and len(s) > 0 for s in strings):
+                return True
+    return any(
+        _shows_text(form.get("/Resources", resources), form, reader, depth + 1)
+        for form in forms
+    )
 
 
 def get_page_nums_from_query_text(pdf_path, query):
     """Search for a string in pdf.
 
+    Only the pages whose content streams may contain the string (see
+    candidate_pages) have their text extracted to confirm, so the result is
+    the same as searching the extracted text of every page.
+
     Args:
         str: string to search for
-        pdf_path: pdf to search
+        pdf_path: pdf (or Document) to search
 
     Returns:
         page_nums: a list of page numbers on which the string occurs.
     """
-    reader = PdfReader(pdf_path)
-    page_nums = []
-    for page in reader.pages:
-        if query.lower() in page.extract_text().lower():
-            page_nums.append(page.page_number)
-    return page_nums
\ No newline at end of file
+    doc = open_document(pdf_path)
+    query = query.lower()
+    return [page_num for page_num in candidate_pages(doc, query)
+            if query in doc.page_text(page_num).lower()]
+
+
+def candidate_pages(pdf_path, query):
+    """Pages that may contain query, judged from their raw content-stream text.
+
+    The raw text of every page is decoded once per Document (see
+    content_strings.py). Pages whose text could not be decoded are always
+    candidates.
+    """
+    doc = open_document(pdf_path)
+    if doc.raw_texts is None:
+        decoders = {}
+        doc.raw_texts = [content_strings.page_raw_text(page, decoders)
+                         for page in doc.reader.pages]
+    needle = content_strings.squash(query)
+    return [page_num for page_num, raw_text in enumerate(doc.raw_texts)
+            if raw_text is None or needle in raw_text]
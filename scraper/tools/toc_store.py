@@ -0,0 +1,151 @@
+"""Persisted list-of-tables maps, one per yearbook.
+
+Locating and reading the list of tables is the most expensive part of
+searching a scanned yearbook, and its result does not depend on the query.
+The located list is therefore stored once per file (keyed by content hash)
+together with a structured map of table title -> printed page number and the
+page on which the body starts, so later queries resolve to a page without
+running tesseract.
+
+The printed page numbers observed on ocr'd pages (see page_offsets.py) are
+kept alongside.
+
+Records live in toc.sqlite inside OCR_CACHE_DIR when that is set. Each
+carries the FORMAT_VERSION it was read with; records of another version are
+ignored, and replaced once the list has been read again.
+"""
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+STORE_FILE_NAME = "toc.sqlite"
+# raise when the way a table list is read or parsed changes
+# 2: the english column is located by layout.english_column
+FORMAT_VERSION = 2
+
+# a table list line ends with its printed page number, usually after leader dots
+ENTRY_RE = re.compile(r"^(?P<title>.*?\S)(?:\s+|\s*[.·…_]{2,}\s*)(?P<page>\d+)\s*$")
+
+# db path -> TocStore
+_stores = {}
+
+
+def parse_table_list(table_list):
+    """Parse the ocr'd english column of a table list into entries.
+
+    Title lines without a trailing page number are joined with the following
+    line, since long titles wrap.
+
+    Args:
+        table_list: list of page texts from get_english_table_list().
+
+    Returns:
+        list of {"title": str, "page": int} in list order.
+    """
+    entries = []
+    for text in table_list:
+        pending = ""
+        for line in text.splitlines():
+            line = line.strip()
+            # skip blank lines and the list heading itself
+            if not line or "list of tables" in line.lower() or "table list" in line.lower():
+                continue
+            match = ENTRY_RE.match(line)
+            if match and len(match.group("page")) <= 4:
+                title = f"{pending} {match.group('title')}".strip()
+                entries.append({"title": title, "page": int(match.group("page"))})
+                pending = ""
+            else:
+                pending = f"{pending} {line}".strip()
+    return entries
+
+
+def make_record(start_page, table_list):
+    """Build the stored record for a located table list.
+    """
+    return {
+        "found": True,
+        "start_page": start_page,
+        "table_list": table_list,
+        "body_start": start_page + len(table_list),
+        "entries": parse_table_list(table_list),
+    }
+
+
+class TocStore:
+    """Table-list records keyed by pdf content hash, backed by sqlite.
+
+    A record is either {"found": False} for yearbooks without a visible list
+    of tables, or the dict built by make_record(). Records stored with a
+    FORMAT_VERSION other than the current one are not returned.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._pid = os.getpid()
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS tocs (digest TEXT PRIMARY KEY, data TEXT);"
+                "CREATE TABLE IF NOT EXISTS folios ("
+                " digest TEXT, page INTEGER, printed INTEGER,"
+                " PRIMARY KEY (digest, page));"
+            )
+        return self._conn
+
+    def get(self, digest):
+        row = self.conn.execute(
+            "SELECT data FROM tocs WHERE digest=?", (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row[0])
+        # records from before versioning have none
+        if record.pop("version", None) != FORMAT_VERSION:
+            return None
+        return record
+
+    def put(self, digest, record):
+        data = json.dumps(dict(record, version=FORMAT_VERSION))
+        self.conn.execute("INSERT OR REPLACE INTO tocs VALUES (?, ?)", (digest, data))
+        self.conn.commit()
+
+    def get_folios(self, digest):
+        """Returns {pdf page: printed page number} observed for a file.
+        """
+        rows = self.conn.execute(
+            "SELECT page, printed FROM folios WHERE digest=?", (digest,)
+        )
+        return dict(rows)
+
+    def put_folios(self, digest, folios):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO folios VALUES (?, ?, ?)",
+            ((digest, page, printed) for page, printed in folios.items()),
+        )
+        self.conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def get_default_store():
+    """Return the store in OCR_CACHE_DIR, or None if caching is off.
+    """
+    cache_dir = os.getenv("OCR_CACHE_DIR")
+    if not cache_dir:
+        return None
+    db_path = Path(cache_dir) / STORE_FILE_NAME
+    if db_path not in _stores:
+        _stores[db_path] = TocStore(db_path)
+    return _stores[db_path]
@@ -0,0 +1,252 @@
+"""Watch INPUT_DIR and scrape yearbooks as they arrive.
+
+A manifest of the files already processed (path, size, mtime, content hash)
+and their results per query is kept in a sqlite database. Each poll only
+searches files that are new or whose contents changed (and files missing a
+result for a query, e.g. after a query is added, for the queries it lacks),
+then rewrites the merged pdfs and csv report of batch mode from the stored
+results. Each file's section of every merged pdf is kept in .scrape-sections
+in OUTPUT_DIR, so only the sections of the files just searched are cut from
+their pdfs again. Adding one yearbook to the directory costs one file's work.
+
+Run with the queries file used for batch mode:
+    python -m scraper.watch queries.txt
+The manifest is WATCH_MANIFEST, or .scrape-manifest.sqlite in OUTPUT_DIR.
+WATCH_INTERVAL sets the seconds between polls (default 30).
+"""
+import json
+import os
+from pathlib import Path
+import sqlite3
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from scraper import directory_scraper
+from scraper.file_scraper import fallback_allowed
+from scraper.tools import budget as budgets
+from scraper.tools import ocr_cache
+from scraper.tools.document import Document
+
+MANIFEST_FILE_NAME = ".scrape-manifest.sqlite"
+SECTIONS_DIR_NAME = ".scrape-sections"
+DEFAULT_INTERVAL = 30
+# files modified more recently than this may still be being copied in
+SETTLE_SECONDS = 5
+
+
+class Manifest:
+    """Processed files and their stored results, backed by sqlite.
+
+    Example usage:
+        manifest = Manifest(output_dir / ".scrape-manifest.sqlite")
+        if manifest.is_current(pdf_path):
+            results, note = manifest.results(pdf_path)
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._pid = os.getpid()
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT);"
+                "CREATE TABLE IF NOT EXISTS results ("
+                " path TEXT, query TEXT, pages TEXT, note TEXT,"
+                " PRIMARY KEY (path, query));"
+            )
+        return self._conn
+
+    def paths(self):
+        return [Path(row[0]) for row in self.conn.execute("SELECT path FROM files")]
+
+    def is_current(self, pdf_path):
+        """Whether the file is recorded with its current contents.
+
+        Files whose size or mtime changed are hashed, so a file that was only
+        touched (or copied over with the same contents) is not searched again.
+        """
+        stat = Path(pdf_path).stat()
+        row = self.conn.execute(
+            "SELECT size, mtime, digest FROM files WHERE path=?", (str(pdf_path),)
+        ).fetchone()
+        if row is None:
+            return False
+        if row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return True
+        if ocr_cache.file_digest(pdf_path) != row[2]:
+            return False
+        self.conn.execute(
+            "UPDATE files SET size=?, mtime=? WHERE path=?",
+            (stat.st_size, stat.st_mtime_ns, str(pdf_path)),
+        )
+        self.conn.commit()
+        return True
+
+    def record(self, pdf_path, results, note=None):
+        """Store a file's current state and its results, replacing older results.
+
+        Args:
+            pdf_path: searched pdf.
+            results: {query: page numbers or None}.
+            note: budget note, see directory_scraper._search_deferred.
+        """
+        stat = Path(pdf_path).stat()
+        digest = ocr_cache.file_digest(pdf_path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (str(pdf_path), stat.st_size, stat.st_mtime_ns, digest),
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            ((str(pdf_path), query, json.dumps(page_nums), note)
+             for query, page_nums in results.items()),
+        )
+        self.conn.commit()
+
+    def results(self, pdf_path):
+        """Returns ({query: page numbers or None}, note) stored for a file.
+        """
+        rows = self.conn.execute(
+            "SELECT query, pages, note FROM results WHERE path=?", (str(pdf_path),)
+        ).fetchall()
+        note = next((row[2] for row in rows if row[2]), None)
+        return {query: json.loads(pages) for query, pages, _ in rows}, note
+
+    def forget(self, pdf_path, results_only=False):
+        self.conn.execute("DELETE FROM results WHERE path=?", (str(pdf_path),))
+        if not results_only:
+            self.conn.execute("DELETE FROM files WHERE path=?", (str(pdf_path),))
+        self.conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def poll(input_dir, output_dir, queries, manifest, verbose=True, workers=1, fallback=None):
+    """Process new, changed and removed files once, and rewrite outputs if needed.
+
+    Args:
+        input_dir: directory of yearbook pdfs.
+        output_dir: directory for the merged pdfs and csv report.
+        queries: list of search terms.
+        manifest: Manifest of processed files.
+        verbose: print progress.
+        workers: number of pdfs to search at once.
+        fallback: whether to ocr whole pdfs that have no list of tables.
+
+    Returns:
+        list of pdf paths that were searched.
+    """
+    pdf_paths = directory_scraper._list_pdfs(input_dir)
+    section_dir = output_dir / SECTIONS_DIR_NAME
+    changed = False
+    for pdf_path in set(manifest.paths()) - set(pdf_paths):
+        if verbose:
+            print(f"Removed: {pdf_path.name}")
+        manifest.forget(pdf_path)
+        for section_path in section_dir.glob(f"*/{pdf_path.stem}.pdf"):
+            section_path.unlink()
+        changed = True
+
+    now = time.time()
+    # pdf path -> queries it has no result for
+    pending = {}
+    for pdf_path in pdf_paths:
+        if now - pdf_path.stat().st_mtime < SETTLE_SECONDS:
+            # picked up by a later poll once it stops changing
+            continue
+        if not manifest.is_current(pdf_path):
+            manifest.forget(pdf_path, results_only=True)
+            pending[pdf_path] = list(queries)
+        else:
+            missing = [query for query in queries
+                       if query not in manifest.results(pdf_path)[0]]
+            if missing:
+                pending[pdf_path] = missing
+
+    # shared by the search and the outputs, so each new pdf is read once
+    docs = {pdf_path: Document(pdf_path) for pdf_path in pending}
+    try:
+        if pending:
+            if verbose:
+                print(f"Searching {len(pending)} new or changed pdfs.")
+            run_budget = budgets.from_env("RUN")
+            # pdfs missing the same queries are searched together
+            groups = {}
+            for pdf_path, missing in pending.items():
+                groups.setdefault(tuple(missing), []).append(pdf_path)
+            for missing, group in groups.items():
+                found, notes = directory_scraper.search_files(
+                    {pdf_path: docs[pdf_path] for pdf_path in group}, list(missing),
+                    verbose, workers, fallback, run_budget,
+                )
+                for pdf_path in group:
+                    manifest.record(pdf_path, found[pdf_path], notes.get(pdf_path))
+            changed = True
+
+        if changed:
+            recorded = [pdf_path for pdf_path in pdf_paths if manifest.is_current(pdf_path)]
+            stored = {pdf_path: manifest.results(pdf_path) for pdf_path in recorded}
+            directory_scraper.write_outputs(
+                output_dir, input_dir.name,
+                {pdf_path: docs.get(pdf_path, pdf_path) for pdf_path in recorded},
+                queries,
+                {pdf_path: results for pdf_path, (results, _) in stored.items()},
+                {pdf_path: note for pdf_path, (_, note) in stored.items()},
+                verbose,
+                fresh=set(pending),
+                section_dir=section_dir,
+            )
+    finally:
+        directory_scraper._close_all(docs)
+    return list(pending)
+
+
+def watch(queries, verbose=True, interval=None, workers=None, fallback=None):
+    """Poll INPUT_DIR forever, scraping yearbooks as they arrive.
+
+    Args:
+        queries: list of search terms.
+        verbose: print progress.
+        interval: seconds between polls. Defaults to WATCH_INTERVAL, or 30.
+        workers: number of pdfs to search at once. Defaults to SCRAPE_WORKERS, or 1.
+        fallback: whether to ocr whole pdfs that have no list of tables.
+            None follows SCRAPE_FALLBACK, or asks once before watching.
+    """
+    load_dotenv()
+    INPUT_DIR = Path(os.getenv('INPUT_DIR'))
+    OUTPUT_DIR = Path(os.getenv('OUTPUT_DIR'))
+    manifest_path = os.getenv("WATCH_MANIFEST") or OUTPUT_DIR / MANIFEST_FILE_NAME
+    manifest = Manifest(manifest_path)
+    if interval is None:
+        interval = float(os.getenv("WATCH_INTERVAL", DEFAULT_INTERVAL))
+    workers = directory_scraper._worker_count(workers)
+    if fallback is None:
+        fallback = fallback_allowed()
+
+    if verbose:
+        print(f"Watching {INPUT_DIR} (Ctrl-C to stop).")
+    try:
+        while True:
+            directory_scraper._update_index(INPUT_DIR, verbose=False)
+            poll(INPUT_DIR, OUTPUT_DIR, queries, manifest, verbose, workers, fallback)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manifest.close()
+
+
+if __name__ == "__main__":
+    watch(directory_scraper.read_queries(sys.argv[1]), verbose=True)
@@ -10,6 +10,13 @@ PROJECT_ROOT = TESTS_ROOT.parent
 RESOURCE_ROOT = PROJECT_ROOT / "resources"
 
 
+@pytest.fixture(autouse=True)
+def subprocess_ocr_backend(monkeypatch):
+    """Ocr through pytesseract, which tests replace with fakes.
+    """
+    monkeypatch.setenv("OCR_BACKEND", "subprocess")
+
+
 @pytest.fixture()
 def pdf_file_path(tmp_path):
     return tmp_path / f"{uuid.uuid4()}.pdf"
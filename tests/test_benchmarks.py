@@ -0,0 +1,35 @@
+from benchmarks.run import compare
+from benchmarks.synthetic import make_yearbook
+from scraper.tools import text_pdfs as text
+from scraper.tools.document import Document
+
+
+def test_synthetic_yearbook_layout(pdf_file_path):
+    info = make_yearbook(pdf_file_path, num_pages=80)
+    doc = Document(pdf_file_path)
+    assert doc.num_pages == info["num_pages"] == 80
+    assert "List of Tables" in doc.page_text(info["list_start"])
+    for table in info["tables"][:5]:
+        assert table["pdf_page"] in text.get_page_nums_from_query_text(doc, table["title"])
+        assert f"- {table['printed_page']} -" in doc.page_text(table["pdf_page"])
+
+
+def test_synthetic_scanned_yearbook_has_no_text(pdf_file_path):
+    make_yearbook(pdf_file_path, num_pages=6, scanned=True, dpi=50)
+    assert not text.pdf_has_text(Document(pdf_file_path))
+
+
+def test_compare_flags_slower_and_incorrect_stages():
+    baseline = {"stages": {
+        "text_search": {"seconds": 1.0, "correct": True},
+        "classify": {"seconds": 1.0, "correct": True},
+        "window_ocr": {"skipped": "tesseract not installed"},
+    }}
+    current = {"stages": {
+        "text_search": {"seconds": 1.1, "correct": True},
+        "classify": {"seconds": 1.5, "correct": False},
+        "window_ocr": {"seconds": 9.0, "correct": True},
+    }}
+    regressions = compare(baseline, current, tolerance=0.2)
+    assert len(regressions) == 2
+    assert all(regression.startswith("classify") for regression in regressions)
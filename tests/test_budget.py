@@ -0,0 +1,27 @@
+"""Unit tests for ocr budgets."""
+
+from scraper.tools import budget as budgets
+
+
+def test_file_budget_draws_on_run_budget():
+    run_budget = budgets.Budget(max_pages=10)
+    first = budgets.Budget(max_pages=8, parent=run_budget)
+    first.charge(8)
+    assert first.exhausted()
+    second = budgets.Budget(max_pages=8, parent=run_budget)
+    assert second.remaining_pages() == 2
+    second.charge(2)
+    assert second.exhausted() and run_budget.exhausted()
+
+
+def test_time_limit():
+    assert budgets.Budget(max_seconds=0).exhausted()
+    assert not budgets.Budget(max_seconds=60).exhausted()
+    assert budgets.Budget().remaining_pages() is None
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("OCR_FILE_MAX_PAGES", "30")
+    monkeypatch.delenv("OCR_FILE_MAX_SECONDS", raising=False)
+    budget = budgets.from_env("FILE")
+    assert budget.max_pages == 30 and budget.max_seconds is None
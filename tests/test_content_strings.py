@@ -0,0 +1,158 @@
+"""Unit tests for the content-stream prefilter of text search."""
+
+from fpdf import FPDF
+from pypdf import PageObject, PdfWriter
+from pypdf.generic import (
+    ContentStream, DecodedStreamObject, DictionaryObject, NameObject,
+)
+import pytest
+
+from benchmarks.synthetic import make_yearbook
+from scraper.tools import content_strings
+from scraper.tools import text_pdfs as text
+from scraper.tools.document import Document
+
+TO_UNICODE = b"""/CIDInit /ProcSet findresource begin
+begincmap
+1 begincodespacerange <0000> <FFFF> endcodespacerange
+2 beginbfchar
+<0001> <D55C>
+<0002> <AD6D>
+endbfchar
+1 beginbfrange
+<0010> <0012> <0041>
+endbfrange
+endcmap
+"""
+
+
+def make_page(content, font):
+    """A one-page reader whose page shows content with font as /F1."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(200, 200)
+    font_ref = writer._add_object(font)
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref}),
+    })
+    stream = ContentStream(None, None)
+    stream.set_data(content)
+    page.replace_contents(stream)
+    return page
+
+
+def simple_font(encoding=None):
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Times-Roman"),
+    })
+    if encoding is not None:
+        font[NameObject("/Encoding")] = NameObject(encoding)
+    return font
+
+
+def unicode_font():
+    to_unicode = DecodedStreamObject()
+    to_unicode.set_data(TO_UNICODE)
+    return DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type0"),
+        NameObject("/BaseFont"): NameObject("/Batang"),
+        NameObject("/ToUnicode"): to_unicode,
+    })
+
+
+def test_squash_removes_whitespace_and_case():
+    assert content_strings.squash(" Hello\n Again,\tWorld ") == "helloagain,world"
+
+
+def test_literal_strings_are_unescaped():
+    page = make_page(b"BT /F1 12 Tf (Hello \\(big\\) W\\157rld\\\n!) Tj ET",
+                     simple_font("/WinAnsiEncoding"))
+    assert content_strings.page_raw_text(page, {}) == "hello(big)world!"
+
+
+def test_hex_strings_decode_with_to_unicode():
+    page = make_page(b"BT /F1 12 Tf <00010002> Tj [<0010 0011>-120<0012>] TJ ET",
+                     unicode_font())
+    assert content_strings.page_raw_text(page, {}) == "한국abc"
+
+
+def test_unmapped_codes_leave_page_undecoded():
+    page = make_page(b"BT /F1 12 Tf <0003> Tj ET", unicode_font())
+    assert content_strings.page_raw_text(page, {}) is None
+
+
+@pytest.mark.parametrize("content,font", [
+    # a font with its own encoding differences
+    (b"BT /F1 12 Tf (abc) Tj ET", DictionaryObject({
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/Encoding"): DictionaryObject(),
+    })),
+    # a composite font without ToUnicode
+    (b"BT /F1 12 Tf <0001> Tj ET", DictionaryObject({
+        NameObject("/Subtype"): NameObject("/Type0"),
+    })),
+    # standard encoding outside printable ascii
+    (b"BT /F1 12 Tf (\\341) Tj ET", simple_font()),
+    # text shown before any font is selected
+    (b"BT (abc) Tj ET", simple_font()),
+    # an inline image
+    (b"BI /W 1 /H 1 /BPC 8 /CS /G ID \x00 EI BT /F1 12 Tf (abc) Tj ET", simple_font()),
+])
+def test_uncertain_pages_have_no_raw_text(content, font):
+    assert content_strings.page_raw_text(make_page(content, font), {}) is None
+
+
+def test_font_is_restored_with_graphics_state():
+    page = make_page(b"q BT /F2 12 Tf ET Q BT (abc) Tj ET", simple_font())
+    assert content_strings.page_raw_text(page, {}) is None
+    page = make_page(b"BT /F1 12 Tf ET q BT /F2 12 Tf ET Q BT (abc) Tj ET", simple_font())
+    assert content_strings.page_raw_text(page, {}) == "abc"
+
+
+def test_raw_text_matches_extracted_text(pdf_file_path):
+    make_yearbook(pdf_file_path, num_pages=60)
+    doc = Document(pdf_file_path)
+    decoders = {}
+    for page in doc.reader.pages:
+        raw_text = content_strings.page_raw_text(page, decoders)
+        assert raw_text == content_strings.squash(page.extract_text())
+
+
+def test_only_candidate_pages_are_extracted(pdf_file_path, monkeypatch):
+    info = make_yearbook(pdf_file_path, num_pages=60)
+    doc = Document(pdf_file_path)
+    extracted = []
+    extract_text = PageObject.extract_text
+
+    def counting_extract_text(page, *args, **kwargs):
+        extracted.append(page.page_number)
+        return extract_text(page, *args, **kwargs)
+
+    monkeypatch.setattr(PageObject, "extract_text", counting_extract_text)
+    table = info["tables"][3]
+    assert table["pdf_page"] in text.get_page_nums_from_query_text(doc, table["title"])
+    assert len(extracted) < 5
+
+
+def test_prefilter_keeps_search_results(pdf_with_text):
+    reference = Document(pdf_with_text)
+    page_texts = [reference.page_text(page_num).lower()
+                  for page_num in range(reference.num_pages)]
+    doc = Document(pdf_with_text)
+    for query in ["Hello World", "hello   again", "World", "third", "What?!?"]:
+        # the same pages as searching the extracted text of every page
+        assert text.get_page_nums_from_query_text(doc, query) == \
+            [page_num for page_num, page_text in enumerate(page_texts)
+             if query.lower() in page_text]
+
+
+def test_fpdf_core_fonts_are_decoded(pdf_file_path):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=12)
+    pdf.cell(0, 10, "Exports (1,000 won)")
+    pdf.output(pdf_file_path)
+    page = Document(pdf_file_path).reader.pages[0]
+    assert content_strings.page_raw_text(page, {}) == "exports(1,000won)"
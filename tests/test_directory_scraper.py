@@ -1,4 +1,7 @@
-from pypdf import PdfReader, PdfWriter
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from pypdf import PdfReader
 from fpdf import FPDF
 import tempfile
 from pathlib import Path
@@ -6,10 +9,8 @@ import pytest
 
 from scraper.directory_scraper import main as directory_main
 
-def dummy_scrape(pdf_path, query, verbose):
-    writer = PdfWriter()
-    writer.add_blank_page(width=612, height=792)
-    return writer
+def dummy_find_pages(pdf_path, queries, verbose, fallback=None, budget=None):
+    return {query: [0] for query in queries}
 
 def test_directory_scraper_creates_merged_pdf(monkeypatch):
     with tempfile.TemporaryDirectory() as input_dir, tempfile.TemporaryDirectory() as output_dir:
@@ -25,11 +26,172 @@ def test_directory_scraper_creates_merged_pdf(monkeypatch):
         monkeypatch.setenv("OUTPUT_DIR", output_dir)
 
         import scraper.directory_scraper
-        monkeypatch.setattr(scraper.directory_scraper, "scrape", dummy_scrape)
+        monkeypatch.setattr(scraper.directory_scraper, "find_pages", dummy_find_pages)
 
         directory_main("TestQuery", verbose=False)
 
         output_pdf = Path(output_dir) / f"TestQuery-scraped-{Path(input_dir).name}.pdf"
         assert output_pdf.exists()
         reader = PdfReader(str(output_pdf))
-        assert len(reader.pages) == 4
\ No newline at end of file
+        assert len(reader.pages) == 4
+
+def test_batch_scrapes_each_file_once(monkeypatch):
+    with tempfile.TemporaryDirectory() as input_dir, tempfile.TemporaryDirectory() as output_dir:
+        for i in range(2):
+            pdf_path = Path(input_dir) / f"{2000+i}_test.pdf"
+            pdf = FPDF()
+            for page in range(3):
+                pdf.add_page()
+            pdf.output(str(pdf_path))
+
+        monkeypatch.setenv("INPUT_DIR", input_dir)
+        monkeypatch.setenv("OUTPUT_DIR", output_dir)
+
+        calls = []
+
+        def dummy_find_pages(pdf_path, queries, verbose, fallback=None, budget=None):
+            calls.append(pdf_path.name)
+            return {"GDP": [0, 2], "Population": None}
+
+        import scraper.directory_scraper
+        monkeypatch.setattr(scraper.directory_scraper, "find_pages", dummy_find_pages)
+
+        scraper.directory_scraper.batch_main(["GDP", "Population"], verbose=False)
+
+        assert calls == ["2000_test.pdf", "2001_test.pdf"]
+        dir_name = Path(input_dir).name
+        # header page + 2 matches per file
+        assert len(PdfReader(str(Path(output_dir) / f"GDP-scraped-{dir_name}.pdf")).pages) == 6
+        assert len(PdfReader(str(Path(output_dir) / f"Population-scraped-{dir_name}.pdf")).pages) == 2
+        report = (Path(output_dir) / f"batch-report-{dir_name}.csv").read_text().splitlines()
+        assert report[0] == "file,query,status,pages"
+        assert report[1] == "2000_test,GDP,2 matches,1 3"
+        assert report[2] == "2000_test,Population,not searched,"
+
+
+def test_concurrent_merge_keeps_year_order(monkeypatch):
+    with tempfile.TemporaryDirectory() as input_dir, tempfile.TemporaryDirectory() as output_dir:
+        for i in range(3):
+            pdf_path = Path(input_dir) / f"{2000+i}_test.pdf"
+            pdf = FPDF()
+            for page in range(i + 1):
+                pdf.add_page()
+                pdf.set_font("Times", size=12)
+                pdf.cell(40, 10, f"{2000+i} page {page}")
+            pdf.output(str(pdf_path))
+
+        monkeypatch.setenv("INPUT_DIR", input_dir)
+        monkeypatch.setenv("OUTPUT_DIR", output_dir)
+
+        def slow_first_find_pages(pdf_path, queries, verbose, fallback=None, budget=None):
+            # the earliest year finishes last
+            if pdf_path.name.startswith("2000"):
+                time.sleep(0.2)
+            return {query: list(range(int(pdf_path.name[3]) + 1)) for query in queries}
+
+        import scraper.directory_scraper
+        monkeypatch.setattr(scraper.directory_scraper, "find_pages", slow_first_find_pages)
+        # threads stand in for processes so the patch above applies
+        monkeypatch.setattr(scraper.directory_scraper, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+        directory_main("TestQuery", verbose=False, workers=3)
+
+        output_pdf = Path(output_dir) / f"TestQuery-scraped-{Path(input_dir).name}.pdf"
+        texts = [page.extract_text() for page in PdfReader(str(output_pdf)).pages]
+        assert [text.split()[0] for text in texts] == [
+            "File:", "2000", "File:", "2001", "2001", "File:", "2002", "2002", "2002"
+        ]
+
+
+def test_fallbacks_run_last_smallest_first_within_budget(monkeypatch):
+    with tempfile.TemporaryDirectory() as input_dir, tempfile.TemporaryDirectory() as output_dir:
+        # 2000 has a list of tables; 2001 (5 pages) and 2002 (2 pages) do not
+        for i, num_pages in enumerate([3, 5, 2]):
+            pdf_path = Path(input_dir) / f"{2000+i}_test.pdf"
+            pdf = FPDF()
+            for page in range(num_pages):
+                pdf.add_page()
+            pdf.output(str(pdf_path))
+
+        monkeypatch.setenv("INPUT_DIR", input_dir)
+        monkeypatch.setenv("OUTPUT_DIR", output_dir)
+        monkeypatch.setenv("OCR_RUN_MAX_PAGES", "2")
+        monkeypatch.delenv("OCR_FILE_MAX_PAGES", raising=False)
+        calls = []
+
+        def dummy_find_pages(doc, queries, verbose, fallback=None, budget=None):
+            calls.append(("find", doc.name, fallback))
+            if doc.name.startswith("2000"):
+                return {query: [0] for query in queries}
+            doc.table_list = {"found": False}
+            return {query: None for query in queries}
+
+        def dummy_search_whole_document(doc, queries, verbose, fallback, budget):
+            calls.append(("ocr", doc.name))
+            budget.charge(doc.num_pages)
+            return {query: [1] for query in queries}
+
+        import scraper.directory_scraper
+        monkeypatch.setattr(scraper.directory_scraper, "find_pages", dummy_find_pages)
+        monkeypatch.setattr(scraper.directory_scraper, "search_whole_document",
+                            dummy_search_whole_document)
+
+        scraper.directory_scraper.batch_main(["GDP"], verbose=False, fallback=True)
+
+        assert calls == [
+            ("find", "2000_test.pdf", False),
+            ("find", "2001_test.pdf", False),
+            ("find", "2002_test.pdf", False),
+            ("ocr", "2002_test.pdf"),
+        ]
+        report = (Path(output_dir) / f"batch-report-{Path(input_dir).name}.csv").read_text()
+        assert report.splitlines()[1:] == [
+            "2000_test,GDP,1 matches,1",
+            "2001_test,GDP,over budget,",
+            "2002_test,GDP,1 matches,2",
+        ]
+
+
+def test_run_budget_covers_every_phase(monkeypatch):
+    with tempfile.TemporaryDirectory() as input_dir, tempfile.TemporaryDirectory() as output_dir:
+        # 2000 and 2001 have a list of tables; 2002 does not
+        for i in range(3):
+            pdf_path = Path(input_dir) / f"{2000+i}_test.pdf"
+            pdf = FPDF()
+            pdf.add_page()
+            pdf.output(str(pdf_path))
+
+        monkeypatch.setenv("INPUT_DIR", input_dir)
+        monkeypatch.setenv("OUTPUT_DIR", output_dir)
+        monkeypatch.setenv("OCR_RUN_MAX_PAGES", "5")
+        monkeypatch.delenv("OCR_FILE_MAX_PAGES", raising=False)
+        budgets_seen = []
+
+        def dummy_find_pages(doc, queries, verbose, fallback=None, budget=None):
+            budgets_seen.append(budget.remaining_pages())
+            if doc.name.startswith("2002"):
+                doc.table_list = {"found": False}
+                return {query: None for query in queries}
+            # the window search uses up the rest of the run budget
+            budget.charge(3)
+            if budget.exhausted():
+                budget.stop()
+            return {query: [0] for query in queries}
+
+        def dummy_search_whole_document(doc, queries, verbose, fallback, budget):
+            raise AssertionError("the run budget is spent")
+
+        import scraper.directory_scraper
+        monkeypatch.setattr(scraper.directory_scraper, "find_pages", dummy_find_pages)
+        monkeypatch.setattr(scraper.directory_scraper, "search_whole_document",
+                            dummy_search_whole_document)
+
+        scraper.directory_scraper.batch_main(["GDP"], verbose=False, fallback=True)
+
+        assert budgets_seen == [5, 2, 0]
+        report = (Path(output_dir) / f"batch-report-{Path(input_dir).name}.csv").read_text()
+        assert report.splitlines()[1:] == [
+            "2000_test,GDP,1 matches,1",
+            "2001_test,GDP,partial: 1 matches,1",
+            "2002_test,GDP,over budget,",
+        ]
@@ -0,0 +1,98 @@
+"""Unit tests for the shared document session."""
+
+from pypdf import PdfReader
+import pytest
+
+import scraper.file_scraper as file_scraper
+from scraper.tools import document
+from scraper.tools.document import Document, open_document
+
+
+def test_document_caches_page_text(pdf_with_text):
+    doc = Document(pdf_with_text)
+    assert doc.num_pages == 3
+    assert doc.page_text(1) == "Hello Again, World"
+    doc.reader.pages[1].extract_text = None  # would fail if called again
+    assert doc.page_text(1) == "Hello Again, World"
+    assert open_document(doc) is doc
+
+
+def test_file_scraper_parses_pdf_once(pdf_with_text, monkeypatch):
+    opened = []
+
+    def counting_reader(*args, **kwargs):
+        opened.append(args)
+        return PdfReader(*args, **kwargs)
+
+    monkeypatch.setattr(document, "PdfReader", counting_reader)
+    writer = file_scraper.main(pdf_with_text, "World", verbose=False)
+    assert len(writer.pages) == 2
+    assert len(opened) == 1
+
+
+def test_file_is_read_once(pdf_with_text, monkeypatch):
+    import builtins
+
+    opened = []
+    real_open = builtins.open
+    real_read_bytes = document.Path.read_bytes
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == str(pdf_with_text):
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    def counting_read_bytes(path):
+        opened.append(path)
+        return real_read_bytes(path)
+
+    monkeypatch.setattr(builtins, "open", counting_open)
+    monkeypatch.setattr(document.Path, "read_bytes", counting_read_bytes)
+    monkeypatch.setattr(document.ocr_cache, "_digests", {})
+    doc = Document(pdf_with_text)
+    assert doc.page_text(2) == "Hello for the third time"
+    assert doc.digest == document.ocr_cache.file_digest(pdf_with_text)
+    assert len(opened) == 1
+
+
+def test_documents_hold_no_open_files(pdf_with_text):
+    import os
+
+    fd_dir = f"/proc/{os.getpid()}/fd"
+    if not os.path.isdir(fd_dir):
+        pytest.skip("no /proc to count open files")
+    before = len(os.listdir(fd_dir))
+    docs = [Document(pdf_with_text) for _ in range(50)]
+    assert all(doc.num_pages == 3 for doc in docs)
+    assert len(os.listdir(fd_dir)) <= before
+
+
+def test_closed_document_keeps_caches_and_reopens(pdf_with_text):
+    with Document(pdf_with_text) as doc:
+        assert doc.page_text(0) == "Hello World"
+        digest = doc.digest
+    assert doc._reader is None and doc._buffer is None
+    assert doc.page_text(0) == "Hello World"
+    assert doc._reader is None
+    assert doc.digest == digest
+    # the reader comes back when it is needed again
+    assert doc.page_text(1) == "Hello Again, World"
+
+
+def test_render_path_spools_a_local_copy(pdf_with_text, tmp_path, monkeypatch):
+    import pickle
+
+    doc = Document(pdf_with_text)
+    assert doc.render_path == doc.path
+    monkeypatch.setenv("PDF_SPOOL_DIR", str(tmp_path / "spool"))
+    doc = Document(pdf_with_text)
+    spool_path = doc.render_path
+    assert spool_path == tmp_path / "spool" / f"{doc.digest}.pdf"
+    assert spool_path.read_bytes() == pdf_with_text.read_bytes()
+
+    # as sent to an ocr worker process
+    worker_doc = pickle.loads(pickle.dumps(doc))
+    assert worker_doc.path == doc.path
+    assert worker_doc.render_path == spool_path
+    assert worker_doc.digest == doc.digest
+    assert worker_doc.page_text(0) == "Hello World"
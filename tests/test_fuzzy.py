@@ -0,0 +1,99 @@
+"""Unit tests for approximate matching of ocr text."""
+
+import pytest
+
+from scraper.tools import fuzzy
+from scraper.tools import tablelist_utils as tbl
+
+
+def test_normalize_rejoins_broken_lines():
+    text, positions = fuzzy.normalize("Gross Domes-\n  tic\n\nProduct ")
+    assert text == "gross domestic product"
+    assert len(positions) == len(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Table 3. Gross Domestic Product .... 45",
+        "Table 3. Gross Dornestic Pr0duct .... 45",
+        "Table 3. Gross Domes-\ntic Product .... 45",
+        "Table 3. GROSS DOMESTIC\nPRODUCT .... 45",
+    ],
+)
+def test_contains_tolerates_ocr_noise(text):
+    assert fuzzy.contains(text, "Gross Domestic Product")
+
+
+def test_contains_rejects_other_titles():
+    assert not fuzzy.contains("Table 4. Gross National Income .... 46", "Gross Domestic Product")
+    assert not fuzzy.contains("page 4", "page 3")
+
+
+def test_threshold_zero_is_exact_after_normalizing():
+    assert not fuzzy.contains("Gross Dornestic Product", "gross domestic product", threshold=0)
+    assert fuzzy.contains("Gross Domestic\nProduct", "gross domestic product", threshold=0)
+
+
+def test_find_returns_span_in_original_text():
+    text = "Table 1. Prices\nTable 2. Gross Dornestic Product 45\nTable 3. Wages 50"
+    start, end = fuzzy.find(text, "gross domestic product")
+    assert text[start:end] == "Gross Dornestic Product"
+
+
+def test_table_list_page_found_despite_misread():
+    text = "Population 12\nGross Dornestic Pr0duct 45\nPrices 50"
+    assert tbl.get_page_nums_near_query(text, "Gross Domestic Product") == 45
+
+
+@pytest.mark.parametrize(
+    "text,query",
+    [
+        ("3.4 Exports by Country ..... 40", "Imports by Country"),
+        ("3.5 Exports by Commodity ..... 41", "Imports by Commodity"),
+        ("2.1 Male population by age ..... 12", "Female population by age"),
+        ("2.2 Female popu1ation by age ..... 13", "Male population by age"),
+        ("Population in 2023 ..... 14", "Population in 2028"),
+    ],
+)
+def test_contains_rejects_titles_differing_by_a_word(text, query):
+    assert not fuzzy.contains(text, query)
+
+
+def test_exact_hits_are_substrings_as_in_text_pdfs():
+    assert fuzzy.contains("Table 3.4 Exports by Country", "Export")
+    assert fuzzy.contains("Population by age", "Popul")
+
+
+def test_windows_find_what_the_whole_text_search_finds():
+    filler = "".join(f"Table {n}. Prices of goods in region {n} ..... {n}\n" for n in range(40))
+    query = "Gross Domestic Product"
+    norm_query, _ = fuzzy.normalize(query)
+    errors = fuzzy.max_errors(len(norm_query))
+    for title in ["Gross Dornestic Pr0duct", "GROSS DOMES-\nTIC PR0DUCT", "Gr0ss Dornestic Product"]:
+        text = filler + f"Table 200. {title} ..... 45\n" + filler
+        norm_text, positions = fuzzy.normalize(text)
+        _, end = fuzzy._best_end(norm_text, norm_query, errors)
+        assert fuzzy.find(text, query)[1] == positions[end - 1] + 1
+    assert not fuzzy.contains(filler, query)
+
+
+def test_exact_title_on_a_later_list_page_wins(pdf_file_path):
+    from fpdf import FPDF
+    from scraper.tools import toc_store
+    from scraper.tools.document import Document
+
+    pdf = FPDF()
+    for _ in range(120):
+        pdf.add_page()
+    pdf.output(pdf_file_path)
+    doc = Document(pdf_file_path)
+    doc.table_list = toc_store.make_record(2, [
+        "3.4 Exports by Country ..... 40\n3.5 Exports by Commodity ..... 41",
+        "3.6 Imports by Country ..... 90\n3.7 Imports by Commodity ..... 91",
+        "",
+    ])
+    # the body starts on pdf page 5, printed page 1
+    assert tbl.search_table_list(doc, "Imports by Country") == 94
+    assert tbl.search_table_list(doc, "Exports by Country") == 44
+    assert tbl.search_table_list(doc, "Imports by Cornmodity") == 95
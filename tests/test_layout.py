@@ -0,0 +1,43 @@
+"""Unit tests for page layout analysis."""
+from PIL import Image, ImageDraw
+import pytest
+
+from scraper.tools import layout
+
+
+def two_column_page(right_lines=3, left=True):
+    image = Image.new("RGB", (1000, 1400), "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(3):
+        top = 200 + line * 100
+        if left:
+            draw.rectangle((100, top, 420, top + 30), fill="black")
+        if line < right_lines:
+            draw.rectangle((560, top, 900, top + 30), fill="black")
+    return image
+
+
+def test_english_column_and_lines():
+    column = layout.english_column(two_column_page())
+    left, top, right, bottom = column.box
+    assert 0.42 < left < 0.56
+    assert right == pytest.approx(0.9, abs=0.02)
+    assert top == pytest.approx(200 / 1400, abs=0.01)
+    assert bottom == pytest.approx(430 / 1400, abs=0.01)
+    assert len(column.lines) == 3
+    assert column.lines[0][0] == pytest.approx(200 / 1400, abs=0.01)
+
+
+def test_empty_english_column():
+    column = layout.english_column(two_column_page(right_lines=0))
+    assert column.lines == []
+
+
+def test_single_column_page():
+    image = Image.new("RGB", (1000, 1400), "white")
+    ImageDraw.Draw(image).rectangle((100, 200, 900, 230), fill="black")
+    assert layout.english_column(image) is None
+
+
+def test_unrendered_image():
+    assert layout.english_column(object()) is None
@@ -0,0 +1,64 @@
+"""Unit tests for the section-by-section merged pdf writer."""
+
+from io import BytesIO
+
+from fpdf import FPDF
+from pypdf import PdfReader
+
+from scraper.tools import pdf_page_utils as utils
+from scraper.tools.merged_pdf import MergedPdfWriter
+
+
+def make_pages(label, num_pages):
+    pdf = FPDF()
+    for page in range(num_pages):
+        pdf.add_page()
+        pdf.set_font("Times", size=12)
+        pdf.cell(40, 10, f"{label} page {page}")
+    return list(PdfReader(BytesIO(bytes(pdf.output()))).pages)
+
+
+def test_sections_are_written_as_added(tmp_path):
+    output_path = tmp_path / "merged.pdf"
+    with MergedPdfWriter(output_path) as merged:
+        for year in (2000, 2001):
+            merged.add_section([utils.create_page_with_text(f"File: {year}"),
+                                *make_pages(year, 2)])
+            # the section is on disk before the writer is closed
+            assert output_path.stat().st_size > 0
+        assert merged.num_pages == 6
+
+    reader = PdfReader(output_path, strict=True)
+    assert [page.extract_text().split("\n")[0] for page in reader.pages] == [
+        "File: 2000", "2000 page 0", "2000 page 1",
+        "File: 2001", "2001 page 0", "2001 page 1",
+    ]
+
+
+def test_sections_can_be_placed_out_of_order(tmp_path):
+    output_path = tmp_path / "merged.pdf"
+    with MergedPdfWriter(output_path) as merged:
+        merged.add_section(make_pages("second", 1), order=1)
+        merged.add_section(make_pages("first", 2), order=0)
+
+    texts = [page.extract_text() for page in PdfReader(output_path).pages]
+    assert texts == ["first page 0", "first page 1", "second page 0"]
+
+
+def test_empty_output_is_a_valid_pdf(tmp_path):
+    output_path = tmp_path / "merged.pdf"
+    MergedPdfWriter(output_path).close()
+    assert len(PdfReader(output_path).pages) == 0
+
+
+def test_shared_resources_are_renumbered_once(tmp_path):
+    output_path = tmp_path / "merged.pdf"
+    with MergedPdfWriter(output_path) as merged:
+        for year in (2000, 2001):
+            merged.add_section(make_pages(year, 2))
+
+    reader = PdfReader(output_path, strict=True)
+    fonts = [page["/Resources"]["/Font"].raw_get("/F1").idnum for page in reader.pages]
+    # each section's pages share its font, and sections do not share object numbers
+    assert fonts[0] == fonts[1] != fonts[2] == fonts[3]
+    assert all(page["/Parent"] == reader.trailer["/Root"]["/Pages"] for page in reader.pages)
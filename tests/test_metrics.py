@@ -0,0 +1,79 @@
+"""Unit tests for structured metrics."""
+import json
+
+import pytest
+
+from scraper.file_scraper import find_pages
+from scraper.tools import metrics
+from scraper.tools import ocr
+from scraper.tools import raster
+
+
+class DummyImage:
+    def __init__(self, text):
+        self.text = text
+        self.size = (1000, 1000)
+        self.info = {}
+
+
+@pytest.fixture
+def metrics_path(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.jsonl"
+    monkeypatch.setenv("METRICS_PATH", str(path))
+    return path
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_disabled_records_nothing(tmp_path, monkeypatch):
+    monkeypatch.delenv("METRICS_PATH", raising=False)
+    with metrics.scope(file="a.pdf"), metrics.timer("classify"):
+        metrics.count("pages_ocrd")
+    assert not list(tmp_path.iterdir())
+
+
+def test_timers_carry_scope_fields_and_counts_roll_up(metrics_path):
+    with metrics.scope(file="a.pdf"):
+        with metrics.timer("rasterize", pages=3):
+            metrics.count("pages_rendered", 3)
+        with metrics.scope(file="a.pdf"):
+            metrics.count("pages_rendered", 2)
+    records = read_records(metrics_path)
+    assert records[0]["type"] == "timer"
+    assert records[0]["stage"] == "rasterize"
+    assert records[0]["file"] == "a.pdf"
+    assert records[0]["pages"] == 3
+    # the nested scope's counts are written once, with the outermost scope's
+    assert records[1:] == [{"type": "counters", "file": "a.pdf",
+                            "counts": {"pages_rendered": 5},
+                            "pid": records[1]["pid"], "time": records[1]["time"]}]
+
+
+def test_timer_records_errors(metrics_path):
+    with pytest.raises(ValueError):
+        with metrics.timer("table_list"):
+            raise ValueError
+    assert read_records(metrics_path)[0]["error"] == "ValueError"
+
+
+def test_text_search_stages(pdf_with_text, metrics_path, monkeypatch):
+    monkeypatch.delenv("TEXT_INDEX_PATH", raising=False)
+    find_pages(pdf_with_text, ["Again"], verbose=False)
+    stages = [record["stage"] for record in read_records(metrics_path)]
+    assert stages == ["classify", "text_search", "file"]
+
+
+def test_ocr_pages_counted(pdf_with_text, metrics_path, monkeypatch):
+    monkeypatch.delenv("OCR_CACHE_DIR", raising=False)
+    monkeypatch.setattr(raster, "convert_from_path",
+                        lambda pdf_path, dpi, first_page, last_page, grayscale=False:
+                        [DummyImage(f"page {n}") for n in range(first_page - 1, last_page)])
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+    ocr.get_page_nums_from_query_ocr(pdf_with_text, "page 1", 0, 3, workers=1)
+    records = read_records(metrics_path)
+    assert [record["stage"] for record in records if record["type"] == "timer"] == \
+        ["rasterize", "ocr_page", "ocr_page", "ocr_page"]
+    assert records[-1]["counts"] == {"pages_rendered": 3, "pages_ocrd": 3}
+    assert records[-1]["file"] == pdf_with_text.name
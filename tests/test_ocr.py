@@ -1,14 +1,25 @@
 """Unit tests for ocr functionality."""
 
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from pathlib import Path
 from scraper.tools import ocr as ocr
+from scraper.tools import ocr_cache
+from scraper.tools import raster
 
 TESTS_ROOT = Path(__file__).parent.resolve()
 PROJECT_ROOT = TESTS_ROOT.parent
 RESOURCE_ROOT = PROJECT_ROOT / "resources"
 
 
+class DummyImage:
+    def __init__(self, text):
+        self.text = text
+        self.size = (1000, 1000)
+        self.info = {}
+
+
 @pytest.mark.parametrize(
     "pdf,query,expected",
     [
@@ -30,4 +41,213 @@ def test_ocr_single_page_search(pdf, query, expected):
 )
 def test_ocr_multi_page_search(scanned_pdf, query, expected):
     page_nums = ocr.get_page_nums_from_query_ocr(scanned_pdf, query, 0, 3)
-    assert page_nums == expected
\ No newline at end of file
+    assert page_nums == expected
+
+
+def test_parallel_ocr_keeps_document_order(pdf_with_text, tmp_path, monkeypatch):
+    cache = ocr_cache.OcrCache(tmp_path / "cache.sqlite")
+
+    def fake_convert(pdf_path, dpi, first_page, last_page, grayscale=False):
+        return [DummyImage(f"page {n}") for n in range(first_page - 1, last_page)]
+
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert)
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+    # threads stand in for processes so the fakes above apply
+    monkeypatch.setattr(
+        ocr, "ProcessPoolExecutor",
+        lambda max_workers, initializer: ThreadPoolExecutor(max_workers),
+    )
+
+    texts = ocr.get_page_texts(pdf_with_text, 0, 40, cache=cache, workers=4)
+    assert texts == [f"page {n}" for n in range(40)]
+    assert ocr.get_page_nums_from_query_ocr(
+        pdf_with_text, "page 3", 0, 40, cache=cache, workers=4
+    ) == [3] + list(range(30, 40))
+
+
+def test_split_runs_balances_work():
+    assert ocr._split_runs([(0, 9)], workers=4) == [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4),
+                                                    (5, 5), (6, 6), (7, 7), (8, 8), (9, 9)]
+    assert ocr._split_runs([(0, 99), (200, 201)], workers=2) == (
+        [(n, n + 7) for n in range(0, 96, 8)] + [(96, 99), (200, 201)]
+    )
+
+
+@pytest.fixture
+def fake_pages(monkeypatch):
+    """Pages render as "page n" (with "table" on pages 10 and 11); returns rendered page numbers."""
+    rendered = []
+
+    def fake_convert(pdf_path, dpi, first_page, last_page, grayscale=False):
+        rendered.extend(range(first_page - 1, last_page))
+        return [
+            DummyImage(f"page {n}" + (" table" if n in (10, 11) else ""))
+            for n in range(first_page - 1, last_page)
+        ]
+
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert)
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+    return rendered
+
+
+def test_outward_search_stops_after_max_matches(pdf_with_text, fake_pages):
+    page_nums = ocr.get_page_nums_outward(pdf_with_text, "table", 10, 5, 16, max_matches=2)
+    assert page_nums == [10, 11]
+    # predicted page, then the pages either side of it
+    assert fake_pages == [10, 9, 11]
+
+
+def test_outward_search_without_limit_reads_window(pdf_with_text, fake_pages):
+    page_texts = {}
+    page_nums = ocr.get_page_nums_outward(pdf_with_text, "table", 10, 5, 16,
+                                          page_texts=page_texts)
+    assert page_nums == [10, 11]
+    assert sorted(page_texts) == list(range(5, 16))
+
+
+def test_search_until_reads_runs_of_pages(pdf_with_text, fake_pages, monkeypatch):
+    # room for 4 rendered A4 pages at a time
+    monkeypatch.setenv("RASTER_MAX_MB", "50")
+    assert raster.pages_per_chunk(pdf_with_text) == 4
+    page_nums = ocr.get_page_nums_until(pdf_with_text, "table", 0, 30, max_matches=2)
+    assert page_nums == [10, 11]
+    # three runs of 4 pages, the last holding both matches
+    assert fake_pages == list(range(0, 12))
+
+
+def test_search_until_follows_matches(pdf_with_text, fake_pages, monkeypatch):
+    # room for 11 pages at a time
+    monkeypatch.setenv("RASTER_MAX_MB", "130")
+    page_nums = ocr.get_page_nums_until(pdf_with_text, "table", 0, 30, max_matches=2)
+    assert page_nums == [10, 11]
+    # the page after the match ending the first run is read on its own, and the
+    # search stops there
+    assert fake_pages == list(range(0, 12))
+
+
+def test_neighbouring_table_is_not_a_match(pdf_with_text, monkeypatch):
+    titles = {9: "3.4 Exports by Country", 10: "3.4 Exports by Country (cont.)",
+              12: "3.5 Imports by Country"}
+
+    def fake_convert(pdf_path, dpi, first_page, last_page, grayscale=False):
+        return [DummyImage(titles.get(n, f"page {n}")) for n in range(first_page - 1, last_page)]
+
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert)
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+    page_nums = ocr.get_page_nums_outward(pdf_with_text, "Imports by Country", 10, 5, 16,
+                                          max_matches=1)
+    assert page_nums == [12]
+
+
+def test_might_contain_tolerates_misreads():
+    assert ocr.might_contain("Gross Dornestic Pr0duct", "gross domestic product")
+    assert ocr.might_contain("GROSS-DOMESTIC\nPRODUCT", "gross domestic product")
+    assert not ocr.might_contain("Population by age", "gross domestic product")
+
+
+@pytest.fixture
+def staged_pages(monkeypatch):
+    """Low dpi renders come out with misread characters; returns the (dpi, page) renders."""
+    rendered = []
+    texts = {2: "Table 3. Gross Domestic Product", 3: "Gross Domestic Product (cont.)",
+             7: "Population by age", 8: "Prices of goods"}
+
+    def fake_convert(pdf_path, dpi, first_page, last_page, grayscale=False):
+        images = []
+        for n in range(first_page - 1, last_page):
+            rendered.append((dpi, n))
+            page_text = texts.get(n, f"page {n}")
+            if dpi < raster.DEFAULT_DPI:
+                page_text = page_text.replace("o", "0").replace("m", "rn")
+            images.append(DummyImage(page_text))
+        return images
+
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert)
+    monkeypatch.setattr("pytesseract.image_to_string",
+                        lambda image, lang=None, config=None: image.text)
+    return rendered
+
+
+@pytest.mark.parametrize("query", ["domestic product", "population", "prices", "page 5", "cat"])
+def test_two_stage_matches_single_stage(pdf_with_text, staged_pages, query):
+    single = ocr.get_page_nums_from_query_ocr(pdf_with_text, query, 0, 10, two_stage=False)
+    two_stage = ocr.get_page_nums_from_query_ocr(pdf_with_text, query, 0, 10, two_stage=True)
+    assert two_stage == single
+
+
+def test_two_stage_confirms_only_survivors(pdf_with_text, staged_pages):
+    page_nums = ocr.get_page_nums_from_query_ocr(pdf_with_text, "domestic product", 0, 10,
+                                                 two_stage=True)
+    assert page_nums == [2, 3]
+    assert [n for dpi, n in staged_pages if dpi == raster.DEFAULT_DPI] == [2, 3]
+    assert len([n for dpi, n in staged_pages if dpi < raster.DEFAULT_DPI]) == 10
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_screened_pages_are_not_screened_again(pdf_with_text, staged_pages, thread_pools,
+                                               workers):
+    from scraper.tools import budget as budgets
+    from scraper.tools.document import Document
+
+    doc = Document(pdf_with_text)
+    page_texts = {}
+    budget = budgets.Budget()
+    for query in ["domestic product", "population"]:
+        ocr.get_page_nums_until(doc, query, 0, 10, page_texts=page_texts, two_stage=True,
+                                workers=workers, budget=budget)
+    # each page is screened and charged once; only the survivors are read in full
+    assert sorted(n for dpi, n in staged_pages if dpi < raster.DEFAULT_DPI) == list(range(10))
+    assert sorted(n for dpi, n in staged_pages if dpi == raster.DEFAULT_DPI) == [2, 3, 7]
+    assert budget.pages_used == 10
+
+
+@pytest.mark.parametrize("query", ["this", "hello"])
+def test_two_stage_matches_single_stage_scanned(scanned_pdf, query):
+    assert ocr.get_page_nums_from_query_ocr(scanned_pdf, query, 0, 3, two_stage=True) == (
+        ocr.get_page_nums_from_query_ocr(scanned_pdf, query, 0, 3, two_stage=False)
+    )
+
+
+def test_budget_stops_search_with_partial_results(pdf_with_text, fake_pages):
+    from scraper.tools import budget as budgets
+
+    budget = budgets.Budget(max_pages=11)
+    page_nums = ocr.get_page_nums_until(pdf_with_text, "table", 0, 30, budget=budget)
+    # pages 0-10 fit in the budget: the match on 10 is kept, 11 is never read
+    assert page_nums == [10]
+    assert fake_pages == list(range(0, 11))
+    assert budget.stopped
+
+
+@pytest.fixture
+def thread_pools(monkeypatch):
+    """Threads stand in for worker processes (so fakes apply); returns the pools made."""
+    pools = []
+
+    def make_pool(max_workers, initializer):
+        pools.append(ThreadPoolExecutor(max_workers))
+        return pools[-1]
+
+    monkeypatch.setattr(ocr, "ProcessPoolExecutor", make_pool)
+    return pools
+
+
+def test_concurrent_search_uses_one_pool(pdf_with_text, fake_pages, thread_pools):
+    page_nums = ocr.get_page_nums_until(pdf_with_text, "table", 0, 64, max_matches=2,
+                                        workers=8)
+    assert page_nums == [10, 11]
+    assert len(thread_pools) == 1
+    # no page is read twice, and the search stops before the end of the range
+    assert len(fake_pages) == len(set(fake_pages)) < 64
+
+
+def test_concurrent_search_keeps_to_budget(pdf_with_text, fake_pages, thread_pools):
+    from scraper.tools import budget as budgets
+
+    budget = budgets.Budget(max_pages=11)
+    page_nums = ocr.get_page_nums_until(pdf_with_text, "table", 0, 30, budget=budget,
+                                        workers=4)
+    assert page_nums == [10]
+    assert sorted(fake_pages) == list(range(0, 11))
+    assert budget.pages_used == 11
+    assert budget.stopped
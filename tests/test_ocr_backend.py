@@ -0,0 +1,82 @@
+"""Unit tests for the ocr engines."""
+import threading
+
+import pytest
+
+from scraper.tools import ocr
+from scraper.tools import ocr_backend
+
+
+class FakeApi:
+    started = []
+
+    def __init__(self, lang, psm):
+        self.lang = lang
+        self.psm = psm
+        self.variables = {}
+        self.image = None
+        FakeApi.started.append((lang, psm))
+
+    def SetVariable(self, name, value):
+        self.variables[name] = value
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self):
+        return f"{self.image} read as {self.lang}"
+
+    def End(self):
+        pass
+
+
+class FakeTesserocr:
+    PyTessBaseAPI = FakeApi
+
+
+@pytest.fixture
+def fake_tesserocr(monkeypatch):
+    FakeApi.started = []
+    monkeypatch.setattr(ocr_backend, "tesserocr", FakeTesserocr)
+    monkeypatch.setattr(ocr_backend, "_backends", {})
+    return FakeApi.started
+
+
+def test_engines_are_reused_per_language_and_mode(fake_tesserocr):
+    backend = ocr_backend.TesserocrBackend()
+    assert backend.image_to_string("page 1", "kor+eng") == "page 1 read as kor+eng"
+    assert backend.image_to_string("page 2", "kor+eng") == "page 2 read as kor+eng"
+    backend.image_to_string("page 3")
+    backend.image_to_string("page 4", config="--psm 6")
+    backend.image_to_string("page 5", config="--psm 6")
+    assert fake_tesserocr == [("kor+eng", 3), ("eng", 3), ("eng", 6)]
+
+
+def test_engines_are_not_shared_between_threads(fake_tesserocr):
+    backend = ocr_backend.TesserocrBackend()
+    backend.image_to_string("page 1")
+    thread = threading.Thread(target=backend.image_to_string, args=("page 2",))
+    thread.start()
+    thread.join()
+    assert fake_tesserocr == [("eng", 3), ("eng", 3)]
+
+
+def test_config_variables_are_set():
+    assert ocr_backend._parse_config("--psm 6 -c tessedit_char_whitelist=0123456789") == \
+        (6, (("tessedit_char_whitelist", "0123456789"),))
+    assert ocr_backend._parse_config(None) == (ocr_backend.DEFAULT_PSM, ())
+
+
+def test_backend_choice(fake_tesserocr, monkeypatch):
+    monkeypatch.setenv("OCR_BACKEND", "auto")
+    assert ocr_backend.get_backend().name == "tesserocr"
+    monkeypatch.setattr(ocr_backend, "tesserocr", None)
+    assert ocr_backend.get_backend().name == "subprocess"
+    monkeypatch.setenv("OCR_BACKEND", "tesseract-cli")
+    with pytest.raises(ValueError):
+        ocr_backend.get_backend()
+
+
+def test_ocr_image_uses_backend(fake_tesserocr, monkeypatch):
+    monkeypatch.setenv("OCR_BACKEND", "tesserocr")
+    assert ocr.ocr_image("page 1", lang="eng")["text"] == "page 1 read as eng"
@@ -0,0 +1,87 @@
+"""Unit tests for the persistent ocr cache."""
+
+import pytest
+
+from scraper.tools import ocr
+from scraper.tools import ocr_cache
+from scraper.tools import raster
+
+
+class DummyImage:
+    def __init__(self, text):
+        self.text = text
+        self.size = (1000, 1000)
+        self.info = {}
+
+    def crop(self, box):
+        return self
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    return ocr_cache.OcrCache(tmp_path / "cache.sqlite")
+
+
+def test_cache_roundtrip_and_key_separation(cache):
+    cache.put("abc", 3, 200, "eng", None, "page text", {"text": ["page"]})
+    assert cache.get("abc", 3, 200, None, None) == {
+        "text": "page text", "data": {"text": ["page"]}
+    }
+    assert cache.get("abc", 3, 300, "eng", None) is None
+    assert cache.get("abc", 3, 200, "kor+eng", None) is None
+    assert cache.get("abc", 3, 200, "eng", (0.5, 0, 1, 1)) is None
+    assert cache.get("def", 3, 200, "eng", None) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ocr_cache.OcrCache(tmp_path / "cache.sqlite", max_bytes=25)
+    cache.put("abc", 0, 200, None, None, "a" * 10)
+    cache.put("abc", 1, 200, None, None, "b" * 10)
+    cache.get("abc", 0, 200, None, None)
+    cache.put("abc", 2, 200, None, None, "c" * 10)
+    assert cache.get("abc", 1, 200, None, None) is None
+    assert cache.get("abc", 0, 200, None, None)["text"] == "a" * 10
+    assert cache.get("abc", 2, 200, None, None)["text"] == "c" * 10
+
+
+def test_hits_are_written_in_batches(cache):
+    def last_used(page_num):
+        return cache.conn.execute(
+            "SELECT last_used FROM pages WHERE page=?", (page_num,)
+        ).fetchone()[0]
+
+    cache.put("abc", 0, 200, None, None, "a" * 10)
+    stored = last_used(0)
+    cache.get("abc", 0, 200, None, None)
+    assert last_used(0) == stored
+    cache.flush()
+    assert last_used(0) > stored
+
+
+def test_running_total_follows_puts(tmp_path):
+    cache = ocr_cache.OcrCache(tmp_path / "cache.sqlite", max_bytes=25)
+    cache.put("abc", 0, 200, None, None, "a" * 10)
+    cache.put("abc", 0, 200, None, None, "a" * 5)
+    cache.put("abc", 1, 200, None, None, "b" * 10)
+    assert cache._total == cache.total_bytes() == 15
+    cache.put("abc", 2, 200, None, None, "c" * 15)
+    assert cache._total == cache.total_bytes() == 25
+
+
+def test_warm_cache_skips_rendering(pdf_with_text, cache, monkeypatch):
+    rendered = []
+
+    def fake_convert(pdf_path, dpi, first_page, last_page, grayscale=False):
+        rendered.append((first_page, last_page))
+        return [DummyImage(f"page {n}") for n in range(first_page - 1, last_page)]
+
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert)
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+
+    assert ocr.get_page_nums_from_query_ocr(pdf_with_text, "page 1", 0, 3, cache=cache) == [1]
+    assert rendered == [(1, 3)]
+
+    # a wider window only renders the pages that were not read before
+    assert ocr.get_page_texts(pdf_with_text, 0, 3, cache=cache) == ["page 0", "page 1", "page 2"]
+    assert rendered == [(1, 3)]
+
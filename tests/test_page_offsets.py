@@ -0,0 +1,95 @@
+"""Unit tests for learned printed-page offsets."""
+
+from fpdf import FPDF
+import pytest
+
+from scraper.tools import page_offsets
+from scraper.tools import pdf_page_utils
+from scraper.tools.document import Document
+
+
+@pytest.fixture
+def long_pdf(pdf_file_path):
+    """A blank 100 page pdf."""
+    pdf = FPDF()
+    for _ in range(100):
+        pdf.add_page()
+    pdf.output(pdf_file_path)
+    return pdf_file_path
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("Population by Age\n1990  1234  5678\n\n- 23 -\n", 23),
+        ("41\nTable 3.2 Prices\n12 13 14\n", 41),
+        ("Table 3.2 Prices\n12 13 14\nTotal 99 100\n", None),
+        ("", None),
+    ],
+)
+def test_find_folio(text, expected):
+    assert page_offsets.find_folio(text) == expected
+
+
+def test_fit_segments_handles_inserts_and_misreads():
+    folios = {
+        20: 11, 21: 12, 22: 13,
+        23: 74,            # misread folio
+        24: 15, 25: 16,
+        # a two-page plate is inserted before pdf page 40
+        42: 31, 43: 32,
+    }
+    assert page_offsets.fit_segments(folios) == [
+        {"start": 20, "offset": 9, "count": 5},
+        {"start": 42, "offset": 11, "count": 2},
+    ]
+
+
+def test_predict_uses_learned_offsets(long_pdf):
+    doc = Document(long_pdf)
+    # nothing observed yet: fall back to the table list formula
+    assert page_offsets.predict(doc, 12, default_offset=7) == (19, False)
+
+    page_offsets.observe(doc, {20: "11", 21: "header\n12", 22: "13", 42: "31"})
+    assert page_offsets.predict(doc, 12, default_offset=7) == (21, True)
+    # only one observation after the insert: not trusted yet
+    assert page_offsets.predict(doc, 33, default_offset=7) == (40, False)
+    assert page_offsets.is_calibrated(doc, 21)
+    assert not page_offsets.is_calibrated(doc, 44)
+
+
+def test_observations_persist(long_pdf, tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "cache"))
+    page_offsets.observe(Document(long_pdf), {20: "11", 21: "12"})
+    assert page_offsets.predict(Document(long_pdf), 15, 0) == (24, True)
+
+
+def test_year_heading_is_not_a_folio(long_pdf, tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "cache"))
+    doc = Document(long_pdf)
+    page_offsets.observe(doc, {60: "2023\nPopulation by Age\n1 2 3"})
+    assert doc.folios == {}
+    assert page_offsets.predict(Document(long_pdf), 30, default_offset=4) == (34, False)
+
+
+def test_single_observation_keeps_default_offset(long_pdf):
+    doc = Document(long_pdf)
+    page_offsets.observe(doc, {60: "12"})
+    assert page_offsets.predict(doc, 30, default_offset=4) == (34, False)
+    assert not page_offsets.is_calibrated(doc, 34)
+
+
+def test_implausible_stored_folios_are_ignored(long_pdf):
+    doc = Document(long_pdf)
+    doc.folios = {60: 2023, 61: 2024, 62: 95}
+    assert page_offsets.predict(doc, 30, default_offset=4) == (34, False)
+
+
+def test_predictions_stay_within_the_pdf(long_pdf):
+    doc = Document(long_pdf)
+    page_offsets.observe(doc, {10: "9", 11: "10"})
+    page_num, calibrated = page_offsets.predict(doc, 500, default_offset=4)
+    assert (page_num, calibrated) == (99, True)
+    assert page_offsets.predict(Document(long_pdf), 1, default_offset=-30) == (0, False)
+    start, end = pdf_page_utils.get_page_nums_near(doc, page_num, 5)
+    assert start < end
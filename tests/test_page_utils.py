@@ -27,4 +27,8 @@ def test_get_pages_from_nums_texts(pdf_with_text, indices, expected_texts):
 
 def test_get_pages_from_nums_invalid_index(pdf_with_text):
     with pytest.raises((IndexError, ValueError)):
-        utils.get_pages_from_nums(pdf_with_text, [10])
\ No newline at end of file
+        utils.get_pages_from_nums(pdf_with_text, [10])
+
+def test_create_page_with_text_in_memory():
+    page = utils.create_page_with_text("File: 2000_test\nQuery: GDP")
+    assert page.extract_text().split("\n") == ["File: 2000_test", "Query: GDP"]
@@ -0,0 +1,47 @@
+"""Unit tests for memory-bounded page rendering."""
+
+from scraper.tools import raster
+
+
+class DummyImage:
+    def __init__(self, page_num):
+        self.page_num = page_num
+        self.info = {}
+
+
+def fake_convert_factory(calls):
+    def fake_convert(pdf_path, dpi, first_page, last_page, grayscale=False):
+        calls.append((first_page, last_page))
+        return [DummyImage(n) for n in range(first_page - 1, last_page)]
+    return fake_convert
+
+
+def test_pages_per_chunk_fits_budget(pdf_with_text):
+    # fpdf's default A4 page at 100 dpi is roughly 827 x 1169 pixels
+    page_bytes = 827 * 1169 * raster.BYTES_PER_PIXEL
+    assert raster.pages_per_chunk(pdf_with_text, 100, max_bytes=page_bytes * 2) == 2
+    assert raster.pages_per_chunk(pdf_with_text, 100, max_bytes=1) == 1
+
+
+def test_iter_page_images_renders_in_chunks(pdf_with_text, monkeypatch):
+    calls = []
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert_factory(calls))
+    monkeypatch.setattr(raster, "pages_per_chunk", lambda *args: 2)
+    pages = [(page_num, image.page_num)
+             for page_num, image in raster.iter_page_images(pdf_with_text, 1, 6)]
+    assert pages == [(n, n) for n in range(1, 6)]
+    assert calls == [(2, 3), (4, 5), (6, 6)]
+
+
+def test_page_images_render_on_access(pdf_with_text, monkeypatch):
+    calls = []
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert_factory(calls))
+    images = raster.PageImages(pdf_with_text, 0, 25, chunk_size=1)
+    # bounded by the length of the pdf
+    assert len(images) == 3
+    assert calls == []
+    assert images[1].page_num == 1
+    assert images[1].page_num == 1
+    assert calls == [(2, 2)]
+    assert [image.page_num for image in images] == [0, 1, 2]
+    assert calls == [(2, 2), (1, 1), (2, 2), (3, 3)]
@@ -0,0 +1,103 @@
+"""Unit tests for the scrape job service."""
+import json
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from scraper import service as scrape_service
+
+
+@pytest.fixture
+def service(tmp_path, pdf_with_text):
+    service = scrape_service.ScrapeService(tmp_path / "jobs", pdf_with_text.parent,
+                                           workers=1)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def base_url(service):
+    server = scrape_service.make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def wait(job, timeout=30):
+    deadline = time.time() + timeout
+    while job.status in ("queued", "running"):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    return job
+
+
+def test_file_job(service, pdf_with_text, monkeypatch):
+    monkeypatch.delenv("TEXT_INDEX_PATH", raising=False)
+    job = wait(service.submit(pdf_with_text.name, ["Again", "missing"]))
+    assert job.status == "done", job.error
+    assert job.report == [
+        {"file": pdf_with_text.stem, "query": "Again", "status": "1 matches", "pages": [2]},
+        {"file": pdf_with_text.stem, "query": "missing", "status": "no matches", "pages": []},
+    ]
+    assert f"Again-scraped-{pdf_with_text.stem}.pdf" in job.outputs
+    assert service.output_path(job, job.outputs[0]).exists()
+    assert service.output_path(job, "../secrets") is None
+
+
+def test_queries_do_not_name_files_outside_the_job(service, pdf_with_text, monkeypatch):
+    monkeypatch.delenv("TEXT_INDEX_PATH", raising=False)
+    job = wait(service.submit(pdf_with_text.name, ["Again/World", "../../Again"]))
+    assert job.status == "done", job.error
+    assert f"Again_World-scraped-{pdf_with_text.stem}.pdf" in job.outputs
+    assert f"_.._Again-scraped-{pdf_with_text.stem}.pdf" in job.outputs
+
+
+def test_old_jobs_are_forgotten(tmp_path, pdf_with_text, monkeypatch):
+    monkeypatch.delenv("TEXT_INDEX_PATH", raising=False)
+    service = scrape_service.ScrapeService(tmp_path / "jobs", pdf_with_text.parent,
+                                           workers=1, max_jobs=1)
+    try:
+        first = wait(service.submit(pdf_with_text.name, ["Again"]))
+        second = wait(service.submit(pdf_with_text.name, ["Again"]))
+    finally:
+        service.close()
+    assert service.jobs() == [second]
+    assert not (tmp_path / "jobs" / first.id).exists()
+
+
+def test_rejects_bad_jobs(service):
+    with pytest.raises(ValueError):
+        service.submit("no-such.pdf", ["Again"])
+    with pytest.raises(ValueError):
+        service.submit(".", [])
+
+
+def test_http_job_and_download(base_url, service, pdf_with_text, monkeypatch):
+    monkeypatch.delenv("TEXT_INDEX_PATH", raising=False)
+    body = json.dumps({"path": str(pdf_with_text.parent), "queries": ["Again"]}).encode()
+    with urlopen(Request(f"{base_url}/jobs", data=body, method="POST")) as response:
+        assert response.status == 202
+        job_id = json.load(response)["id"]
+    wait(service.get(job_id))
+
+    with urlopen(f"{base_url}/jobs/{job_id}") as response:
+        job = json.load(response)
+    assert job["status"] == "done"
+    assert job["report"][0]["pages"] == [2]
+    report_name = next(name for name in job["outputs"] if name.endswith(".csv"))
+    with urlopen(f"{base_url}/jobs/{job_id}/files/{report_name}") as response:
+        assert response.read().decode().startswith("file,query,status,pages")
+    with urlopen(f"{base_url}/jobs") as response:
+        assert [job["id"] for job in json.load(response)] == [job_id]
+
+    with pytest.raises(HTTPError) as error:
+        urlopen(f"{base_url}/jobs/{job_id}/files/missing.pdf")
+    assert error.value.code == 404
+    with pytest.raises(HTTPError) as error:
+        urlopen(Request(f"{base_url}/jobs", data=b'{"path": "x.pdf"}', method="POST"))
+    assert error.value.code == 400
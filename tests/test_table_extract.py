@@ -0,0 +1,194 @@
+"""Unit tests for table extraction."""
+import csv
+import math
+
+from fpdf import FPDF
+
+from scraper import directory_scraper
+from scraper.tools import table_extract
+from scraper.tools.document import Document
+
+
+def table_pdf(pdf_path):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Courier", size=10)
+    lines = [
+        "Table 6.1 Exports by Region",
+        "",
+        "Year     Seoul     Busan",
+        "2000     1,234       (56)",
+        "2001        -        789",
+    ]
+    for idx, line in enumerate(lines):
+        pdf.text(10, 20 + idx * 6, line)
+    pdf.add_page()
+    pdf.text(10, 20, "Notes and sources")
+    pdf.output(str(pdf_path))
+    return pdf_path
+
+
+def test_extract_text_layer_table(pdf_file_path):
+    tables = table_extract.extract_tables(table_pdf(pdf_file_path), [0, 1])
+    # the notes page holds no table
+    assert len(tables) == 1
+    table = tables[0]
+    assert table.title.startswith("Table 6.1 Exports by Region")
+    assert table.rows == [["2000", "1,234", "(56)"], ["2001", "-", "789"]]
+    assert list(table.columns[0]) == [2000, 2001]
+    assert table.columns[1][0] == 1234 and math.isnan(table.columns[1][1])
+    assert list(table.columns[2]) == [-56, 789]
+
+
+def test_ocr_word_boxes():
+    data = {
+        "text": ["Table", "1.1", "Exports", "", "2000", "1,234", "(56)", "Gross", "Total", "△7"],
+        "left": [10, 60, 90, 0, 10, 200, 400, 10, 60, 400],
+        "top": [5, 5, 5, 0, 50, 52, 50, 100, 100, 101],
+        "width": [45, 25, 60, 0, 40, 60, 40, 45, 40, 30],
+        "height": [20] * 10,
+        "conf": [90, 90, 90, -1, 90, 90, 90, 90, 90, 90],
+    }
+    title, rows = table_extract.table_rows(table_extract.ocr_words(data))
+    assert title == "Table 1.1 Exports"
+    assert rows == [["2000", "1,234", "(56)"], ["Gross Total", "", "△7"]]
+    columns = table_extract.parse_columns(rows)
+    assert columns[0] == ["2000", "Gross Total"]
+    assert list(columns[2]) == [-56, -7]
+
+
+def test_unbalanced_parentheses_are_not_numbers():
+    columns = table_extract.parse_columns([["2000", "(12)"], ["2001", "(12"], ["2002", "12)"]])
+    assert list(columns[0]) == [2000, 2001, 2002]
+    assert columns[1] == ["(12)", "(12", "12)"]
+    assert list(table_extract.parse_columns([["(12)"], ["3"]])[0]) == [-12, 3]
+
+
+def test_stacked_table(tmp_path, monkeypatch):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    docs = {}
+    for year in (2000, 2001):
+        pdf_path = table_pdf(input_dir / f"{year}_yearbook.pdf")
+        docs[pdf_path] = Document(pdf_path)
+    found = {pdf_path: {"Exports": [0]} for pdf_path in docs}
+    directory_scraper.write_outputs(tmp_path, "input", docs, ["Exports"], found,
+                                    extract=True)
+
+    assert (tmp_path / "Exports-tables-input" / "2000_yearbook.csv").exists()
+    with open(tmp_path / "Exports-table-input.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["file", "page", "title", "column_1", "column_2", "column_3"]
+    assert [row[0] for row in rows[1:]] == ["2000_yearbook"] * 2 + ["2001_yearbook"] * 2
+    assert rows[1][3:] == ["2000", "1234", "-56"]
+    assert rows[2][3:] == ["2001", "", "789"]
+
+
+def test_single_query_run_writes_tables(tmp_path, monkeypatch):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    table_pdf(input_dir / "2000_yearbook.pdf")
+    monkeypatch.setenv("INPUT_DIR", str(input_dir))
+    monkeypatch.setenv("OUTPUT_DIR", str(output_dir))
+    monkeypatch.setenv("EXTRACT_TABLES", "yes")
+    monkeypatch.setattr(directory_scraper, "find_pages",
+                        lambda doc, queries, verbose, fallback=None, budget=None:
+                        {query: [0] for query in queries})
+
+    directory_scraper.main("Exports", verbose=False)
+
+    assert (output_dir / "Exports-scraped-input.pdf").exists()
+    assert (output_dir / "Exports-tables-input" / "2000_yearbook.csv").exists()
+    with open(output_dir / "Exports-table-input.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[1][3:] == ["2000", "1234", "-56"]
+
+
+def word_data(lines):
+    """image_to_data dict of one paragraph, a line per string with cells set two spaces apart."""
+    data = {key: [] for key in ("text", "left", "top", "width", "height", "conf",
+                                "block_num", "par_num", "line_num")}
+    for line_num, line in enumerate(lines):
+        for cell_num, cell in enumerate(line.split("  ")):
+            for word_num, word in enumerate(cell.split()):
+                for key, value in (("text", word), ("left", 10 + 300 * cell_num + 70 * word_num),
+                                   ("top", 10 + 30 * line_num), ("width", 60), ("height", 20),
+                                   ("conf", 90), ("block_num", 1), ("par_num", 1),
+                                   ("line_num", line_num + 1)):
+                    data[key].append(value)
+    return data
+
+
+class DummyImage:
+    def __init__(self, lines):
+        self.lines = lines
+        self.size = (1000, 1000)
+        self.info = {}
+
+
+def test_text_pages_are_not_extracted_again(pdf_file_path, monkeypatch):
+    from pypdf import PageObject
+
+    doc = Document(table_pdf(pdf_file_path))
+    assert "Exports" in doc.page_text(0)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("page text should come from the search")
+
+    monkeypatch.setattr(PageObject, "extract_text", fail)
+    assert len(table_extract.extract_tables(doc, [0])) == 1
+
+
+def test_scanned_pages_reuse_the_search_boxes(pdf_with_text, monkeypatch):
+    from scraper.tools import ocr, raster
+
+    pages = {0: ["Table 6.1 Imports"], 1: ["Table 6.2 Exports by Region", "2000  1,234  (56)"],
+             2: ["Notes"]}
+    rendered = []
+
+    def fake_convert(pdf_path, dpi, first_page, last_page, grayscale=False):
+        rendered.extend(range(first_page - 1, last_page))
+        return [DummyImage(pages[n]) for n in range(first_page - 1, last_page)]
+
+    monkeypatch.setenv("EXTRACT_TABLES", "1")
+    monkeypatch.delenv("OCR_CACHE_DIR", raising=False)
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert)
+    monkeypatch.setattr("pytesseract.image_to_data",
+                        lambda image, lang=None, output_type=None: word_data(image.lines))
+    doc = Document(pdf_with_text)
+    # a scanned copy: no text layer
+    doc._page_texts = {0: "", 1: "", 2: ""}
+    page_nums = ocr.get_page_nums_outward(doc, "Exports by Region", 1, 0, 3)
+    assert page_nums == [1]
+    searched = list(rendered)
+
+    tables = table_extract.extract_tables(doc, page_nums)
+    assert rendered == searched
+    assert tables[0].title == "Table 6.2 Exports by Region"
+    assert tables[0].rows == [["2000", "1,234", "(56)"]]
+
+
+def test_unchanged_yearbooks_keep_their_tables(tmp_path, monkeypatch):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    docs = {}
+    for year in (2000, 2001):
+        pdf_path = table_pdf(input_dir / f"{year}_yearbook.pdf")
+        docs[pdf_path] = Document(pdf_path)
+    found = {pdf_path: {"Exports": [0]} for pdf_path in docs}
+    directory_scraper.write_outputs(tmp_path, "input", docs, ["Exports"], found,
+                                    extract=True)
+    stacked = (tmp_path / "Exports-table-input.csv").read_text()
+
+    extracted = []
+    extract_tables = table_extract.extract_tables
+    monkeypatch.setattr(table_extract, "extract_tables",
+                        lambda doc, page_nums: extracted.append(doc) or
+                        extract_tables(doc, page_nums))
+    fresh = {next(iter(docs))}
+    directory_scraper.write_outputs(tmp_path, "input", docs, ["Exports"], found,
+                                    extract=True, fresh=fresh)
+    assert extracted == [docs[next(iter(docs))]]
+    assert (tmp_path / "Exports-table-input.csv").read_text() == stacked
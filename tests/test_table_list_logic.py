@@ -69,7 +69,7 @@ def test_get_english_table_list_stops_after_xx(monkeypatch):
     ]
 
 
-def test_search_table_list_found_full_page(monkeypatch):
+def test_search_table_list_found_full_page(pdf_with_text, monkeypatch):
     # Simulate a table list as a single full-page string
     table_list_text = (
         "Table 1.1 Population ............ 23\n"
@@ -80,5 +80,95 @@ def test_search_table_list_found_full_page(monkeypatch):
     monkeypatch.setattr(tbl, "get_table_list_start_page", lambda images: 0)
     monkeypatch.setattr(tbl, "get_english_table_list", lambda images, start: [table_list_text])
     monkeypatch.setattr(tbl, "get_page_nums_near_query", lambda text, query: 2020 if query == "GDP" else 23 if query == "Population" else 45 if query == "Unemployment" else None)
-    result = tbl.search_table_list("dummy.pdf", "GDP")
-    assert result is not None  # or assert result == expected_page_number
\ No newline at end of file
+    result = tbl.search_table_list(pdf_with_text, "GDP")
+    assert result is not None  # or assert result == expected_page_number
+
+def test_table_list_renders_only_pages_read(tmp_path, monkeypatch):
+    from fpdf import FPDF
+    from scraper.tools import raster
+
+    pdf_path = tmp_path / "yearbook.pdf"
+    pdf = FPDF()
+    for _ in range(25):
+        pdf.add_page()
+    pdf.output(str(pdf_path))
+
+    page_texts = ["cover", "preface", "List of Tables", "Table 1.1 GDP 3", "XX Prices 9",
+                  "body"] + ["body"] * 19
+    rendered = []
+
+    def fake_convert(pdf_path, dpi, first_page, last_page):
+        rendered.extend(range(first_page - 1, last_page))
+        return [DummyImage(page_texts[n]) for n in range(first_page - 1, last_page)]
+
+    monkeypatch.setattr(raster, "convert_from_path", fake_convert)
+    monkeypatch.setattr("pytesseract.image_to_string", dummy_image_to_string)
+    assert tbl.search_table_list(pdf_path, "GDP") == 2 + 4 + (3 - 1)
+    assert sorted(set(rendered)) == [0, 1, 2, 3, 4, 5]
+
+
+def two_column_page(label):
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (1000, 1400), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 200, 420, 230), fill="black")
+    draw.rectangle((560, 200, 900, 230), fill="black")
+    image.info["label"] = label
+    return image
+
+
+def test_get_english_table_list_stops_at_korean_body(monkeypatch):
+    from scraper.tools import ocr
+
+    images = [two_column_page(label) for label in ("cover", "list 1", "list 2", "body",
+                                                   "body 2")]
+    read = []
+
+    def fake_ocr(image, box=None):
+        read.append(image.info["label"])
+        assert box is not None and box[0] > 0.4
+        return image.info["label"]
+
+    monkeypatch.setattr(tbl, "ocr_right_column", fake_ocr)
+    monkeypatch.setattr(ocr, "detect_script",
+                        lambda image, crop=None: "Hangul" if "body" in image.info["label"]
+                        else "Latin")
+    result = tbl.get_english_table_list(images, start_page=1)
+    # the body page keeps its place in the list but is not read
+    assert result == ["list 1", "list 2", ""]
+    assert read == ["list 1", "list 2"]
+
+
+def test_cached_english_columns_are_not_rendered(tmp_path, monkeypatch):
+    from fpdf import FPDF
+    from scraper.tools import ocr, raster
+
+    pdf_path = tmp_path / "yearbook.pdf"
+    pdf = FPDF()
+    for _ in range(5):
+        pdf.add_page()
+    pdf.output(str(pdf_path))
+    labels = ["list 1", "list 2", "body", "body 2", "body 3"]
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(raster, "convert_from_path",
+                        lambda pdf_path, dpi, first_page, last_page, grayscale=False: [
+                            two_column_page(labels[n]) for n in range(first_page - 1, last_page)
+                        ])
+    # lazy pages are rendered to read them
+    monkeypatch.setattr(tbl, "ocr_right_column",
+                        lambda image, box=None: image.render().info["label"])
+    monkeypatch.setattr(ocr, "detect_script",
+                        lambda image, crop=None: "Hangul" if "body" in image.render().info["label"]
+                        else "Latin")
+    images = raster.lazy_page_images(pdf_path, 0, 5)
+    assert tbl.get_english_table_list(images, start_page=0) == ["list 1", "list 2", ""]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the columns should come from the ocr cache")
+
+    monkeypatch.setattr(raster, "convert_from_path", fail)
+    monkeypatch.setattr(tbl, "ocr_right_column", fail)
+    monkeypatch.setattr(ocr, "detect_script", fail)
+    images = raster.lazy_page_images(pdf_path, 0, 5)
+    assert tbl.get_english_table_list(images, start_page=0) == ["list 1", "list 2", ""]
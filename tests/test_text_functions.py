@@ -37,4 +37,26 @@ def test_yearbook_is_scanned():
 )
 def test_search_returns_expected_pages(pdf_with_text, query, expected):
     page_nums = text.get_page_nums_from_query_text(pdf_with_text, query)
-    assert page_nums == expected
\ No newline at end of file
+    assert page_nums == expected
+
+def test_text_detection_does_not_extract_text(pdf_with_text, monkeypatch):
+    from pypdf import PageObject
+
+    def fail(*args, **kwargs):
+        raise AssertionError("text should not be extracted")
+
+    monkeypatch.setattr(PageObject, "extract_text", fail)
+    assert text.pdf_has_text(pdf_with_text)
+
+
+def test_pages_without_shown_text_are_not_text(pdf_file_path):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    # selects a font but never paints a glyph
+    pdf.set_font("Times", size=12)
+    pdf.cell(0, 10, "")
+    pdf.add_page()
+    pdf.output(pdf_file_path)
+    assert not text.pdf_has_text(pdf_file_path)
@@ -0,0 +1,48 @@
+"""Unit tests for the full-text index of text pdfs."""
+
+import pytest
+
+import scraper.file_scraper as file_scraper
+from scraper.tools import text_index
+from scraper.tools import text_pdfs as text
+
+
+@pytest.fixture()
+def index(tmp_path, pdf_with_text):
+    index = text_index.TextIndex(tmp_path / "index.sqlite")
+    text_index.build_index([pdf_with_text], index)
+    return index
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["Hello World", "Hello Again, World", "World", "Hello", "What?!?",
+     "llo Aga", "orld", "again, wo", "third", "!?", "the third time"],
+)
+def test_index_matches_text_search(pdf_with_text, index, query):
+    expected = text.get_page_nums_from_query_text(pdf_with_text, query)
+    assert index.search(pdf_with_text, query) == expected
+
+
+def test_index_records_scanned_pdfs(scanned_pdf, tmp_path):
+    index = text_index.TextIndex(tmp_path / "index.sqlite")
+    text_index.build_index([scanned_pdf], index)
+    assert index.has_text(scanned_pdf) is False
+    assert index.search(scanned_pdf, "this") is None
+
+
+def test_changed_file_is_not_served_from_index(pdf_with_text, index):
+    with open(pdf_with_text, "ab") as f:
+        f.write(b"\n")
+    assert index.has_text(pdf_with_text) is None
+    assert index.search(pdf_with_text, "Hello") is None
+
+
+def test_file_scraper_uses_index(pdf_with_text, index, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("pdf should not be re-parsed")
+
+    monkeypatch.setattr(text, "pdf_has_text", fail)
+    monkeypatch.setattr(text, "get_page_nums_from_query_text", fail)
+    writer = file_scraper.main(pdf_with_text, "World", verbose=False, index=index)
+    assert len(writer.pages) == 2
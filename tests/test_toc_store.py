@@ -0,0 +1,127 @@
+"""Unit tests for persisted table-list maps."""
+import json
+
+from fpdf import FPDF
+import pytest
+
+from scraper.tools import budget as budgets
+from scraper.tools import raster
+from scraper.tools import tablelist_utils as tbl
+from scraper.tools import toc_store
+from scraper.tools.document import Document
+
+
+class DummyImage:
+    def __init__(self, text):
+        self.text = text
+        self.size = (1000, 1000)
+        self.info = {}
+
+    def crop(self, box):
+        return self
+
+
+def test_parse_table_list_joins_wrapped_titles():
+    table_list = [
+        "List of Tables\n"
+        "Table 1.1 Population ............ 23\n"
+        "Table 1.2 Households by\n"
+        "   Region and Size .......... 25\n",
+        "XX Gross Domestic Product 2020\n",
+    ]
+    assert toc_store.parse_table_list(table_list) == [
+        {"title": "Table 1.1 Population", "page": 23},
+        {"title": "Table 1.2 Households by Region and Size", "page": 25},
+        {"title": "XX Gross Domestic Product", "page": 2020},
+    ]
+
+
+@pytest.fixture()
+def yearbook(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "yearbook.pdf"
+    pdf = FPDF()
+    for _ in range(20):
+        pdf.add_page()
+    pdf.output(str(pdf_path))
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "cache"))
+    return pdf_path
+
+
+def test_table_list_is_read_once_per_yearbook(yearbook, monkeypatch):
+    page_texts = ["cover", "List of Tables", "Table 1.1 GDP 3", "XX Prices 9"] + ["body"] * 16
+    monkeypatch.setattr(
+        raster, "convert_from_path",
+        lambda pdf_path, dpi, first_page, last_page: [
+            DummyImage(page_texts[n]) for n in range(first_page - 1, last_page)
+        ],
+    )
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+    assert tbl.search_table_list(yearbook, "GDP") == 1 + 4 + (3 - 1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("table list should come from the store")
+
+    monkeypatch.setattr("pytesseract.image_to_string", fail)
+    assert tbl.search_table_list(yearbook, "Prices") == 1 + 4 + (9 - 1)
+    assert tbl.get_table_of_contents(yearbook) == [
+        {"title": "Table 1.1 GDP", "page": 3},
+        {"title": "XX Prices", "page": 9},
+    ]
+
+
+def test_table_list_pages_are_charged_to_the_budget(yearbook, monkeypatch):
+    page_texts = ["cover", "List of Tables", "Table 1.1 GDP 3", "XX Prices 9"] + ["body"] * 16
+    monkeypatch.setattr(
+        raster, "convert_from_path",
+        lambda pdf_path, dpi, first_page, last_page: [
+            DummyImage(page_texts[n]) for n in range(first_page - 1, last_page)
+        ],
+    )
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+    budget = budgets.Budget(parent=budgets.Budget())
+    tbl.search_table_list(yearbook, "GDP", budget)
+    # the cover, then the list's pages up to the first body page
+    assert budget.pages_used == budget.parent.pages_used == 5
+    # a stored list costs nothing
+    tbl.search_table_list(Document(yearbook), "Prices", budget)
+    assert budget.pages_used == 5
+
+
+def test_records_of_another_version_are_ignored(tmp_path, monkeypatch):
+    store = toc_store.TocStore(tmp_path / "toc.sqlite")
+    record = toc_store.make_record(1, ["Table 1.1 GDP 3", ""])
+    store.put("new", record)
+    assert store.get("new") == record
+    # written before records carried a version
+    store.conn.execute("INSERT INTO tocs VALUES (?, ?)", ("old", json.dumps(record)))
+    assert store.get("old") is None
+    monkeypatch.setattr(toc_store, "FORMAT_VERSION", toc_store.FORMAT_VERSION + 1)
+    assert store.get("new") is None
+
+
+def test_search_uses_parsed_entries(yearbook):
+    doc = Document(yearbook)
+    # the entry's page wins over the number printed after the title in the text
+    doc.table_list = dict(toc_store.make_record(1, ["Table 1.1 GDP 3", ""]),
+                          entries=[{"title": "Table 1.1 GDP", "page": 5}])
+    assert tbl.search_table_list(doc, "GDP") == 3 + (5 - 1)
+    # titles the parser missed are still found in the text
+    doc.table_list["entries"] = []
+    assert tbl.search_table_list(doc, "GDP") == 3 + (3 - 1)
+    assert tbl.search_table_list(doc, "Prices") is None
+
+
+def test_missing_table_list_is_remembered(yearbook, monkeypatch):
+    monkeypatch.setattr(
+        raster, "convert_from_path",
+        lambda pdf_path, dpi, first_page, last_page: [
+            DummyImage("body") for n in range(first_page - 1, last_page)
+        ],
+    )
+    monkeypatch.setattr("pytesseract.image_to_string", lambda image, lang=None: image.text)
+    with pytest.raises(tbl.TableListNotFoundError):
+        tbl.search_table_list(yearbook, "GDP")
+
+    monkeypatch.setattr(raster, "convert_from_path", None)
+    with pytest.raises(tbl.TableListNotFoundError):
+        tbl.search_table_list(yearbook, "GDP")
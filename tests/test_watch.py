@@ -0,0 +1,131 @@
+"""Unit tests for watch mode."""
+
+import os
+
+from fpdf import FPDF
+from pypdf import PdfReader
+import pytest
+
+import scraper.directory_scraper
+from scraper import watch
+
+
+def write_pdf(path, num_pages=2):
+    pdf = FPDF()
+    for page in range(num_pages):
+        pdf.add_page()
+    pdf.output(str(path))
+    # old enough to have settled
+    os.utime(path, (1_000_000_000, 1_000_000_000))
+
+
+@pytest.fixture
+def searched(monkeypatch):
+    calls = []
+
+    def dummy_find_pages(doc, queries, verbose, fallback=None, budget=None):
+        calls.append(doc.name)
+        return {query: [0] for query in queries}
+
+    monkeypatch.setattr(scraper.directory_scraper, "find_pages", dummy_find_pages)
+    return calls
+
+
+def test_poll_only_searches_new_files(tmp_path, searched):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for year in (2000, 2001):
+        write_pdf(input_dir / f"{year}_test.pdf")
+    manifest = watch.Manifest(tmp_path / "manifest.sqlite")
+    merged = output_dir / "GDP-scraped-input.pdf"
+
+    watch.poll(input_dir, output_dir, ["GDP"], manifest, verbose=False)
+    assert searched == ["2000_test.pdf", "2001_test.pdf"]
+    # header page + 1 match per file
+    assert len(PdfReader(merged).pages) == 4
+
+    assert watch.poll(input_dir, output_dir, ["GDP"], manifest, verbose=False) == []
+
+    write_pdf(input_dir / "2002_test.pdf")
+    watch.poll(input_dir, output_dir, ["GDP"], manifest, verbose=False)
+    assert searched[2:] == ["2002_test.pdf"]
+    assert len(PdfReader(merged).pages) == 6
+
+    # touched without changing contents: not searched again
+    os.utime(input_dir / "2000_test.pdf", (1_000_000_100, 1_000_000_100))
+    assert watch.poll(input_dir, output_dir, ["GDP"], manifest, verbose=False) == []
+
+    (input_dir / "2001_test.pdf").unlink()
+    watch.poll(input_dir, output_dir, ["GDP"], manifest, verbose=False)
+    assert len(PdfReader(merged).pages) == 4
+    report = (output_dir / "batch-report-input.csv").read_text().splitlines()
+    assert [row.split(",")[0] for row in report[1:]] == ["2000_test", "2002_test"]
+
+
+def test_poll_searches_changed_and_settling_files(tmp_path, searched):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "2000_test.pdf")
+    manifest = watch.Manifest(tmp_path / "manifest.sqlite")
+    watch.poll(input_dir, tmp_path, ["GDP"], manifest, verbose=False)
+
+    # still being written: left for a later poll
+    FPDF().output(str(input_dir / "2001_test.pdf"))
+    assert watch.poll(input_dir, tmp_path, ["GDP"], manifest, verbose=False) == []
+
+    write_pdf(input_dir / "2000_test.pdf", num_pages=3)
+    pending = watch.poll(input_dir, tmp_path, ["GDP"], manifest, verbose=False)
+    assert [path.name for path in pending] == ["2000_test.pdf"]
+
+    # a new query is searched in every file that lacks it
+    pending = watch.poll(input_dir, tmp_path, ["GDP", "Prices"], manifest, verbose=False)
+    assert [path.name for path in pending] == ["2000_test.pdf"]
+    assert manifest.results(input_dir / "2000_test.pdf")[0] == {"GDP": [0], "Prices": [0]}
+
+
+def test_poll_only_cuts_sections_of_searched_files(tmp_path, searched, monkeypatch):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for year in (2000, 2001):
+        write_pdf(input_dir / f"{year}_test.pdf")
+    manifest = watch.Manifest(tmp_path / "manifest.sqlite")
+    queries = ["GDP", "Prices", "Wages"]
+    watch.poll(input_dir, output_dir, queries, manifest, verbose=False)
+
+    cut = []
+    writer_from_results = scraper.directory_scraper._writer_from_results
+
+    def counting_writer_from_results(doc, page_nums, verbose):
+        cut.append(doc.name)
+        return writer_from_results(doc, page_nums, verbose)
+
+    monkeypatch.setattr(scraper.directory_scraper, "_writer_from_results",
+                        counting_writer_from_results)
+    write_pdf(input_dir / "2002_test.pdf")
+    watch.poll(input_dir, output_dir, queries, manifest, verbose=False)
+    assert cut == ["2002_test.pdf"] * 3
+    for query in queries:
+        assert len(PdfReader(output_dir / f"{query}-scraped-input.pdf").pages) == 6
+
+
+def test_poll_searches_each_file_for_its_missing_queries(tmp_path, monkeypatch):
+    calls = []
+
+    def dummy_find_pages(doc, queries, verbose, fallback=None, budget=None):
+        calls.append((doc.name, list(queries)))
+        return {query: [0] for query in queries}
+
+    monkeypatch.setattr(scraper.directory_scraper, "find_pages", dummy_find_pages)
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_pdf(input_dir / "2000_test.pdf")
+    manifest = watch.Manifest(tmp_path / "manifest.sqlite")
+    watch.poll(input_dir, tmp_path, ["GDP"], manifest, verbose=False)
+    write_pdf(input_dir / "2001_test.pdf")
+    watch.poll(input_dir, tmp_path, ["GDP", "Prices"], manifest, verbose=False)
+    assert sorted(calls[1:]) == [("2000_test.pdf", ["Prices"]),
+                                 ("2001_test.pdf", ["GDP", "Prices"])]